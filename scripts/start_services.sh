@@ -35,4 +35,12 @@ tmux new -s llama-server -d "$LLAMA_SERVER" \
 echo "Starting fuseki-server with service name: $SPARQL_SERVICE_NAME"
 tmux kill-session -t fuseki-server 2>/dev/null
 
-tmux new -s fuseki-server -d "$FUSEKI_SERVER --loc=./services/Database/ $SPARQL_SERVICE_NAME"
\ No newline at end of file
+# the update endpoint lets anyone who reaches the port write to the dataset,
+# it is only opened when the agent applies graph deltas (GRAPH_DELTA_DIR)
+FUSEKI_UPDATE=""
+if [ -n "$GRAPH_DELTA_DIR" ]; then
+    FUSEKI_UPDATE="--update"
+    echo "Enabling SPARQL updates for graph deltas in $GRAPH_DELTA_DIR"
+fi
+
+tmux new -s fuseki-server -d "$FUSEKI_SERVER $FUSEKI_UPDATE --loc=./services/Database/ $SPARQL_SERVICE_NAME"
\ No newline at end of file
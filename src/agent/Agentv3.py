@@ -1,24 +1,88 @@
+import threading
 import time
+from pathlib import Path
 from random import choice
+from typing import Iterator
 
 from speakeasypy import Chatroom, EventType, Speakeasy
 
-from core import Entity, KnowledgeGraph, Property
-from llm import LargeLanguageModel
+from core import (
+    WDT,
+    Entity,
+    GraphDelta,
+    KnowledgeGraph,
+    Prefetcher,
+    Property,
+    QueryLog,
+    Relation,
+)
+from utils import (
+    Deadline,
+    DeadlineExceeded,
+    ProfiledMessage,
+    SlowMessageProfiler,
+    metrics,
+)
 
+from .FactualAnswer import FactualAnswer
+from .IntentRouter import FACTUAL, SMALL_TALK, IntentRouter
 from .Message import Message
+from .RecommendationBatcher import RecommendationBatcher
 from .Recommendations import Recommendations
+from .Session import Session, SessionStore
 
 
 class Agentv3:
 
-    def __init__(self, speakeasy: Speakeasy, sparql_endpoint: str):
+    def __init__(
+        self,
+        speakeasy: Speakeasy,
+        sparql_endpoint: str | list[str],
+        first_batch_size: int = 3,
+        first_batch_min_score: float = 1.0,
+        message_budget: float = 10.0,
+        max_recommendations: int = 10,
+        candidate_pool_size: int = 50,
+        profiler: SlowMessageProfiler | None = None,
+        query_log: QueryLog | None = None,
+        prefetch_interval: float | None = 600.0,
+        intent_router: IntentRouter | None = None,
+        batch_window: float | None = None,
+        max_matches_per_value: int | None = None,
+    ):
         self.speakeasy = speakeasy
         self.sparql_endpoint = sparql_endpoint
-        self.__knowledge_graph = KnowledgeGraph(sparql_endpoint)
+        self.first_batch_size = first_batch_size
+        self.first_batch_min_score = first_batch_min_score
+        self.message_budget = message_budget
+        self.max_recommendations = max_recommendations
+        self.candidate_pool_size = candidate_pool_size
+        self.max_matches_per_value = max_matches_per_value
+        self.profiler = profiler
+        self.query_log = query_log
+        self.__sessions = SessionStore()
+        self.__knowledge_graph = KnowledgeGraph(sparql_endpoint, query_log=query_log)
         print("Loading entities...")
         self.__knowledge_graph.entities  # Preload entities
+        self.__knowledge_graph.label_index  # Preload labels and aliases
+        self.__knowledge_graph.statistics  # Preload feature weights
+        self.__knowledge_graph.label_dictionary  # Preload suggestions
+        self.__knowledge_graph.relations  # Preload relation labels
         print("Entities loaded.")
+        self.intent_router = intent_router or IntentRouter.train()
+        self.prefetcher = None
+        if query_log is not None:
+            # warms the caches with what was asked before, off the message path
+            self.prefetcher = Prefetcher(self.__knowledge_graph, query_log)
+            self.prefetcher.start(prefetch_interval)
+        self.batcher = None
+        if batch_window is not None:
+            # concurrent recommendations are scored together, one snapshot each
+            self.batcher = RecommendationBatcher(
+                self.__knowledge_graph,
+                window=batch_window,
+                max_matches_per_value=max_matches_per_value,
+            )
 
         self.speakeasy.login()
         self.speakeasy.register_callback(self.on_new_message, EventType.MESSAGE)
@@ -36,6 +100,14 @@ class Agentv3:
             "Let me think about that for a moment.",
         ]
 
+        self.small_talk_answers = [
+            "Hi! Tell me some movies you like and I will recommend similar ones.",
+            "I'm a movie bot. Ask me who directed a film or for recommendations.",
+            "Happy to help with movies! Which ones do you like?",
+            "You can ask me things like 'Who directed The Lion King?' or "
+            "'Recommend movies like Inception'.",
+        ]
+
         self.generic_answers = [
             "Based on your input, you might enjoy these movies:",
             "Here are some movies I found for you:",
@@ -48,53 +120,285 @@ class Agentv3:
     def run(self):
         self.speakeasy.start_listening()
 
+    def apply_delta(self, delta: GraphDelta) -> dict[str, int]:
+        """Applies a graph change while the agent keeps answering messages."""
+        return self.__knowledge_graph.apply_delta(delta)
+
+    def watch_deltas(self, directory: str, interval: float = 5.0):
+        """
+        Polls a directory for deltas, `<name>.added.nt` and/or
+        `<name>.removed.nt`, and applies them in the order of their names.
+        Applied files get an `.applied` suffix. Files should be moved into
+        the directory once they are complete.
+        """
+        threading.Thread(
+            target=self.__watch_deltas,
+            args=(Path(directory), interval),
+            name="graph-delta-watcher",
+            daemon=True,
+        ).start()
+
+    def __watch_deltas(self, directory: Path, interval: float):
+        while True:
+            names = sorted(
+                {path.name.rsplit(".", 2)[0] for path in directory.glob("*.nt")}
+            )
+            for name in names:
+                added = directory / f"{name}.added.nt"
+                removed = directory / f"{name}.removed.nt"
+                try:
+                    self.apply_delta(
+                        GraphDelta.from_files(
+                            added if added.exists() else None,
+                            removed if removed.exists() else None,
+                        )
+                    )
+                except Exception as e:
+                    print(f"Failed to apply graph delta {name}: {e}")
+                    continue
+                for path in (added, removed):
+                    if path.exists():
+                        path.rename(path.with_name(f"{path.name}.applied"))
+            time.sleep(interval)
+
     def on_new_message(self, content: str, room: Chatroom):
+        if self.profiler is None:
+            self.__handle_message(content, room)
+            return
+        with self.profiler.profile(content, room.room_id) as profiled:
+            self.__handle_message(content, room, profiled)
+
+    def __handle_message(
+        self, content: str, room: Chatroom, profiled: ProfiledMessage | None = None
+    ):
+        received = time.time()
+        deadline = Deadline(self.message_budget)
+        intent = self.intent_router.route(content, self.__knowledge_graph.label_index)
+        print(f"intent: {intent}")
+        if intent == SMALL_TALK:
+            # nothing to look up, no graph query is made
+            room.post_messages(choice(self.small_talk_answers))
+            self.__observe_latency(intent, received)
+            return
         room.post_messages(choice(self.thinking_messages))
 
-        message = Message(content, self.__knowledge_graph)
+        message = Message(content, self.__knowledge_graph, deadline)
 
         e_start = time.time()
         entities_in_message = message.entities
         e_end = time.time()
         print(f"entities time: {e_end - e_start}")
 
+        # factual questions skip the property classification and recommender,
+        # they fall back to recommending if no fact is found
+        if intent == FACTUAL and (
+            answer := FactualAnswer.from_message(
+                message, self.__knowledge_graph, deadline
+            )
+        ):
+            self.__record([answer.entity], profiled)
+            room.post_messages(str(answer))
+            metrics.observe("time_to_first_result", time.time() - received)
+            self.__observe_latency(intent, received, deadline)
+            return
+
         p_start = time.time()
         properties_in_message = message.properties
         p_end = time.time()
         print(f"properties time: {p_end - p_start}")
 
         print(entities_in_message, properties_in_message)
+        self.__record(entities_in_message + properties_in_message, profiled)
 
-        recommendations = self.get_recommendations(
-            entities=entities_in_message, properties=properties_in_message
-        )
-
-        if recommendations:
-            recommendation_labels = [entity.label for entity in recommendations]
-            print(f"Recommendations: {recommendation_labels}")
-            initial_response = f"{choice(self.generic_answers)}\n- " + "\n- ".join(
-                recommendation_labels
+        session = self.__sessions.get(room.room_id)
+        if (
+            not entities_in_message
+            and session.is_follow_up(content)
+            and self.__answer_follow_up(room, session, properties_in_message, received)
+        ):
+            self.__observe_latency(intent, received, deadline)
+            return
+        if (
+            not entities_in_message
+            and not properties_in_message
+            and (suggestions := message.suggestions())
+        ):
+            room.post_messages(
+                "I'm not sure which movie you mean. Did you mean "
+                + " or ".join(self.__describe(entity) for entity in suggestions)
+                + "?"
             )
-            room.post_messages(initial_response)
+        else:
+            self.__recommend(
+                room,
+                session,
+                entities_in_message,
+                properties_in_message,
+                deadline,
+                received,
+            )
+        self.__observe_latency(intent, received, deadline)
+
+    def __record(self, entities: list[Entity], profiled: ProfiledMessage | None):
+        if self.query_log is not None:
+            self.query_log.record_entities(entity.uri for entity in entities)
+        if profiled is not None:
+            profiled.entities = [str(entity.uri) for entity in entities]
+
+    def __observe_latency(
+        self, intent: str, received: float, deadline: Deadline | None = None
+    ):
+        latency = time.time() - received
+        metrics.observe("message_latency", latency)
+        metrics.observe(f"message_latency.{intent}", latency)
+        if deadline is not None and deadline.degradations:
+            print(f"degradations: {deadline.degradations}")
+
+    def __recommend(
+        self,
+        room: Chatroom,
+        session: Session,
+        entities: list[Entity],
+        properties: list[Property],
+        deadline: Deadline,
+        received: float,
+    ):
+        features: dict[Entity, set[str]] = {}
+        posted: list[Entity] = []
+        ranked: list[tuple[Entity, float]] = []
+        for ranked in self.stream_recommendations(
+            entities=entities,
+            properties=properties,
+            deadline=deadline,
+            limit=self.candidate_pool_size,
+            features=features,
+        ):
+            if posted:
+                continue
+            confident = [
+                entity
+                for entity, score in ranked
+                if score >= self.first_batch_min_score
+            ][: self.first_batch_size]
+            if len(confident) == self.first_batch_size:
+                self.__post_recommendations(room, confident, received)
+                posted = confident
+
+        session.update(entities, properties, ranked, features)
+        recommendations = [entity for entity, _ in ranked[: self.max_recommendations]]
+        print(f"Recommendations: {[entity.label for entity in recommendations]}")
+        if not posted and recommendations:
+            self.__post_recommendations(room, recommendations, received)
+        elif posted:
+            additional = [entity for entity in recommendations if entity not in posted]
+            if additional:
+                room.post_messages(
+                    "I also found these movies for you:\n- "
+                    + "\n- ".join(entity.label for entity in additional)
+                )
         else:
             room.post_messages(
                 "I couldn't find any recommendations based on your input. Please try with different movies or properties."
             )
+        session.mark_shown(posted + recommendations)
+
+    def __answer_follow_up(
+        self,
+        room: Chatroom,
+        session: Session,
+        properties: list[Property],
+        received: float,
+    ) -> bool:
+        """
+        Answers from the candidates of the last recommendation. False if a
+        refinement matches none of them, it is then recommended afresh. Once
+        all candidates were shown a new run over the same seeds would only
+        find them again, so that is said instead.
+        """
+        if properties:
+            ranked = session.refine(properties)
+        else:
+            ranked = session.unseen()
+
+        recommendations = [entity for entity, _ in ranked[: self.max_recommendations]]
+        if not recommendations and properties:
+            metrics.increment("session_follow_ups.fallbacks")
+            return False
+        metrics.increment("session_follow_ups")
+        print(f"Follow-up recommendations: {[e.label for e in recommendations]}")
+        if recommendations:
+            self.__post_recommendations(room, recommendations, received)
+            session.mark_shown(recommendations)
+        else:
+            room.post_messages(
+                "I don't have any more movies matching that. Tell me about other movies you like and I will look again."
+            )
+        return True
+
+    def __describe(self, entity: Entity) -> str:
+        """The label with the release year, "The Lion King (1994)"."""
+        publication_date = Relation(WDT.P577, self.__knowledge_graph)
+        dates = self.__knowledge_graph.get_triplets(entity, publication_date)
+        years = sorted(str(date)[:4] for _, _, date in dates)
+        return f"{entity.label} ({years[0]})" if years else entity.label
+
+    def __post_recommendations(
+        self, room: Chatroom, recommendations: list[Entity], received: float
+    ):
+        recommendation_labels = [entity.label for entity in recommendations]
+        room.post_messages(
+            f"{choice(self.generic_answers)}\n- " + "\n- ".join(recommendation_labels)
+        )
+        time_to_first_result = time.time() - received
+        metrics.observe("time_to_first_result", time_to_first_result)
+        print(f"time to first result: {time_to_first_result}")
 
     def get_recommendations(
         self,
         entities: list[Entity],
         properties: list[Property],
+        deadline: Deadline | None = None,
     ) -> list[Entity]:
-        if entities:
-            return Recommendations.from_entities(
-                entities, knowledge_graph=self.__knowledge_graph
+        ranked = []
+        for ranked in self.stream_recommendations(entities, properties, deadline):
+            pass
+        return [entity for entity, _ in ranked]
+
+    def stream_recommendations(
+        self,
+        entities: list[Entity],
+        properties: list[Property],
+        deadline: Deadline | None = None,
+        limit: int = 10,
+        features: dict[Entity, set[str]] | None = None,
+    ) -> Iterator[list[tuple[Entity, float]]]:
+        if self.batcher is not None:
+            return self.__batched_recommendations(
+                entities, properties, deadline, limit, features
             )
-        else:
-            return Recommendations.from_properties(
-                properties,
-                knowledge_graph=self.__knowledge_graph,
-                relevant_instance_of_entities=Entity.instance_of_movies(
-                    self.__knowledge_graph
-                ),
+        return Recommendations.stream(
+            entities,
+            properties,
+            knowledge_graph=self.__knowledge_graph,
+            deadline=deadline,
+            limit=limit,
+            features=features,
+            max_matches_per_value=self.max_matches_per_value,
+        )
+
+    def __batched_recommendations(
+        self,
+        entities: list[Entity],
+        properties: list[Property],
+        deadline: Deadline | None,
+        limit: int,
+        features: dict[Entity, set[str]] | None,
+    ) -> Iterator[list[tuple[Entity, float]]]:
+        try:
+            ranked = self.batcher.recommend(
+                entities, properties, limit, features, deadline
             )
+        except DeadlineExceeded:
+            deadline.degrade("recommendation_batch")
+            return
+        yield ranked
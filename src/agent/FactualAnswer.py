@@ -0,0 +1,74 @@
+from core import Entity, KnowledgeGraph, Relation
+from utils import Deadline, metrics
+
+from .Message import Message
+
+
+class FactualAnswer:
+    """
+    The values of one relation of one entity, the answer to "Who directed
+    The Lion King?". Looked up with a single (subject, predicate) pattern
+    and one batched label query, both served from the triplet cache once
+    they were asked.
+    """
+
+    def __init__(self, entity: Entity, relation: Relation, values: list[str]):
+        self.__entity = entity
+        self.__relation = relation
+        self.__values = values
+
+    def __str__(self):
+        subject = f"The {self.__relation.label} of {self.__entity.label}"
+        if len(self.__values) == 1:
+            return f"{subject} is {self.__values[0]}."
+        return f"{subject}: {', '.join(self.__values[:-1])} and {self.__values[-1]}."
+
+    @property
+    def entity(self) -> Entity:
+        return self.__entity
+
+    @property
+    def relation(self) -> Relation:
+        return self.__relation
+
+    @property
+    def values(self) -> list[str]:
+        return self.__values
+
+    @classmethod
+    def from_message(
+        cls,
+        message: Message,
+        knowledge_graph: KnowledgeGraph,
+        deadline: Deadline | None = None,
+        max_relations: int = 3,
+    ) -> "FactualAnswer | None":
+        """
+        Combines the top linked entity of a factual question with the best
+        scored relation that it has values for, None if there is none.
+        """
+        if not message.entities_with_scores:
+            return None
+        entity, _ = message.entities_with_scores[0]
+        for relation, _ in message.relations_with_scores[:max_relations]:
+            triplets = knowledge_graph.get_triplets(entity, relation, deadline=deadline)
+            if triplets:
+                metrics.increment("factual_answers")
+                values = [value for _, _, value in triplets]
+                return cls(entity, relation, cls.__resolve(values, knowledge_graph))
+        return None
+
+    @staticmethod
+    def __resolve(values: list, knowledge_graph: KnowledgeGraph) -> list[str]:
+        labels = knowledge_graph.get_labels(
+            [value.uri for value in values if isinstance(value, Entity)]
+        )
+        return [
+            (
+                labels.get(str(value.uri), str(value.uri))
+                if isinstance(value, Entity)
+                # dates without a time of day
+                else str(value).removesuffix("T00:00:00Z")
+            )
+            for value in values
+        ]
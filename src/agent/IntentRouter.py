@@ -0,0 +1,130 @@
+import json
+import math
+import re
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from core import LabelIndex
+
+RECOMMENDATION = "recommendation"
+FACTUAL = "factual"
+SMALL_TALK = "small_talk"
+
+INTENTS_PATH = Path(__file__).with_name("intents.jsonl")
+
+# the default tokens of scikit-learn's TfidfVectorizer
+TOKEN = re.compile(r"(?u)\b\w\w+\b")
+
+
+class IntentRouter:
+    """
+    Routes a message to recommendation, factual or small talk before any
+    graph work is done. A TF-IDF over words and word pairs with a logistic
+    regression is trained with scikit-learn on labelled examples and then
+    unpacked into a dict of term -> (idf, weight per intent). Routing is a
+    sparse dot product over the few terms of a message, microseconds in
+    plain Python, and scikit-learn is only imported to train.
+    """
+
+    def __init__(
+        self,
+        intents: list[str],
+        terms: dict[str, tuple[float, list[float]]],
+        intercepts: list[float],
+    ):
+        self.intents = intents
+        self.__terms = terms
+        self.__intercepts = intercepts
+
+    @classmethod
+    def train(cls, path: str | Path = INTENTS_PATH, c: float = 10.0) -> "IntentRouter":
+        """Trains on a JSONL file of {"text": ..., "intent": ...} objects."""
+        # only training needs scikit-learn, routing does not
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.linear_model import LogisticRegression
+
+        examples = [
+            json.loads(line)
+            for line in Path(path).read_text(encoding="utf-8").splitlines()
+            if line.strip()
+        ]
+        vectorizer = TfidfVectorizer(ngram_range=(1, 2), sublinear_tf=True)
+        features = vectorizer.fit_transform(example["text"] for example in examples)
+        model = LogisticRegression(C=c, max_iter=1000)
+        model.fit(features, [example["intent"] for example in examples])
+
+        terms = {
+            term: (
+                float(vectorizer.idf_[column]),
+                [float(weight) for weight in model.coef_[:, column]],
+            )
+            for term, column in vectorizer.vocabulary_.items()
+        }
+        return cls(
+            [str(intent) for intent in model.classes_],
+            terms,
+            [float(intercept) for intercept in model.intercept_],
+        )
+
+    def scores(self, text: str) -> dict[str, float]:
+        """The linear score of every intent, higher is more likely."""
+        return self.__scores(self.__counts(text))
+
+    def route(self, text: str, label_index: "LabelIndex | None" = None) -> str:
+        """
+        The most likely intent. A message without a single known term goes
+        to the recommender, as every message did before routing. So does
+        small talk that mentions a label of the graph whose words do not
+        speak for small talk, such as "Thanks! I also like Titanic".
+        """
+        counts = self.__counts(text)
+        if not counts:
+            return RECOMMENDATION
+        intent = self.__best(self.__scores(counts))
+        if intent == SMALL_TALK and label_index is not None:
+            for _, mention in label_index.find_all(text):
+                # the words of the label alone, small talk would otherwise
+                # win on its intercept whenever they say little
+                mention_counts = self.__counts(mention)
+                if not mention_counts or (
+                    self.__best(self.__scores(mention_counts, intercepts=False))
+                    != SMALL_TALK
+                ):
+                    return RECOMMENDATION
+        return intent
+
+    def __counts(self, text: str) -> dict[str, int]:
+        counts = {}
+        for term in self.__tokenize(text):
+            if term in self.__terms:
+                counts[term] = counts.get(term, 0) + 1
+        return counts
+
+    def __scores(
+        self, counts: dict[str, int], intercepts: bool = True
+    ) -> dict[str, float]:
+        # sublinear term frequency times idf, normalized to unit length
+        weights = {
+            term: (1 + math.log(count)) * self.__terms[term][0]
+            for term, count in counts.items()
+        }
+        norm = math.sqrt(sum(weight * weight for weight in weights.values())) or 1.0
+        scores = list(self.__intercepts) if intercepts else [0.0] * len(self.intents)
+        for term, weight in weights.items():
+            for i, coefficient in enumerate(self.__terms[term][1]):
+                scores[i] += weight / norm * coefficient
+        return dict(zip(self.intents, scores))
+
+    @staticmethod
+    def __best(scores: dict[str, float]) -> str:
+        return max(scores, key=scores.get)
+
+    def __len__(self) -> int:
+        return len(self.__terms)
+
+    @staticmethod
+    def __tokenize(text: str) -> list[str]:
+        # words and word pairs, like the vectorizer's analyzer
+        words = TOKEN.findall(text.lower())
+        return words + [" ".join(pair) for pair in zip(words, words[1:])]
@@ -1,8 +1,5 @@
-import re
-
-from thefuzz import fuzz, process
-
-from core import Entity, KnowledgeGraph, Relation
+from core import Entity, KnowledgeGraph, LabelIndex, Relation
+from utils import Deadline
 
 RELATION_LABEL_SYNONYMS = {
     "director": ["director", "directed", "directs", "direct"],
@@ -47,10 +44,19 @@ RELATION_LABEL_SYNONYMS = {
 
 class Message:
 
-    def __init__(self, content: str, knowledge_graph: KnowledgeGraph):
+    def __init__(
+        self,
+        content: str,
+        knowledge_graph: KnowledgeGraph,
+        deadline: Deadline | None = None,
+        fuzzy_threshold: int = 80,
+    ):
+        self.fuzzy_threshold = fuzzy_threshold
         self.__content = content
+        self.__deadline = deadline
         self.__entities_with_scores = None
         self.__relations_with_scores = None
+        self.__mentions: list[str] = []
         self.__knowledge_graph = knowledge_graph
         self.__relevant_instance_of_entities = Entity.instance_of_movies(
             self.__knowledge_graph
@@ -77,9 +83,13 @@ class Message:
         return self.__relations_with_scores
 
     def __get_relations_with_scores(self) -> list[tuple[Relation, int]]:
+        # imported on first use instead of when the agent starts
+        from thefuzz import fuzz
+
         knowledge_graph_relations = self.__knowledge_graph.relations
-        query_lower = self.content.lower()
+        query_lower = self.__relation_text()
         normalized_query = self.__normalize_for_relations()
+        fuzzy = self.__deadline is None or not self.__deadline.running_low
         matches = []
 
         for relation in knowledge_graph_relations:
@@ -89,20 +99,38 @@ class Message:
             rel_label_lower = relation.label.lower()
             if rel_label_lower in query_lower:
                 score = 100 + len(rel_label_lower)
-                matches.append((relation, score, relation.label))
+                matches.append((relation, score))
             elif rel_label_lower in normalized_query:
                 score = 98 + len(rel_label_lower)
-                matches.append((relation, score, relation.label))
-            else:
+                matches.append((relation, score))
+            elif fuzzy:
                 fuzzy_score = fuzz.partial_ratio(rel_label_lower, query_lower)
 
                 if fuzzy_score > self.fuzzy_threshold:
                     adjusted_score = fuzzy_score + (len(rel_label_lower) * 0.5)
-                    matches.append((relation, int(adjusted_score), relation.label))
+                    matches.append((relation, int(adjusted_score)))
+
+        return sorted(
+            matches, key=lambda relation_score: relation_score[1], reverse=True
+        )
+
+    def __relation_text(self) -> str:
+        # linked mentions are blanked, "Who directed Cast Away?" asks for
+        # the director and not the cast
+        self.entities_with_scores
+        text = f" {LabelIndex.normalize(self.content)} "
+        for mention in self.__mentions:
+            text = text.replace(f" {mention} ", " ")
+        return text.strip()
 
     def __normalize_for_relations(self) -> str:
-        normalized = self.content.lower()
+        from thefuzz import fuzz, process
+
+        normalized = self.__relation_text()
         words = normalized.split()
+        fuzzy = self.__deadline is None or not self.__deadline.running_low
+        if not fuzzy:
+            self.__deadline.degrade("fuzzy relation matching")
 
         for canonical, syn_list in RELATION_LABEL_SYNONYMS.items():
             for synonym in sorted(syn_list, key=len, reverse=True):
@@ -110,7 +138,7 @@ class Message:
 
                 if synonym_lower in normalized:
                     normalized = normalized.replace(synonym_lower, canonical.lower())
-                else:
+                elif fuzzy:
                     if " " in synonym_lower:
                         if fuzz.partial_ratio(synonym_lower, normalized) > 85:
                             best_match = process.extractOne(
@@ -155,6 +183,15 @@ class Message:
             )
         ]
 
+    def suggestions(self, k: int = 3) -> list[Entity]:
+        """The most popular entities a partly typed label could mean."""
+        return [
+            Entity(uri, self.__knowledge_graph, label)
+            for uri, label in self.__knowledge_graph.label_dictionary.suggest(
+                self.content, k
+            )
+        ]
+
     @property
     def entities_with_scores(self) -> list[tuple[Entity, int]]:
         if self.__entities_with_scores is None:
@@ -162,33 +199,10 @@ class Message:
         return self.__entities_with_scores
 
     def __get_entities_with_scores(self) -> list[tuple[Entity, int]]:
-        knowledge_graph_entities = self.__knowledge_graph.entities
-
-        remaining_query = self.content.lower()
-        matches = []
-
-        for entity in sorted(
-            knowledge_graph_entities,
-            key=lambda e: len(e.label) if e.label else 0,
-            reverse=True,
-        ):
-            if not entity.label:
-                continue
-
-            pattern = r"\b" + re.escape(entity.label.lower()) + r"\b"
-
-            match = re.search(pattern, remaining_query)
-
-            if match:
-                score = 100 + len(entity.label)
-                matches.append(
-                    (
-                        entity,
-                        score,
-                    )
-                )
-                remaining_query = re.sub(pattern, " ", remaining_query, 1)
-
+        # longest mentions first, each part of the message is linked once
+        found = self.__knowledge_graph.label_index.find_all(self.content)
+        self.__mentions = [key for _, key in found]
+        matches = [(entity, 100 + len(key)) for entity, key in found]
         return sorted(
             matches,
             key=lambda entity_score: (entity_score[1], len(entity_score[0].label)),
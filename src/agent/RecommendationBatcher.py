@@ -0,0 +1,390 @@
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from itertools import islice
+
+from core import IRI, RDFS, Entity, KnowledgeGraph, Property, Relation
+from utils import Deadline, DeadlineExceeded, SPARQLQuery, metrics
+
+from .Recommendations import MAX_VALUE_SHARE, Recommendations
+
+
+class BatchRequest:
+    def __init__(
+        self,
+        entities: list[Entity],
+        properties: list[Property],
+        limit: int,
+        features: dict[Entity, set[str]] | None,
+        deadline: Deadline | None,
+    ):
+        self.entities = entities
+        self.properties = properties
+        self.limit = limit
+        self.features = features
+        self.deadline = deadline
+        self.lookups: list[tuple[Relation | None, Property]] = []
+        self.submitted = time.perf_counter()
+        self.future: Future[list[tuple[Entity, float]]] = Future()
+
+
+class RecommendationBatcher:
+    """
+    Collects the recommendation requests arriving within `window` seconds
+    of the first one, up to `max_batch_size`, and answers them together.
+    Seed entities are deduplicated and their properties fetched in one bulk
+    lookup, as are the movies sharing each requested value. All requests are
+    then scored at once as the sparse product of a requests x features
+    weight matrix and a features x movies match matrix, and the rows are
+    split back out. Scores equal those of `Recommendations.stream` without
+    a deadline, with the same `max_matches_per_value`. Closed batches are answered by up to `batch_workers`
+    threads, so a slow batch does not hold up the next window. Batch sizes,
+    waiting and scoring times go to the metrics.
+    """
+
+    def __init__(
+        self,
+        knowledge_graph: KnowledgeGraph,
+        window: float = 0.01,
+        max_batch_size: int = 32,
+        fetch_workers: int = 4,
+        batch_workers: int = 4,
+        max_matches_per_value: int | None = None,
+    ):
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.max_matches_per_value = max_matches_per_value
+        self.__knowledge_graph = knowledge_graph
+        self.__executor = ThreadPoolExecutor(
+            max_workers=fetch_workers, thread_name_prefix="recommendation-fetch"
+        )
+        self.__workers = ThreadPoolExecutor(
+            max_workers=batch_workers, thread_name_prefix="recommendation-batch"
+        )
+        self.__queue: queue.Queue[BatchRequest | None] = queue.Queue()
+        self.__batches = 0
+        self.__requests = 0
+        threading.Thread(
+            target=self.__run, name="recommendation-batcher", daemon=True
+        ).start()
+
+    def recommend(
+        self,
+        entities: list[Entity],
+        properties: list[Property],
+        limit: int = 10,
+        features: dict[Entity, set[str]] | None = None,
+        deadline: Deadline | None = None,
+    ) -> list[tuple[Entity, float]]:
+        """
+        Blocks until the batch of this request is scored, like a single
+        `Recommendations.stream` run to its last snapshot. Raises
+        DeadlineExceeded once the budget is used up, the batch then stops
+        working for this request.
+        """
+        request = BatchRequest(entities, properties, limit, features, deadline)
+        self.__queue.put(request)
+        try:
+            return request.future.result(deadline.remaining if deadline else None)
+        except FutureTimeoutError:
+            raise DeadlineExceeded("No recommendations within the budget") from None
+
+    def close(self):
+        # the collecting thread shuts the pools down once it stops
+        self.__queue.put(None)
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "batches": self.__batches,
+            "requests": self.__requests,
+            "mean_batch_size": (
+                self.__requests / self.__batches if self.__batches else 0.0
+            ),
+        }
+
+    def __run(self):
+        while True:
+            first = self.__queue.get()
+            if first is None:
+                # batches still answering use the fetch pool until they finish
+                self.__workers.shutdown(wait=True)
+                self.__executor.shutdown(wait=False)
+                return
+            batch = [first]
+            closes = time.perf_counter() + self.window
+            while len(batch) < self.max_batch_size:
+                remaining = closes - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self.__queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if request is None:
+                    self.__queue.put(None)
+                    break
+                batch.append(request)
+            self.__batches += 1
+            self.__requests += len(batch)
+            self.__workers.submit(self.__answer, batch)
+
+    def __answer(self, batch: list[BatchRequest]):
+        start = time.perf_counter()
+        metrics.observe("recommendation_batch.size", len(batch))
+        for request in batch:
+            metrics.observe("recommendation_batch.wait", start - request.submitted)
+        deadline = None
+        try:
+            batch = self.__unexpired(batch)
+            deadline = self.__batch_deadline(batch)
+            with_entities = [request for request in batch if request.entities]
+            with_properties = [request for request in batch if not request.entities]
+            if with_entities:
+                self.__resolve(
+                    self.__score(
+                        with_entities, self.__entity_features(with_entities, deadline)
+                    ),
+                    deadline,
+                )
+            if with_properties:
+                self.__resolve(
+                    self.__score(
+                        with_properties,
+                        self.__property_features(with_properties, deadline),
+                    ),
+                    deadline,
+                )
+        except Exception as e:
+            for request in batch:
+                if not request.future.done():
+                    self.__report(request, deadline)
+                    request.future.set_exception(e)
+        metrics.observe("recommendation_batch.latency", time.perf_counter() - start)
+
+    def __resolve(
+        self,
+        results: dict[BatchRequest, list[tuple[Entity, float]]],
+        deadline: Deadline | None,
+    ):
+        for request in self.__unexpired(list(results)):
+            self.__report(request, deadline)
+            request.future.set_result(results[request])
+
+    @staticmethod
+    def __report(request: BatchRequest, deadline: Deadline | None):
+        # what the shared lookups skipped is missing from every answer
+        if request.deadline is not None and deadline is not None:
+            request.deadline.merge(deadline)
+
+    @staticmethod
+    def __unexpired(batch: list[BatchRequest]) -> list[BatchRequest]:
+        """The requests still waiting, those out of budget are given up."""
+        unexpired = []
+        for request in batch:
+            if request.deadline is not None and request.deadline.expired:
+                metrics.increment("recommendation_batch.expired")
+                request.future.set_exception(
+                    DeadlineExceeded("No recommendations within the budget")
+                )
+            else:
+                unexpired.append(request)
+        return unexpired
+
+    @staticmethod
+    def __batch_deadline(batch: list[BatchRequest]) -> Deadline | None:
+        """
+        A budget of its own for the shared lookups, as long as the most
+        patient request waits. None if any request waits without one.
+        """
+        if not batch or any(request.deadline is None for request in batch):
+            return None
+        return Deadline(max(request.deadline.remaining for request in batch))
+
+    def __entity_features(
+        self, batch: list[BatchRequest], deadline: Deadline | None
+    ) -> dict[tuple[str, str], tuple[float, list[Entity], Property]]:
+        knowledge_graph = self.__knowledge_graph
+        seeds = {str(entity.uri) for request in batch for entity in request.entities}
+        knowledge_graph.prefetch(
+            [KnowledgeGraph.lookup_key(uri, None, None, True) for uri in seeds],
+            deadline=deadline,
+        )
+        lookups = {}
+        for request in batch:
+            if deadline is not None:
+                # like the stream, seeds not loaded within the budget are left out
+                request.entities = [
+                    entity
+                    for entity in request.entities
+                    if entity.load_properties(deadline)
+                ]
+            request.lookups = Recommendations.lookups(request.entities, knowledge_graph)
+            for relation, value in request.lookups:
+                lookups[(str(relation.uri), Recommendations.feature_key(value))] = (
+                    relation,
+                    value,
+                )
+        # a broad value looked up as the last resort is paged by iter_triplets,
+        # the bulk query would fetch all its matches only to drop them
+        statistics = knowledge_graph.statistics
+        knowledge_graph.prefetch(
+            [
+                KnowledgeGraph.lookup_key(None, relation.uri, value)
+                for relation, value in lookups.values()
+                if statistics.share(relation, value) <= MAX_VALUE_SHARE
+            ],
+            deadline=deadline,
+        )
+
+        return {
+            key: (
+                statistics.weight(relation, value),
+                [
+                    e
+                    for e, _, _ in islice(
+                        knowledge_graph.iter_triplets(
+                            None, relation, value, deadline=deadline
+                        ),
+                        self.max_matches_per_value,
+                    )
+                ],
+                value,
+            )
+            for key, (relation, value) in lookups.items()
+        }
+
+    def __property_features(
+        self, batch: list[BatchRequest], deadline: Deadline | None
+    ) -> dict[tuple[str, str], tuple[float, list[Entity], Property]]:
+        knowledge_graph = self.__knowledge_graph
+        properties = {}
+        for request in batch:
+            request.lookups = [(None, value) for value in request.properties]
+            for value in request.properties:
+                properties[str(value.uri)] = value
+        if not properties:
+            return {}
+
+        condition_triplets = [
+            (None, Relation.instance_of(knowledge_graph), e)
+            for e in Entity.instance_of_movies(knowledge_graph)
+        ]
+        condition = SPARQLQuery.union_clauses(condition_triplets, ["uri"])
+
+        def fetch(uri: str) -> list[tuple[str, str]]:
+            where = f"""
+                ?uri <{RDFS.label}> ?label .
+                ?uri ?relation <{uri}> .
+                {{ {condition} }}
+            """
+            return [
+                (row["uri"]["value"], row["label"]["value"])
+                for row in islice(
+                    knowledge_graph.iter_query(
+                        ["?uri", "?label"], where, deadline=deadline, keyset=True
+                    ),
+                    self.max_matches_per_value,
+                )
+            ]
+
+        # one lookup per distinct property, however many requests ask for it
+        rows = dict(zip(properties, self.__executor.map(fetch, properties)))
+        entities = {}
+        matches = {}
+        for uri, found in rows.items():
+            matches[uri] = []
+            for match, label in found:
+                if match not in entities:
+                    entities[match] = Entity(IRI(match), knowledge_graph, label)
+                matches[uri].append(entities[match])
+
+        statistics = knowledge_graph.statistics
+        return {
+            ("", Recommendations.feature_key(value)): (
+                statistics.weight(None, value),
+                matches[uri],
+                value,
+            )
+            for uri, value in properties.items()
+        }
+
+    def __score(
+        self,
+        batch: list[BatchRequest],
+        features: dict[tuple[str, str], tuple[float, list[Entity], Property]],
+    ) -> dict[BatchRequest, list[tuple[Entity, float]]]:
+        # imported on first use, like the rest of the numeric stack
+        from scipy.sparse import csr_matrix
+
+        columns = {key: column for column, key in enumerate(features)}
+        movies: dict[str, int] = {}
+        entities: list[Entity] = []
+        rows, cols, counts = [], [], []
+        for key, (_, matches, _) in features.items():
+            for entity in matches:
+                uri = str(entity.uri)
+                if uri not in movies:
+                    movies[uri] = len(entities)
+                    entities.append(entity)
+                rows.append(columns[key])
+                cols.append(movies[uri])
+                counts.append(1.0)
+        matches = csr_matrix(
+            (counts, (rows, cols)), shape=(len(features), len(entities))
+        )
+
+        rows, cols, weights = [], [], []
+        for row, request in enumerate(batch):
+            for relation, value in request.lookups:
+                key = (
+                    str(relation.uri) if relation else "",
+                    Recommendations.feature_key(value),
+                )
+                rows.append(row)
+                cols.append(columns[key])
+                weights.append(features[key][0])
+        requested = csr_matrix(
+            (weights, (rows, cols)), shape=(len(batch), len(features))
+        )
+
+        scores = (requested @ matches).tocsr()
+        statistics = self.__knowledge_graph.statistics
+        results = {}
+        for row, request in enumerate(batch):
+            excluded = {str(entity.uri) for entity in request.entities}
+            start, end = scores.indptr[row], scores.indptr[row + 1]
+            counts = Counter(
+                {
+                    entities[column]: float(score)
+                    for column, score in zip(
+                        scores.indices[start:end], scores.data[start:end]
+                    )
+                    if str(entities[column].uri) not in excluded
+                }
+            )
+            ranked = Recommendations.rank(counts, statistics, request.limit)
+            if request.features is not None:
+                self.__add_features(request, ranked, features)
+            results[request] = ranked
+        return results
+
+    @staticmethod
+    def __add_features(
+        request: BatchRequest,
+        ranked: list[tuple[Entity, float]],
+        features: dict[tuple[str, str], tuple[float, list[Entity], Property]],
+    ):
+        # only for the ranked movies, the session explains and refines those
+        ranked_entities = {str(entity.uri): entity for entity, _ in ranked}
+        for relation, value in request.lookups:
+            key = (
+                str(relation.uri) if relation else "",
+                Recommendations.feature_key(value),
+            )
+            for match in features[key][1]:
+                entity = ranked_entities.get(str(match.uri))
+                if entity is not None:
+                    request.features.setdefault(entity, set()).add(key[1])
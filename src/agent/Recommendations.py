@@ -1,9 +1,12 @@
+import heapq
 from collections import Counter
+from typing import Iterator
 
-from rdflib import RDFS, URIRef
+from core import IRI, RDFS, Entity, GraphStatistics, KnowledgeGraph, Property, Relation
+from utils import Deadline, SPARQLQuery, get_common_values, metrics
 
-from core import Entity, KnowledgeGraph, Property, Relation
-from utils import SPARQLQuery, get_common_values
+# shared values of more than this share of all movies are not looked up
+MAX_VALUE_SHARE = 0.2
 
 
 class Recommendations:
@@ -54,10 +57,15 @@ class Recommendations:
 
     @classmethod
     def from_entities(
-        cls, entities: list[Entity], knowledge_graph: KnowledgeGraph
+        cls,
+        entities: list[Entity],
+        knowledge_graph: KnowledgeGraph,
+        deadline: Deadline | None = None,
     ) -> "Recommendations":
         return Recommendations(
-            cls.__based_on_entities(entities, knowledge_graph),
+            cls.__final(
+                cls.__iter_based_on_entities(entities, knowledge_graph, deadline)
+            ),
             knowledge_graph=knowledge_graph,
         )
 
@@ -67,19 +75,122 @@ class Recommendations:
         properties: list[str],
         knowledge_graph: KnowledgeGraph,
         relevant_instance_of_entities: list[Entity] = [],
+        deadline: Deadline | None = None,
     ) -> "Recommendations":
         return cls(
-            cls.__based_on_properties(
-                properties, knowledge_graph, relevant_instance_of_entities
+            cls.__final(
+                cls.__iter_based_on_properties(
+                    properties, knowledge_graph, relevant_instance_of_entities, deadline
+                )
             ),
             knowledge_graph=knowledge_graph,
             relevant_instance_of_entities=relevant_instance_of_entities,
         )
 
+    @classmethod
+    def stream(
+        cls,
+        entities: list[Entity],
+        properties: list[Property],
+        knowledge_graph: KnowledgeGraph,
+        deadline: Deadline | None = None,
+        limit: int = 10,
+        features: dict[Entity, set[str]] | None = None,
+        max_matches_per_value: int | None = None,
+    ) -> Iterator[list[tuple[Entity, float]]]:
+        """
+        Recommendations for a message, based on the linked entities if there
+        are any and on the properties asked for otherwise.
+        """
+        if entities:
+            return cls.stream_from_entities(
+                entities,
+                knowledge_graph=knowledge_graph,
+                deadline=deadline,
+                limit=limit,
+                features=features,
+                max_matches_per_value=max_matches_per_value,
+            )
+        return cls.stream_from_properties(
+            properties,
+            knowledge_graph=knowledge_graph,
+            relevant_instance_of_entities=Entity.instance_of_movies(knowledge_graph),
+            deadline=deadline,
+            limit=limit,
+            features=features,
+            max_matches_per_value=max_matches_per_value,
+        )
+
+    @classmethod
+    def stream_from_entities(
+        cls,
+        entities: list[Entity],
+        knowledge_graph: KnowledgeGraph,
+        deadline: Deadline | None = None,
+        limit: int = 10,
+        features: dict[Entity, set[str]] | None = None,
+        max_matches_per_value: int | None = None,
+    ) -> Iterator[list[tuple[Entity, float]]]:
+        """
+        Yields the ranked top recommendations with their scores every time
+        another shared feature of the given entities has been looked up, the
+        last snapshot equals the result of `from_entities`. If a features
+        dict is given, it is filled with the values each candidate matched.
+        A feature adds its weight from the graph statistics, rare values
+        count more. The most selective features are looked up first and
+        values shared by more than `MAX_VALUE_SHARE` of all movies not at
+        all. Matches are read page by page, `max_matches_per_value` stops
+        reading broad values after that many matches, the seeds included.
+        """
+        return cls.__iter_based_on_entities(
+            entities, knowledge_graph, deadline, limit, features, max_matches_per_value
+        )
+
+    @classmethod
+    def stream_from_properties(
+        cls,
+        properties: list[str],
+        knowledge_graph: KnowledgeGraph,
+        relevant_instance_of_entities: list[Entity] = [],
+        deadline: Deadline | None = None,
+        limit: int = 10,
+        features: dict[Entity, set[str]] | None = None,
+        max_matches_per_value: int | None = None,
+    ) -> Iterator[list[tuple[Entity, float]]]:
+        """
+        Yields the ranked top recommendations with their scores after each
+        property has been looked up, the last snapshot equals the result of
+        `from_properties`. If a features dict is given, it is filled with the
+        properties each candidate matched. Properties are weighted and
+        ordered as in `stream_from_entities`, but asked for and so never
+        skipped. `max_matches_per_value` works as in `stream_from_entities`.
+        """
+        return cls.__iter_based_on_properties(
+            properties,
+            knowledge_graph,
+            relevant_instance_of_entities,
+            deadline,
+            limit,
+            features,
+            max_matches_per_value,
+        )
+
     @staticmethod
-    def __based_on_entities(
+    def __final(snapshots: Iterator[list[tuple[Entity, float]]]) -> list[Entity]:
+        ranked = []
+        for ranked in snapshots:
+            pass
+        return [entity for entity, _ in ranked]
+
+    @staticmethod
+    def lookups(
         entities: list[Entity], knowledge_graph: KnowledgeGraph
-    ) -> list[Entity]:
+    ) -> list[tuple[Relation, Property]]:
+        """
+        The (relation, value) pairs the entities share that recommendations
+        look up, the most selective first. Values shared by more than
+        `MAX_VALUE_SHARE` of all movies are left out unless all are.
+        """
         all_relations = [
             relation for entity in entities for relation in entity.relations
         ]
@@ -100,62 +211,172 @@ class Recommendations:
                 if common_properties:
                     common_properties_per_relation[relation] = common_properties
 
-        all_similar_entities = []
-        for (
-            common_relation,
-            common_properties,
-        ) in common_properties_per_relation.items():
-            for common_property, _ in common_properties:
-                entities_with_property = knowledge_graph.get_triplets(
-                    None, common_relation, common_property
-                )
+        statistics = knowledge_graph.statistics
+        lookups = sorted(
+            (
+                (relation, value)
+                for relation, common_properties in common_properties_per_relation.items()
+                for value, _ in common_properties
+            ),
+            key=lambda lookup: statistics.matches(*lookup),
+        )
+        selective = [
+            lookup for lookup in lookups if statistics.share(*lookup) <= MAX_VALUE_SHARE
+        ]
+        if len(selective) < len(lookups):
+            metrics.increment(
+                "recommendations.broad_lookups_skipped", len(lookups) - len(selective)
+            )
 
-                if entities_with_property:
-                    all_similar_entities.extend(
-                        [e for e, _, _ in entities_with_property]
-                    )
+        # if every shared value is broad, the least broad one still counts
+        return selective or lookups[:1]
+
+    @staticmethod
+    def __iter_based_on_entities(
+        entities: list[Entity],
+        knowledge_graph: KnowledgeGraph,
+        deadline: Deadline | None = None,
+        limit: int = 10,
+        features: dict[Entity, set[str]] | None = None,
+        max_matches_per_value: int | None = None,
+    ) -> Iterator[list[tuple[Entity, float]]]:
+        if deadline is not None:
+            # loads the seed properties within the budget, seeds that could
+            # not be looked up in time are left out
+            entities = [
+                entity for entity in entities if entity.load_properties(deadline)
+            ]
 
-        movie_counts = Counter(all_similar_entities)
+        statistics = knowledge_graph.statistics
+        input_entity_uris = {str(entity.uri) for entity in entities}
+        movie_counts = Counter()
+        for common_relation, common_property in Recommendations.lookups(
+            entities, knowledge_graph
+        ):
+            if deadline is not None and deadline.running_low and movie_counts:
+                deadline.degrade("deep scoring")
+                return
+            similar_entities = []
+            for read, (e, _, _) in enumerate(
+                knowledge_graph.iter_triplets(
+                    None, common_relation, common_property, deadline=deadline
+                ),
+                1,
+            ):
+                if str(e.uri) not in input_entity_uris:
+                    similar_entities.append(e)
+                if Recommendations.__stop_early(
+                    read,
+                    similar_entities,
+                    max_matches_per_value,
+                    deadline,
+                    movie_counts,
+                ):
+                    break
 
-        input_entity_uris = {entity.uri for entity in entities}
-        sorted_recommendations = [
-            movie
-            for movie, _ in movie_counts.most_common(10)
-            if str(movie.uri) not in input_entity_uris
-        ]
-        return sorted_recommendations
+            if similar_entities:
+                weight = statistics.weight(common_relation, common_property)
+                for e in similar_entities:
+                    movie_counts[e] += weight
+                if features is not None:
+                    Recommendations.__add_feature(
+                        features, similar_entities, common_property
+                    )
+                yield Recommendations.rank(movie_counts, statistics, limit)
 
     @staticmethod
-    def __based_on_properties(
+    def __iter_based_on_properties(
         properties: list[Property],
         knowledge_graph: KnowledgeGraph,
         relevant_instance_of_entities: list[Entity] = [],
-    ) -> list[Entity]:
+        deadline: Deadline | None = None,
+        limit: int = 10,
+        features: dict[Entity, set[str]] | None = None,
+        max_matches_per_value: int | None = None,
+    ) -> Iterator[list[tuple[Entity, float]]]:
         condition_triplets = [
             (None, Relation.instance_of(knowledge_graph), e)
             for e in relevant_instance_of_entities
         ]
 
-        all_similar_entities = []
-        for prop in properties:
-            query = f"""
-                SELECT ?uri ?label WHERE {{
-                    ?uri <{RDFS.label}> ?label .
-                    ?uri ?relation <{prop.uri}> .
-                    {{ {SPARQLQuery.union_clauses(condition_triplets, ["uri"])} }}
-                }}
+        statistics = knowledge_graph.statistics
+        entity_counts = Counter()
+        for prop in sorted(properties, key=lambda p: statistics.matches(None, p)):
+            if deadline is not None and deadline.running_low and entity_counts:
+                deadline.degrade("deep scoring")
+                return
+            where = f"""
+                ?uri <{RDFS.label}> ?label .
+                ?uri ?relation <{prop.uri}> .
+                {{ {SPARQLQuery.union_clauses(condition_triplets, ["uri"])} }}
             """
-            query_result = knowledge_graph.query(query)
-            all_similar_entities.extend(
-                [
-                    Entity(URIRef(uri["value"]), knowledge_graph, label["value"])
-                    for uri, label in zip(
-                        query_result["uri"],
-                        query_result["label"],
+            similar_entities = []
+            for row in knowledge_graph.iter_query(
+                ["?uri", "?label"], where, deadline=deadline, keyset=True
+            ):
+                similar_entities.append(
+                    Entity(
+                        IRI(row["uri"]["value"]),
+                        knowledge_graph,
+                        row["label"]["value"],
                     )
-                ]
-            )
+                )
+                if Recommendations.__stop_early(
+                    len(similar_entities),
+                    similar_entities,
+                    max_matches_per_value,
+                    deadline,
+                    entity_counts,
+                ):
+                    break
+            weight = statistics.weight(None, prop)
+            for e in similar_entities:
+                entity_counts[e] += weight
+            if features is not None:
+                Recommendations.__add_feature(features, similar_entities, prop)
+            yield Recommendations.rank(entity_counts, statistics, limit)
+
+    @staticmethod
+    def rank(
+        counts: Counter, statistics: GraphStatistics, limit: int
+    ) -> list[tuple[Entity, float]]:
+        # popularity only decides between candidates with the same score, the
+        # uri between equally popular ones, so the order of the matches and
+        # of batched scoring does not matter
+        return heapq.nsmallest(
+            limit,
+            counts.items(),
+            key=lambda item: (
+                -round(item[1], 6),
+                -statistics.popularity(item[0]),
+                str(item[0].uri),
+            ),
+        )
 
-        entity_counts = Counter(all_similar_entities)
-        sorted_recommendations = [entity for entity, _ in entity_counts.most_common(10)]
-        return sorted_recommendations
+    @staticmethod
+    def __stop_early(
+        read: int,
+        matches: list[Entity],
+        max_matches_per_value: int | None,
+        deadline: Deadline | None,
+        counts: Counter,
+    ) -> bool:
+        # counts what was read, so the batcher can cut the shared matches alike
+        if max_matches_per_value is not None and read >= max_matches_per_value:
+            return True
+        if deadline is not None and deadline.running_low and (counts or matches):
+            deadline.degrade("deep scoring")
+            return True
+        return False
+
+    @staticmethod
+    def __add_feature(
+        features: dict[Entity, set[str]], entities: list[Entity], value: Property
+    ):
+        key = Recommendations.feature_key(value)
+        for entity in entities:
+            features.setdefault(entity, set()).add(key)
+
+    @staticmethod
+    def feature_key(value: Property) -> str:
+        return str(value.uri) if isinstance(value, Entity) else str(value)
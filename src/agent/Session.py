@@ -0,0 +1,81 @@
+import re
+
+from core import Entity, Property
+from utils import LRUCache
+
+from .Recommendations import Recommendations
+
+# explicit requests for more of the same, not words like "just" or "but"
+# that any new request can contain
+FOLLOW_UP_PATTERN = re.compile(
+    r"\b(more|another( one)?|(the |any )?others|(something|anything) else"
+    r"|similar ones|(ones? )?like (that|those|these|them)"
+    r"|only (the )?ones)\b"
+)
+
+
+class Session:
+    """
+    State of one conversation kept between messages: the linked entities,
+    the feature values every scored candidate matched and the ranked
+    candidates, so follow-ups can be answered without new graph queries.
+    """
+
+    def __init__(self, room_id: str):
+        self.room_id = room_id
+        self.entities: list[Entity] = []
+        self.properties: list[Property] = []
+        self.candidates: list[tuple[Entity, float]] = []
+        self.features: dict[Entity, set[str]] = {}
+        self.__shown: set[str] = set()
+
+    def update(
+        self,
+        entities: list[Entity],
+        properties: list[Property],
+        candidates: list[tuple[Entity, float]],
+        features: dict[Entity, set[str]],
+    ):
+        self.entities = entities
+        self.properties = properties
+        self.candidates = candidates
+        self.features = features
+        self.__shown = set()
+
+    def is_follow_up(self, content: str) -> bool:
+        return bool(self.candidates) and bool(FOLLOW_UP_PATTERN.search(content.lower()))
+
+    def mark_shown(self, entities: list[Entity]):
+        self.__shown.update(str(entity.uri) for entity in entities)
+
+    def unseen(self) -> list[tuple[Entity, float]]:
+        return [
+            (entity, score)
+            for entity, score in self.candidates
+            if str(entity.uri) not in self.__shown
+        ]
+
+    def refine(self, properties: list[Property]) -> list[tuple[Entity, float]]:
+        """
+        Keeps the cached candidates that matched all the given property
+        values during scoring, without looking anything up in the graph.
+        """
+        wanted = {Recommendations.feature_key(p) for p in properties}
+        return [
+            (entity, score)
+            for entity, score in self.candidates
+            if wanted <= self.features.get(entity, set())
+        ]
+
+
+class SessionStore:
+    def __init__(self, max_sessions: int = 1000, idle_timeout: float = 1800):
+        self.__sessions: LRUCache[str, Session] = LRUCache(
+            maxsize=max_sessions, ttl=idle_timeout
+        )
+
+    def __len__(self):
+        return len(self.__sessions)
+
+    def get(self, room_id: str) -> Session:
+        return self.__sessions.get_or_create(room_id, lambda: Session(room_id))
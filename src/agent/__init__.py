@@ -1,5 +1,18 @@
 from agent.Agentv3 import Agentv3
+from agent.FactualAnswer import FactualAnswer
+from agent.IntentRouter import IntentRouter
 from agent.Message import Message
+from agent.RecommendationBatcher import RecommendationBatcher
 from agent.Recommendations import Recommendations
+from agent.Session import Session, SessionStore
 
-__all__ = ["Agentv3", "Message", "Recommendations"]
+__all__ = [
+    "Agentv3",
+    "FactualAnswer",
+    "IntentRouter",
+    "Message",
+    "RecommendationBatcher",
+    "Recommendations",
+    "Session",
+    "SessionStore",
+]
@@ -0,0 +1,134 @@
+import argparse
+import os
+import sys
+import time
+
+from benchmarks import BenchmarkSuite, SyntheticGraph
+from benchmarks.fault_scenarios import run_fault_scenarios
+from benchmarks.hot_paths import build_knowledge_graph, run_hot_paths
+from benchmarks.import_time import run_import_time, slowest_imports
+from benchmarks.load_scenarios import run_load_scenarios
+
+# preloading an in-memory rdflib graph gets slow beyond this size, larger
+# graphs are exported and benchmarked against Fuseki
+MAX_IN_MEMORY_SIZE = 20_000
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Offline micro-benchmarks of the agent hot paths "
+        "on synthetic movie graphs."
+    )
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[1_000, 10_000],
+        help="number of entities of the generated graphs, 1000 to 1000000, "
+        f"in memory up to about {MAX_IN_MEMORY_SIZE}",
+    )
+    parser.add_argument(
+        "--export",
+        metavar="DIR",
+        help="only write each graph as DIR/synthetic-<size>.nt, without "
+        "keeping it in memory, to be loaded with tdb2.tdbloader",
+    )
+    parser.add_argument(
+        "--endpoint",
+        metavar="URL",
+        help="run the hot paths against a SPARQL endpoint holding the "
+        "exported graph of the single size and seed given",
+    )
+    parser.add_argument("--cases", nargs="+", default=None)
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--number", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save-baseline", metavar="PATH")
+    parser.add_argument("--compare", metavar="PATH")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.15,
+        help="relative slowdown of the median that counts as regression",
+    )
+    parser.add_argument(
+        "--faults",
+        action="store_true",
+        help="also run the circuit breaker and hedging scenarios "
+        "against a local fault-injecting server",
+    )
+    parser.add_argument(
+        "--replicas",
+        action="store_true",
+        help="also measure graph query throughput against 1, 2 and 4 "
+        "local SPARQL replicas",
+    )
+    parser.add_argument(
+        "--imports",
+        action="store_true",
+        help="also measure the cold start of fresh interpreters up to the "
+        "first SPARQL query and list the slowest imports",
+    )
+    args = parser.parse_args()
+    if args.export and args.endpoint:
+        parser.error("--export and --endpoint are separate steps")
+    if args.endpoint and len(args.sizes) != 1:
+        parser.error("--endpoint holds the graph of a single size")
+    if (args.export or args.endpoint) and (
+        args.faults or args.replicas or args.imports
+    ):
+        parser.error("--faults, --replicas and --imports need the in-memory graph")
+
+    suite = BenchmarkSuite(repeat=args.repeat, number=args.number)
+    for size in args.sizes:
+        if size > MAX_IN_MEMORY_SIZE and not (args.export or args.endpoint):
+            print(
+                f"Warning: preloading an in-memory graph with {size} entities "
+                "takes minutes, use --export and --endpoint beyond "
+                f"{MAX_IN_MEMORY_SIZE}"
+            )
+        start = time.perf_counter()
+        ntriples = None
+        if args.export:
+            os.makedirs(args.export, exist_ok=True)
+            ntriples = os.path.join(args.export, f"synthetic-{size}.nt")
+        elif args.endpoint:
+            # the endpoint holds the triples, only the uris are needed here
+            ntriples = os.devnull
+        synthetic = SyntheticGraph(num_entities=size, seed=args.seed, ntriples=ntriples)
+        if args.export:
+            print(
+                f"Exported graph with {size} entities ({synthetic.triples} "
+                f"triples) to {ntriples} in {time.perf_counter() - start:.1f}s"
+            )
+            continue
+        knowledge_graph = build_knowledge_graph(synthetic, args.endpoint)
+        print(
+            f"Generated graph with {size} entities "
+            f"({synthetic.triples} triples) in {time.perf_counter() - start:.1f}s"
+        )
+        for result in run_hot_paths(suite, synthetic, knowledge_graph, args.cases):
+            print(result)
+        if args.faults:
+            for scenario in run_fault_scenarios(synthetic):
+                print(scenario)
+        if args.replicas:
+            for scenario in run_load_scenarios(synthetic):
+                print(scenario)
+
+    if args.imports:
+        for result in run_import_time(suite, synthetic):
+            print(result)
+        for name, milliseconds in slowest_imports("main"):
+            print(f"{'import ' + name:<48} {milliseconds:10.1f} ms")
+
+    if args.save_baseline:
+        suite.save(args.save_baseline)
+        print(f"Baseline saved to {args.save_baseline}")
+
+    if args.compare:
+        regressions = suite.compare(args.compare, args.threshold)
+        for regression in regressions:
+            print(regression)
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions above {args.threshold:.0%}")
@@ -0,0 +1,146 @@
+import gc
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    size: int
+    repeat: int
+    number: int
+    median: float
+    mean: float
+    minimum: float
+    stdev: float
+    iqr: float
+    peak_memory: int
+
+    @property
+    def key(self) -> str:
+        return f"{self.name}[{self.size}]"
+
+    def __str__(self):
+        return (
+            f"{self.key:<48} median {self.median * 1e3:10.3f} ms  "
+            f"min {self.minimum * 1e3:10.3f} ms  "
+            f"iqr {self.iqr * 1e3:8.3f} ms  "
+            f"peak {self.peak_memory / 1024:10.1f} KiB"
+        )
+
+
+@dataclass
+class Regression:
+    key: str
+    baseline: float
+    current: float
+
+    @property
+    def ratio(self) -> float:
+        return self.current / self.baseline if self.baseline else float("inf")
+
+    def __str__(self):
+        return (
+            f"REGRESSION {self.key}: {self.baseline * 1e3:.3f} ms -> "
+            f"{self.current * 1e3:.3f} ms ({(self.ratio - 1) * 100:+.1f}%)"
+        )
+
+
+@dataclass
+class BenchmarkSuite:
+    """
+    Runs benchmark cases with a warmup, repeated timing with the garbage
+    collector disabled and a separate tracemalloc pass, so that the memory
+    tracing does not distort the timings.
+    """
+
+    repeat: int = 7
+    number: int = 1
+    warmup: int = 1
+    results: list[BenchmarkResult] = field(default_factory=list)
+
+    def run(
+        self,
+        name: str,
+        size: int,
+        func: Callable[[Any], Any],
+        setup: Callable[[], Any] = lambda: None,
+    ) -> BenchmarkResult:
+        for _ in range(self.warmup):
+            func(setup())
+
+        timings = []
+        for _ in range(self.repeat):
+            args = [setup() for _ in range(self.number)]
+            gc.collect()
+            gc.disable()
+            try:
+                start = time.perf_counter()
+                for arg in args:
+                    func(arg)
+                timings.append((time.perf_counter() - start) / self.number)
+            finally:
+                gc.enable()
+
+        arg = setup()
+        gc.collect()
+        tracemalloc.start()
+        try:
+            func(arg)
+            _, peak_memory = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        quartiles = (
+            statistics.quantiles(timings, n=4) if len(timings) > 1 else timings * 3
+        )
+        result = BenchmarkResult(
+            name=name,
+            size=size,
+            repeat=self.repeat,
+            number=self.number,
+            median=statistics.median(timings),
+            mean=statistics.fmean(timings),
+            minimum=min(timings),
+            stdev=statistics.stdev(timings) if len(timings) > 1 else 0.0,
+            iqr=quartiles[2] - quartiles[0],
+            peak_memory=peak_memory,
+        )
+        self.results.append(result)
+        return result
+
+    def save(self, path: str):
+        with open(path, "w") as f:
+            json.dump(
+                {
+                    "machine": platform.platform(),
+                    "python": platform.python_version(),
+                    "results": {r.key: asdict(r) for r in self.results},
+                },
+                f,
+                indent=2,
+            )
+
+    def compare(self, path: str, threshold: float = 0.15) -> list[Regression]:
+        """
+        Compares the medians against a saved baseline and returns every case
+        that got slower by more than the threshold (a fraction, 0.15 = 15%).
+        """
+        with open(path) as f:
+            baseline = json.load(f)["results"]
+
+        regressions = []
+        for result in self.results:
+            if result.key not in baseline:
+                continue
+            baseline_median = baseline[result.key]["median"]
+            if result.median > baseline_median * (1 + threshold):
+                regressions.append(
+                    Regression(result.key, baseline_median, result.median)
+                )
+        return regressions
@@ -0,0 +1,205 @@
+import json
+import random
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator
+from urllib.parse import parse_qs, urlparse
+
+from .SyntheticGraph import LocalSPARQLWrapper, SyntheticGraph
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # bursts of concurrent clients overflow the default backlog of 5
+    request_queue_size = 128
+
+
+class FaultInjectingServer:
+    """
+    Local stand-in for Fuseki and llama-server. It answers SPARQL queries
+    on /sparql from a synthetic graph, and chat completions and tokenize
+    requests on the llama-server routes with canned text. Faults can be
+    changed while it runs:
+    - a share of requests fails with a 500 (`error_rate`)
+    - a share of requests stalls for `slow_latency` seconds (`slow_rate`)
+    - every request is delayed by `latency` seconds
+    With `concurrency` set, at most that many requests are worked on at the
+    same time and the rest wait, like a saturated Fuseki.
+    """
+
+    def __init__(
+        self,
+        synthetic: SyntheticGraph | None = None,
+        latency: float = 0.005,
+        slow_rate: float = 0.0,
+        slow_latency: float = 1.0,
+        error_rate: float = 0.0,
+        concurrency: int | None = None,
+        seed: int = 0,
+    ):
+        self.synthetic = synthetic
+        self.latency = latency
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.error_rate = error_rate
+        self.requests = 0
+        self.failed = 0
+        self.stalled = 0
+        self.__random = random.Random(seed)
+        self.__lock = threading.Lock()
+        self.__workers = (
+            threading.Semaphore(concurrency) if concurrency is not None else None
+        )
+        self.__server: _Server | None = None
+        self.__thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.__server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def sparql_url(self) -> str:
+        return f"{self.url}/sparql"
+
+    def start(self) -> "FaultInjectingServer":
+        self.__server = _Server(("127.0.0.1", 0), self.__handler())
+        self.__thread = threading.Thread(
+            target=self.__server.serve_forever, daemon=True
+        )
+        self.__thread.start()
+        return self
+
+    def stop(self):
+        if self.__server is not None:
+            self.__server.shutdown()
+            self.__server.server_close()
+            self.__server = None
+
+    def __enter__(self) -> "FaultInjectingServer":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @contextmanager
+    def worker(self) -> Iterator[None]:
+        if self.__workers is None:
+            yield
+            return
+        with self.__workers:
+            yield
+
+    def inject(self) -> bool:
+        """Applies the configured faults, returns False if the request fails."""
+        with self.__lock:
+            self.requests += 1
+            draw = self.__random.random()
+            fail = draw < self.error_rate
+            stall = not fail and draw < self.error_rate + self.slow_rate
+            self.failed += fail
+            self.stalled += stall
+        time.sleep(self.latency + (self.slow_latency if stall else 0.0))
+        return not fail
+
+    def __handler(self) -> type[BaseHTTPRequestHandler]:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                self.__route(url.path, parse_qs(url.query))
+
+            def do_POST(self):
+                url = urlparse(self.path)
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length).decode("utf-8")
+                if self.headers.get("Content-Type", "").startswith("application/json"):
+                    self.__route(url.path, json.loads(body or "{}"))
+                else:
+                    self.__route(url.path, parse_qs(body))
+
+            def log_message(self, *args):
+                pass
+
+            def __route(self, path: str, params: dict):
+                with server.worker():
+                    self.__handle(path, params)
+
+            def __handle(self, path: str, params: dict):
+                if not server.inject():
+                    return self.__send(500, {"error": "injected fault"})
+                if path.endswith("/sparql"):
+                    return self.__sparql(params)
+                if path.endswith("/chat/completions"):
+                    return self.__completion(params)
+                if path.endswith("/tokenize"):
+                    tokens = params.get("content", "").split()
+                    return self.__send(200, {"tokens": list(range(len(tokens)))})
+                if path.endswith("/models"):
+                    return self.__send(200, {"object": "list", "data": []})
+                self.__send(404, {"error": "not found"})
+
+            def __sparql(self, params: dict):
+                if server.synthetic is None:
+                    return self.__send(404, {"error": "no graph"})
+                query = params.get("query", [""])[0]
+                graph = LocalSPARQLWrapper(server.synthetic.graph)
+                graph.setQuery(query)
+                self.__send(
+                    200, graph.query().convert(), "application/sparql-results+json"
+                )
+
+            def __completion(self, params: dict):
+                text = "Here are some movies you might like."
+                usage = {"prompt_tokens": 10, "completion_tokens": len(text.split())}
+                if not params.get("stream"):
+                    return self.__send(
+                        200,
+                        {
+                            "id": "fault-injecting-server",
+                            "object": "chat.completion",
+                            "created": int(time.time()),
+                            "model": params.get("model", "local-model"),
+                            "choices": [
+                                {
+                                    "index": 0,
+                                    "message": {"role": "assistant", "content": text},
+                                    "finish_reason": "stop",
+                                }
+                            ],
+                            "usage": usage,
+                        },
+                    )
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                for word in text.split(" "):
+                    self.__event(
+                        {"choices": [{"index": 0, "delta": {"content": f"{word} "}}]}
+                    )
+                self.__event({"choices": [], "usage": usage})
+                self.wfile.write(b"data: [DONE]\n\n")
+
+            def __event(self, chunk: dict):
+                chunk = {
+                    "id": "fault-injecting-server",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": "local-model",
+                    **chunk,
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+
+            def __send(self, status: int, body: dict, content_type="application/json"):
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        return Handler
@@ -0,0 +1,471 @@
+import random
+import re
+import threading
+from dataclasses import dataclass, field
+
+from rdflib import RDFS, Graph, Literal, Namespace, URIRef
+from rdflib.term import BNode
+
+WD = Namespace("http://www.wikidata.org/entity/")
+WDT = Namespace("http://www.wikidata.org/prop/direct/")
+SCHEMA = Namespace("http://schema.org/")
+
+RELATION_LABELS = {
+    "P31": "instance of",
+    "P57": "director",
+    "P58": "screenwriter",
+    "P136": "genre",
+    "P161": "cast member",
+    "P166": "award received",
+    "P272": "production company",
+    "P495": "country of origin",
+    "P577": "publication date",
+}
+
+TYPE_LABELS = {
+    "Q5": "human",
+    "Q6256": "country",
+    "Q11424": "film",
+    "Q201658": "film genre",
+    "Q202866": "animated film",
+    "Q618779": "award",
+    "Q1762059": "film production company",
+}
+
+GENRES = [
+    "drama film",
+    "comedy film",
+    "action film",
+    "thriller film",
+    "horror film",
+    "science fiction film",
+    "romance film",
+    "crime film",
+    "documentary film",
+    "fantasy film",
+    "adventure film",
+    "musical film",
+    "war film",
+    "western film",
+    "mystery film",
+    "biographical film",
+    "family film",
+    "historical film",
+    "sports film",
+    "teen film",
+    "disaster film",
+    "spy film",
+    "superhero film",
+    "psychological thriller",
+    "romantic comedy",
+    "black comedy",
+    "neo-noir",
+    "coming-of-age story",
+    "slasher film",
+    "heist film",
+]
+
+COUNTRIES = [
+    "United States of America",
+    "United Kingdom",
+    "France",
+    "Germany",
+    "Italy",
+    "Japan",
+    "India",
+    "Canada",
+    "Spain",
+    "South Korea",
+    "Australia",
+    "Mexico",
+    "Sweden",
+    "Denmark",
+    "Brazil",
+    "Argentina",
+    "Poland",
+    "Norway",
+    "Ireland",
+    "Belgium",
+    "Netherlands",
+    "Switzerland",
+    "Austria",
+    "Hong Kong",
+]
+
+AWARDS = [
+    "Academy Award for Best Picture",
+    "Academy Award for Best Director",
+    "Golden Globe Award for Best Actor",
+    "Palme d'Or",
+    "Golden Lion",
+    "Golden Bear",
+    "BAFTA Award for Best Film",
+    "Saturn Award",
+]
+
+ADJECTIVES = [
+    "Silent",
+    "Broken",
+    "Hidden",
+    "Golden",
+    "Last",
+    "Burning",
+    "Frozen",
+    "Lost",
+    "Wild",
+    "Crimson",
+    "Midnight",
+    "Distant",
+    "Hollow",
+    "Savage",
+    "Gentle",
+    "Iron",
+    "Secret",
+    "Fallen",
+    "Electric",
+    "Forgotten",
+    "Dark",
+    "Bright",
+    "Endless",
+    "Quiet",
+    "Restless",
+    "Scarlet",
+    "Wandering",
+    "Bitter",
+    "Shining",
+    "Eternal",
+]
+
+NOUNS = [
+    "River",
+    "Kingdom",
+    "Garden",
+    "Empire",
+    "Shadow",
+    "Horizon",
+    "Harbor",
+    "Mountain",
+    "City",
+    "Promise",
+    "Voyage",
+    "Storm",
+    "Machine",
+    "Letter",
+    "Island",
+    "Winter",
+    "Summer",
+    "Station",
+    "Frontier",
+    "Dream",
+    "Heart",
+    "Road",
+    "Forest",
+    "Crown",
+    "Mirror",
+    "Signal",
+    "Bridge",
+    "Desert",
+    "Ocean",
+    "Castle",
+]
+
+FIRST_NAMES = [
+    "Anna",
+    "James",
+    "Maria",
+    "John",
+    "Sofia",
+    "Luca",
+    "Emma",
+    "Noah",
+    "Mia",
+    "Liam",
+    "Chloe",
+    "Ethan",
+    "Laura",
+    "Oscar",
+    "Nina",
+    "Hugo",
+    "Clara",
+    "Felix",
+    "Ines",
+    "Paul",
+    "Greta",
+    "Leo",
+    "Alice",
+    "Marco",
+    "Julia",
+    "Tomas",
+    "Elena",
+    "Victor",
+    "Hannah",
+    "Samuel",
+]
+
+LAST_NAMES = [
+    "Smith",
+    "Rossi",
+    "Müller",
+    "Dubois",
+    "Tanaka",
+    "Garcia",
+    "Novak",
+    "Berg",
+    "Kowalski",
+    "Silva",
+    "Jensen",
+    "Moreau",
+    "Fischer",
+    "Costa",
+    "Larsen",
+    "Keller",
+    "Romano",
+    "Weber",
+    "Lindqvist",
+    "Herrera",
+    "Brennan",
+    "Kim",
+    "Patel",
+    "Okafor",
+    "Ivanova",
+    "Schmidt",
+    "Bauer",
+    "Conti",
+    "Hall",
+    "Park",
+]
+
+
+@dataclass
+class SyntheticGraph:
+    """
+    Generates a reproducible movie graph shaped like the ATAI dataset, i.e.
+    wikidata style movies, people, genres, countries and companies, and keeps
+    it in an in-memory rdflib store that can be queried without Fuseki.
+    Graphs too large for that, up to 1M entities and more, are streamed to
+    the N-Triples file `ntriples` instead, to be loaded into Fuseki with
+    `tdb2.tdbloader`, and `graph` stays empty. The same seed gives the same
+    graph either way.
+    """
+
+    num_entities: int = 1000
+    seed: int = 0
+    ntriples: str | None = None
+    graph: Graph = field(init=False, repr=False)
+    triples: int = field(init=False, repr=False)
+    movies: list[URIRef] = field(init=False, repr=False)
+    labels: dict[URIRef, str] = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.__random = random.Random(self.seed)
+        self.__label_counts: dict[str, int] = {}
+        self.__next_id = 1_000_000
+        self.graph = Graph()
+        self.movies = []
+        self.labels = {}
+        self.genres: list[URIRef] = []
+        self.countries: list[URIRef] = []
+        self.humans: list[URIRef] = []
+        self.companies: list[URIRef] = []
+        self.awards: list[URIRef] = []
+        self.triples = 0
+        if self.ntriples is None:
+            self.__add = self.graph.add
+            self.__generate()
+            self.triples = len(self.graph)
+            return
+        with open(self.ntriples, "w", encoding="utf-8") as file:
+
+            def write(triple: tuple):
+                file.write(" ".join(term.n3() for term in triple) + " .\n")
+                self.triples += 1
+
+            self.__add = write
+            self.__generate()
+
+    @property
+    def in_memory(self) -> bool:
+        return self.ntriples is None
+
+    def __generate(self):
+        for pid, label in RELATION_LABELS.items():
+            self.__add((WDT[pid], RDFS.label, Literal(label)))
+        for qid, label in TYPE_LABELS.items():
+            self.__add_entity(WD[qid], label, None)
+
+        n = max(self.num_entities, 100)
+        self.genres = [self.__add_new(label, "Q201658") for label in GENRES]
+        self.countries = [self.__add_new(label, "Q6256") for label in COUNTRIES]
+        self.awards = [self.__add_new(label, "Q618779") for label in AWARDS]
+        self.companies = [
+            self.__add_new(self.__company_label(), "Q1762059")
+            for _ in range(max(n // 100, 5))
+        ]
+        self.humans = [
+            self.__add_new(self.__person_label(), "Q5") for _ in range(max(n // 4, 20))
+        ]
+
+        remaining = n - len(self.labels)
+        for _ in range(max(remaining, 10)):
+            self.movies.append(self.__add_movie())
+
+    def __add_movie(self) -> URIRef:
+        animated = self.__random.random() < 0.1
+        movie = self.__add_new(
+            self.__movie_label(), "Q202866" if animated else "Q11424"
+        )
+        for genre in self.__pick(self.genres, self.__random.randint(1, 3)):
+            self.__add((movie, WDT.P136, genre))
+        for country in self.__pick(self.countries, 1):
+            self.__add((movie, WDT.P495, country))
+        for director in self.__pick(self.humans, 1):
+            self.__add((movie, WDT.P57, director))
+        for writer in self.__pick(self.humans, self.__random.randint(1, 2)):
+            self.__add((movie, WDT.P58, writer))
+        for actor in self.__pick(self.humans, self.__random.randint(2, 5)):
+            self.__add((movie, WDT.P161, actor))
+        for company in self.__pick(self.companies, 1):
+            self.__add((movie, WDT.P272, company))
+        if self.__random.random() < 0.05:
+            for award in self.__pick(self.awards, 1):
+                self.__add((movie, WDT.P166, award))
+        year = self.__random.randint(1920, 2024)
+        self.__add((movie, WDT.P577, Literal(f"{year}-01-01")))
+        self.__add(
+            (
+                movie,
+                SCHEMA.description,
+                Literal(f"{year} film"),
+            )
+        )
+        return movie
+
+    def __pick(self, population: list[URIRef], k: int) -> list[URIRef]:
+        # zipf-like skew so that a few values are very common, like in real data
+        picked = set()
+        size = len(population)
+        while len(picked) < min(k, size):
+            index = int(size ** self.__random.random()) - 1
+            picked.add(population[max(index, 0)])
+        return list(picked)
+
+    def __add_new(self, label: str, instance_of: str) -> URIRef:
+        self.__next_id += 1
+        uri = WD[f"Q{self.__next_id}"]
+        self.__add_entity(uri, label, WD[instance_of])
+        return uri
+
+    def __add_entity(self, uri: URIRef, label: str, instance_of: URIRef | None):
+        self.labels[uri] = label
+        self.__add((uri, RDFS.label, Literal(label)))
+        if instance_of is not None:
+            self.__add((uri, WDT.P31, instance_of))
+
+    def __unique(self, label: str) -> str:
+        count = self.__label_counts.get(label, 0) + 1
+        self.__label_counts[label] = count
+        return label if count == 1 else f"{label} {count}"
+
+    def __movie_label(self) -> str:
+        adjective = self.__random.choice(ADJECTIVES)
+        noun = self.__random.choice(NOUNS)
+        return self.__unique(f"The {adjective} {noun}")
+
+    def __person_label(self) -> str:
+        first = self.__random.choice(FIRST_NAMES)
+        last = self.__random.choice(LAST_NAMES)
+        return self.__unique(f"{first} {last}")
+
+    def __company_label(self) -> str:
+        return self.__unique(f"{self.__random.choice(NOUNS)} Pictures")
+
+    def sample_movie_labels(self, k: int) -> list[str]:
+        return [self.labels[m] for m in self.__random.sample(self.movies, k)]
+
+    def sample_messages(self, k: int) -> list[str]:
+        messages = []
+        for i in range(k):
+            if i % 2 == 0:
+                titles = self.sample_movie_labels(self.__random.randint(1, 3))
+                messages.append(
+                    f"Given that I like {', '.join(titles)}, "
+                    "can you recommend some movies?"
+                )
+            else:
+                genre = self.labels[self.__random.choice(self.genres)]
+                country = self.labels[self.__random.choice(self.countries)]
+                messages.append(
+                    f"Recommend movies with the genre {genre} from {country}, "
+                    "who directed them and when were they released?"
+                )
+        return messages
+
+
+# the SPARQL parser of rdflib is not thread-safe
+_rdflib_lock = threading.Lock()
+
+UPDATE = re.compile(r"\s*(INSERT|DELETE)\b", re.IGNORECASE)
+
+
+class LocalSPARQLResult:
+    def __init__(self, response: dict):
+        self.__response = response
+
+    def convert(self) -> dict:
+        return self.__response
+
+
+class LocalSPARQLWrapper:
+    """
+    Drop-in replacement for the parts of SPARQLWrapper used by the
+    KnowledgeGraph, answering queries from an in-memory rdflib graph.
+    """
+
+    def __init__(self, graph: Graph):
+        self.__graph = graph
+        # like one SPARQLWrapper per thread, so it can be shared by threads
+        self.__local = threading.local()
+        self.__lock = threading.Lock()
+        self.queries_executed = 0
+
+    def setQuery(self, query: str):
+        self.__local.query = query
+
+    def setReturnFormat(self, return_format: str):
+        pass
+
+    def setMethod(self, method: str):
+        pass
+
+    def setTimeout(self, timeout: int):
+        pass
+
+    def query(self) -> LocalSPARQLResult:
+        with self.__lock:
+            self.queries_executed += 1
+        with _rdflib_lock:
+            if UPDATE.match(self.__local.query):
+                self.__graph.update(self.__local.query)
+                return LocalSPARQLResult({})
+            result = self.__graph.query(self.__local.query)
+            if result.type == "ASK":
+                return LocalSPARQLResult({"head": {}, "boolean": result.askAnswer})
+            variables = [str(v) for v in result.vars]
+            bindings = []
+            for row in result:
+                binding = {}
+                for var, term in zip(variables, row):
+                    if term is not None:
+                        binding[var] = self.__binding(term)
+                bindings.append(binding)
+        return LocalSPARQLResult(
+            {"head": {"vars": variables}, "results": {"bindings": bindings}}
+        )
+
+    @staticmethod
+    def __binding(term) -> dict:
+        if isinstance(term, URIRef):
+            return {"type": "uri", "value": str(term)}
+        if isinstance(term, BNode):
+            return {"type": "bnode", "value": str(term)}
+        return {"type": "literal", "value": str(term)}
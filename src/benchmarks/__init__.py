@@ -0,0 +1,12 @@
+from .BenchmarkSuite import BenchmarkResult, BenchmarkSuite, Regression
+from .FaultInjectingServer import FaultInjectingServer
+from .SyntheticGraph import LocalSPARQLWrapper, SyntheticGraph
+
+__all__ = [
+    "BenchmarkResult",
+    "BenchmarkSuite",
+    "FaultInjectingServer",
+    "Regression",
+    "LocalSPARQLWrapper",
+    "SyntheticGraph",
+]
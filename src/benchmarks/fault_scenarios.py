@@ -0,0 +1,105 @@
+import random
+import time
+
+from core import Entity, KnowledgeGraph
+from llm import LargeLanguageModel
+from utils import CircuitBreaker, CircuitOpen, Deadline, Metrics, metrics
+
+from .FaultInjectingServer import FaultInjectingServer
+from .SyntheticGraph import SyntheticGraph
+
+
+def latency_summary(name: str, latencies: list[float], **extra) -> dict:
+    samples = sorted(latencies)
+    return {
+        "scenario": name,
+        "requests": len(samples),
+        "p50_ms": round(Metrics.percentile(samples, 50) * 1000, 1),
+        "p99_ms": round(Metrics.percentile(samples, 99) * 1000, 1),
+        "max_ms": round(samples[-1] * 1000, 1),
+        **extra,
+    }
+
+
+def sparql_tail(synthetic: SyntheticGraph, hedge: bool, requests: int = 200) -> dict:
+    """One in twenty queries stalls, hedging should cut the tail."""
+    rng = random.Random(synthetic.seed)
+    with FaultInjectingServer(synthetic, slow_rate=0.05, slow_latency=0.5) as server:
+        knowledge_graph = KnowledgeGraph(server.sparql_url, hedge=hedge)
+        latencies = []
+        for _ in range(requests):
+            knowledge_graph.clear_cache()
+            entity = Entity(rng.choice(synthetic.movies), knowledge_graph)
+            start = time.perf_counter()
+            knowledge_graph.get_properties(entity)
+            latencies.append(time.perf_counter() - start)
+        return latency_summary(
+            f"sparql_tail{'_hedged' if hedge else ''}",
+            latencies,
+            hedges=metrics.counter("hedge.sparql.sent"),
+        )
+
+
+def sparql_outage(synthetic: SyntheticGraph, requests: int = 50) -> dict:
+    """Fuseki stops answering, the breaker should fail fast and recover."""
+    rng = random.Random(synthetic.seed)
+    with FaultInjectingServer(synthetic, error_rate=1.0, slow_latency=0.0) as server:
+        knowledge_graph = KnowledgeGraph(
+            server.sparql_url,
+            breaker=CircuitBreaker("sparql", failure_threshold=5, reset_timeout=0.2),
+        )
+        latencies = []
+        for _ in range(requests):
+            deadline = Deadline(2.0)
+            start = time.perf_counter()
+            knowledge_graph.get_properties(
+                Entity(rng.choice(synthetic.movies), knowledge_graph), deadline
+            )
+            latencies.append(time.perf_counter() - start)
+        sent_during_outage = server.requests
+
+        server.error_rate = 0.0
+        time.sleep(0.25)
+        knowledge_graph.get_properties(Entity(synthetic.movies[0], knowledge_graph))
+        return latency_summary(
+            "sparql_outage",
+            latencies,
+            reached_server=sent_during_outage,
+            state_after_recovery=knowledge_graph.circuit_state,
+        )
+
+
+def llm_outage(requests: int = 10) -> dict:
+    """llama-server fails every request, callers should not pile up."""
+    with FaultInjectingServer(error_rate=1.0) as server:
+        llm = LargeLanguageModel(
+            server.url,
+            timeout=2,
+            max_retries=2,
+            breaker=CircuitBreaker("llm", failure_threshold=3, reset_timeout=60),
+        )
+        llm.llm_client = llm.llm_client.with_options(max_retries=0)
+        latencies = []
+        rejected = 0
+        for _ in range(requests):
+            start = time.perf_counter()
+            try:
+                llm.prompt("Recommend me a movie", temperature=0)
+            except CircuitOpen:
+                rejected += 1
+            except Exception:
+                pass
+            latencies.append(time.perf_counter() - start)
+        return latency_summary(
+            "llm_outage",
+            latencies,
+            reached_server=server.requests,
+            rejected=rejected,
+        )
+
+
+def run_fault_scenarios(synthetic: SyntheticGraph):
+    yield sparql_tail(synthetic, hedge=False)
+    yield sparql_tail(synthetic, hedge=True)
+    yield sparql_outage(synthetic)
+    yield llm_outage()
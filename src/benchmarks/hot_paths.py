@@ -0,0 +1,221 @@
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+from agent import (
+    FactualAnswer,
+    IntentRouter,
+    Message,
+    RecommendationBatcher,
+    Recommendations,
+)
+from core import IRI, Entity, GraphDelta, KnowledgeGraph, Relation
+
+from .BenchmarkSuite import BenchmarkSuite
+from .SyntheticGraph import WDT, LocalSPARQLWrapper, SyntheticGraph
+
+
+def build_knowledge_graph(
+    synthetic: SyntheticGraph, endpoint_url: str | None = None
+) -> KnowledgeGraph:
+    """
+    Without an endpoint the graph is queried in memory, an endpoint must
+    hold the graph of the same size and seed, like one loaded from the
+    N-Triples export.
+    """
+    if endpoint_url is not None:
+        knowledge_graph = KnowledgeGraph(endpoint_url=endpoint_url)
+    else:
+        knowledge_graph = KnowledgeGraph(
+            endpoint_url="local://synthetic",
+            graph=LocalSPARQLWrapper(synthetic.graph),
+        )
+    knowledge_graph.entities  # preload like the agent does on startup
+    knowledge_graph.label_index
+    knowledge_graph.statistics
+    knowledge_graph.label_dictionary
+    return knowledge_graph
+
+
+def run_hot_paths(
+    suite: BenchmarkSuite,
+    synthetic: SyntheticGraph,
+    knowledge_graph: KnowledgeGraph,
+    cases: list[str] | None = None,
+):
+    size = synthetic.num_entities
+    rng = random.Random(synthetic.seed)
+    messages = synthetic.sample_messages(16)
+    genre = Relation(WDT.P136, knowledge_graph)
+
+    def selected(name: str) -> bool:
+        return cases is None or name in cases
+
+    def cold(setup):
+        # graph lookups are measured without the triplet cache
+        def cold_setup():
+            knowledge_graph.clear_cache()
+            return setup()
+
+        return cold_setup
+
+    if selected("message_entities"):
+        yield suite.run(
+            "message_entities",
+            size,
+            lambda m: m._Message__get_entities_with_scores(),
+            lambda: Message(rng.choice(messages), knowledge_graph),
+        )
+
+    if selected("intent_route"):
+        router = IntentRouter.train()
+        yield suite.run(
+            "intent_route",
+            size,
+            router.route,
+            lambda: rng.choice(messages),
+        )
+
+    if selected("message_normalize_relations"):
+        yield suite.run(
+            "message_normalize_relations",
+            size,
+            lambda m: m._Message__normalize_for_relations(),
+            lambda: Message(rng.choice(messages), knowledge_graph),
+        )
+
+    def partial_label() -> str:
+        label = rng.choice(knowledge_graph.entities).label
+        return label[: rng.randint(min(3, len(label)), len(label))]
+
+    if selected("label_complete"):
+        yield suite.run(
+            "label_complete",
+            size,
+            knowledge_graph.label_dictionary.complete,
+            partial_label,
+        )
+
+    if selected("message_suggestions"):
+        yield suite.run(
+            "message_suggestions",
+            size,
+            lambda m: m.suggestions(),
+            lambda: Message(f"I liked {partial_label()}", knowledge_graph),
+        )
+
+    if selected("factual_answer"):
+        yield suite.run(
+            "factual_answer",
+            size,
+            lambda m: FactualAnswer.from_message(m, knowledge_graph),
+            cold(
+                lambda: Message(
+                    f"Who directed {rng.choice(knowledge_graph.entities).label}?",
+                    knowledge_graph,
+                )
+            ),
+        )
+
+    if selected("recommendations_from_entities"):
+        yield suite.run(
+            "recommendations_from_entities",
+            size,
+            lambda entities: Recommendations.from_entities(entities, knowledge_graph),
+            cold(
+                lambda: [
+                    Entity(uri, knowledge_graph)
+                    for uri in rng.sample(synthetic.movies, 3)
+                ]
+            ),
+        )
+
+    if selected("recommendations_from_properties"):
+        yield suite.run(
+            "recommendations_from_properties",
+            size,
+            lambda properties: Recommendations.from_properties(
+                properties,
+                knowledge_graph=knowledge_graph,
+                relevant_instance_of_entities=Entity.instance_of_movies(
+                    knowledge_graph
+                ),
+            ),
+            cold(
+                lambda: [
+                    Entity(rng.choice(synthetic.genres[:5]), knowledge_graph),
+                    Entity(rng.choice(synthetic.countries[:5]), knowledge_graph),
+                ]
+            ),
+        )
+
+    if selected("recommendation_batch"):
+        # 16 concurrent requests, seeds and properties, scored as one batch
+        batcher = RecommendationBatcher(knowledge_graph, window=0.01)
+        with ThreadPoolExecutor(16) as executor:
+            yield suite.run(
+                "recommendation_batch",
+                size,
+                lambda requests: list(
+                    executor.map(lambda r: batcher.recommend(*r), requests)
+                ),
+                cold(
+                    lambda: [
+                        (
+                            [
+                                Entity(uri, knowledge_graph)
+                                for uri in rng.sample(synthetic.movies, 3)
+                            ],
+                            [],
+                        )
+                        for _ in range(8)
+                    ]
+                    + [
+                        (
+                            [],
+                            [
+                                Entity(
+                                    rng.choice(synthetic.genres[:5]), knowledge_graph
+                                ),
+                                Entity(
+                                    rng.choice(synthetic.countries[:5]), knowledge_graph
+                                ),
+                            ],
+                        )
+                        for _ in range(8)
+                    ]
+                ),
+            )
+        batcher.close()
+
+    if selected("get_triplets_subject"):
+        yield suite.run(
+            "get_triplets_subject",
+            size,
+            lambda entity: knowledge_graph.get_triplets(entity, None, None, True),
+            cold(lambda: Entity(rng.choice(synthetic.movies), knowledge_graph)),
+        )
+
+    if selected("get_triplets_relation_value"):
+        yield suite.run(
+            "get_triplets_relation_value",
+            size,
+            lambda value: knowledge_graph.get_triplets(None, genre, value),
+            cold(lambda: Entity(rng.choice(synthetic.genres), knowledge_graph)),
+        )
+
+    def genre_change() -> GraphDelta:
+        # toggles a genre of a movie, so the graph keeps its size
+        triple = (rng.choice(synthetic.movies), WDT.P136, rng.choice(synthetic.genres))
+        delta_triple = tuple(IRI(term) for term in triple)
+        if triple in synthetic.graph:
+            return GraphDelta(removed=[delta_triple])
+        return GraphDelta(added=[delta_triple])
+
+    # only the in-memory graph is written to, never an endpoint
+    if selected("apply_graph_delta") and synthetic.in_memory:
+        yield suite.run(
+            "apply_graph_delta",
+            size,
+            knowledge_graph.apply_delta,
+            genre_change,
+        )
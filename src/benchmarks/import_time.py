@@ -0,0 +1,59 @@
+import os
+import subprocess
+import sys
+
+from .BenchmarkSuite import BenchmarkSuite
+from .FaultInjectingServer import FaultInjectingServer
+from .SyntheticGraph import SyntheticGraph
+
+SRC = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# what main.py does before the agent sends its first query
+FIRST_QUERY = """
+import main
+from core import KnowledgeGraph
+KnowledgeGraph({url!r}, health_check_interval=None).query(
+    "SELECT ?s WHERE {{ ?s ?p ?o }} LIMIT 1"
+)
+"""
+
+
+def python(code: str, *options: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *options, "-c", code],
+        cwd=SRC,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+
+
+def slowest_imports(module: str, top: int = 8) -> list[tuple[str, float]]:
+    """The packages that take longest to import with `module`, in ms."""
+    imports = []
+    for line in python(f"import {module}", "-X", "importtime").stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        # nested imports are indented, direct ones are what can be avoided
+        if len(name) - len(name.lstrip()) <= 3 and name.strip() != module:
+            imports.append((name.strip(), int(cumulative) / 1e3))
+    return sorted(imports, key=lambda i: i[1], reverse=True)[:top]
+
+
+def run_import_time(suite: BenchmarkSuite, synthetic: SyntheticGraph):
+    """
+    Cold start in fresh interpreters: the bare interpreter to subtract, the
+    core and agent packages and main.py up to the first SPARQL query.
+    """
+    yield suite.run("python_startup", 0, lambda _: python("pass"))
+    for module in ("core", "agent", "main"):
+        yield suite.run(
+            f"import_{module}", 0, lambda _, m=module: python(f"import {m}")
+        )
+    with FaultInjectingServer(synthetic, latency=0.0) as server:
+        yield suite.run(
+            "main_first_query",
+            0,
+            lambda _: python(FIRST_QUERY.format(url=server.sparql_url)),
+        )
@@ -0,0 +1,70 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+from core import Entity, KnowledgeGraph
+
+from .FaultInjectingServer import FaultInjectingServer
+from .SyntheticGraph import SyntheticGraph
+
+
+def replica_scaling(
+    synthetic: SyntheticGraph,
+    replicas: int,
+    clients: int = 16,
+    requests: int = 400,
+    concurrency: int = 2,
+    latency: float = 0.01,
+    failing: int = 0,
+) -> dict:
+    """
+    Throughput of uncached property lookups from many clients against
+    `replicas` stand-in endpoints that each work on `concurrency` requests
+    at a time. The first `failing` replicas answer every request with an
+    error and should be ejected.
+    """
+    rng = random.Random(synthetic.seed)
+    movies = [rng.choice(synthetic.movies) for _ in range(requests)]
+    with ExitStack() as stack:
+        servers = [
+            stack.enter_context(
+                FaultInjectingServer(
+                    synthetic,
+                    latency=latency,
+                    concurrency=concurrency,
+                    error_rate=1.0 if i < failing else 0.0,
+                )
+            )
+            for i in range(replicas)
+        ]
+        knowledge_graph = KnowledgeGraph(
+            [server.sparql_url for server in servers], health_check_interval=None
+        )
+        knowledge_graph.clear_cache()
+
+        def lookup(movie):
+            return knowledge_graph.get_properties(Entity(movie, knowledge_graph))
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(clients) as executor:
+            answered = sum(1 for result in executor.map(lookup, movies) if result)
+        elapsed = time.perf_counter() - start
+        return {
+            "scenario": f"replicas_{replicas}{f'_{failing}_failing' if failing else ''}",
+            "requests": requests,
+            "answered": answered,
+            "throughput_per_s": round(requests / elapsed, 1),
+            "served": [
+                endpoint["served"] for endpoint in knowledge_graph.endpoint_stats
+            ],
+            "ejected": sum(
+                endpoint["ejected"] for endpoint in knowledge_graph.endpoint_stats
+            ),
+        }
+
+
+def run_load_scenarios(synthetic: SyntheticGraph):
+    for replicas in (1, 2, 4):
+        yield replica_scaling(synthetic, replicas)
+    yield replica_scaling(synthetic, 3, failing=1)
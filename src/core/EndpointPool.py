@@ -0,0 +1,150 @@
+import itertools
+import threading
+import time
+
+from SPARQLWrapper import JSON, SPARQLWrapper
+
+from utils import metrics
+
+
+class Endpoint:
+    def __init__(self, url: str):
+        self.url = url
+        self.outstanding = 0
+        self.served = 0
+        self.failures = 0
+        self.ejected_until = 0.0
+
+    @property
+    def ejected(self) -> bool:
+        return time.monotonic() < self.ejected_until
+
+    def __repr__(self) -> str:
+        return f"Endpoint({self.url})"
+
+
+class EndpointPool:
+    """
+    Equivalent read replicas of the SPARQL endpoint. Each query goes to the
+    replica with the fewest outstanding requests. A replica that fails
+    `failure_threshold` times in a row is ejected for `ejection_time`
+    seconds, or until a health check sees it answer again. If every replica
+    is ejected the one that comes back first is used anyway.
+    """
+
+    def __init__(
+        self,
+        urls: list[str],
+        failure_threshold: int = 3,
+        ejection_time: float = 30.0,
+        health_check_interval: float | None = None,
+    ):
+        if not urls:
+            raise ValueError("EndpointPool needs at least one endpoint")
+        self.failure_threshold = failure_threshold
+        self.ejection_time = ejection_time
+        self.__endpoints = [Endpoint(url) for url in dict.fromkeys(urls)]
+        self.__lock = threading.Lock()
+        # rotates ties so idle replicas share the load evenly
+        self.__turn = itertools.count()
+        self.__stop = threading.Event()
+        if health_check_interval is not None:
+            threading.Thread(
+                target=self.__check_health_periodically,
+                args=(health_check_interval,),
+                name="sparql-health-check",
+                daemon=True,
+            ).start()
+
+    @property
+    def endpoints(self) -> list[Endpoint]:
+        return list(self.__endpoints)
+
+    @property
+    def healthy(self) -> list[Endpoint]:
+        return [endpoint for endpoint in self.__endpoints if not endpoint.ejected]
+
+    def acquire(self, exclude: set[str] | None = None) -> Endpoint:
+        with self.__lock:
+            candidates = [
+                endpoint
+                for endpoint in self.__endpoints
+                if not exclude or endpoint.url not in exclude
+            ] or self.__endpoints
+            healthy = [endpoint for endpoint in candidates if not endpoint.ejected]
+            if not healthy:
+                healthy = [min(candidates, key=lambda e: e.ejected_until)]
+            turn = next(self.__turn)
+            endpoint = min(
+                healthy,
+                key=lambda e: (
+                    e.outstanding,
+                    (self.__endpoints.index(e) - turn) % len(self.__endpoints),
+                ),
+            )
+            endpoint.outstanding += 1
+            return endpoint
+
+    def release(
+        self, endpoint: Endpoint, failed: bool = False, cancelled: bool = False
+    ):
+        """
+        Returns a replica after a request. A request the caller cut short
+        counts as neither success nor failure of the replica, only the
+        successful ones count as served.
+        """
+        with self.__lock:
+            endpoint.outstanding -= 1
+            if cancelled:
+                return
+            if not failed:
+                endpoint.served += 1
+                endpoint.failures = 0
+                return
+            endpoint.failures += 1
+            if endpoint.failures >= self.failure_threshold and not endpoint.ejected:
+                endpoint.ejected_until = time.monotonic() + self.ejection_time
+                print(f"Ejected SPARQL endpoint {endpoint.url}")
+                metrics.increment("endpoint_pool.ejections")
+
+    def check_health(self, timeout: int = 2):
+        """Probes ejected replicas and takes back those that answer."""
+        for endpoint in self.__endpoints:
+            if not endpoint.ejected:
+                continue
+            if self.__probe(endpoint.url, timeout):
+                with self.__lock:
+                    endpoint.failures = 0
+                    endpoint.ejected_until = 0.0
+                print(f"SPARQL endpoint {endpoint.url} is healthy again")
+
+    def close(self):
+        self.__stop.set()
+
+    def stats(self) -> list[dict[str, int | str | bool]]:
+        with self.__lock:
+            return [
+                {
+                    "url": endpoint.url,
+                    "outstanding": endpoint.outstanding,
+                    "served": endpoint.served,
+                    "ejected": endpoint.ejected,
+                }
+                for endpoint in self.__endpoints
+            ]
+
+    def __check_health_periodically(self, interval: float):
+        while not self.__stop.wait(interval):
+            self.check_health()
+
+    @staticmethod
+    def __probe(url: str, timeout: int) -> bool:
+        try:
+            graph = SPARQLWrapper(url)
+            graph.setReturnFormat(JSON)
+            graph.setTimeout(timeout)
+            graph.setQuery("ASK { }")
+            graph.query().convert()
+            return True
+        except Exception:
+            return False
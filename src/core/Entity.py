@@ -1,11 +1,10 @@
 from collections import defaultdict
 from typing import TYPE_CHECKING
 
-from rdflib import URIRef
-
-from utils import BindingDict
+from utils import BindingDict, Deadline
 
 from .Relation import Relation
+from .Term import IRI
 
 if TYPE_CHECKING:
     from core import KnowledgeGraph, Property
@@ -14,15 +13,17 @@ if TYPE_CHECKING:
 class Entity:
     def __init__(
         self,
-        uri: URIRef,
+        uri: IRI,
         knowledge_graph: "KnowledgeGraph",
         label: str | None = None,
-        instance_of: URIRef | None = None,
+        instance_of: IRI | None = None,
     ):
         self.__uri = uri
         self.__label: str | None = label
         self.__knowledge_graph = knowledge_graph
         self.__properties: dict[Relation, list["Property"]] = {}
+        # catalog entities come with instance of only, the rest is not loaded
+        self.__loaded = False
         if instance_of:
             self.__properties[Relation.instance_of(knowledge_graph)] = [
                 Entity(instance_of, knowledge_graph)
@@ -50,17 +51,35 @@ class Entity:
         return instance_of
 
     @property
-    def uri(self) -> URIRef:
+    def uri(self) -> IRI:
         return self.__uri
 
     @property
     def properties(self) -> dict[Relation, list["Property"]]:
-        if not self.__properties:
-            self.__properties = self.__get_properties()
+        if not self.__loaded:
+            self.load_properties()
         return self.__properties
 
-    def __get_properties(self) -> dict[Relation, list["Property"]]:
-        properties = self.__knowledge_graph.get_properties(self)
+    def load_properties(
+        self, deadline: Deadline | None = None
+    ) -> dict[Relation, list["Property"]]:
+        """
+        Fetches all properties within the budget and keeps them on the
+        entity, empty if the lookup was cut short.
+        """
+        if self.__loaded:
+            return self.__properties
+        properties = self.__get_properties(deadline)
+        if properties:
+            self.__properties = properties
+        # an empty result is final only if no budget could have cut it short
+        self.__loaded = bool(properties) or deadline is None
+        return properties
+
+    def __get_properties(
+        self, deadline: Deadline | None = None
+    ) -> dict[Relation, list["Property"]]:
+        properties = self.__knowledge_graph.get_properties(self, deadline)
         if properties:
             property_dict = defaultdict(list)
             for _, r, p in properties:
@@ -78,7 +97,7 @@ class Entity:
             return self.__label
         return self.__get_label(self.__uri)
 
-    def __get_label(self, uri: URIRef) -> str:
+    def __get_label(self, uri: IRI) -> str:
         return self.__knowledge_graph.get_label(uri)
 
     @classmethod
@@ -86,7 +105,7 @@ class Entity:
         cls, binding: BindingDict, knowledge_graph: "KnowledgeGraph"
     ) -> "Entity":
         if binding["type"] == "uri":
-            uri = URIRef(binding.get("value"))
+            uri = IRI(binding.get("value"))
             return cls(uri=uri, knowledge_graph=knowledge_graph)
         else:
             raise ValueError(
@@ -96,38 +115,34 @@ class Entity:
     @classmethod
     def instance_of_movies(cls, knowledge_graph: "KnowledgeGraph") -> list["Entity"]:
         movie_instance_of_uris = [
-            URIRef("http://www.wikidata.org/entity/Q11424"),  #'film'
-            URIRef("http://www.wikidata.org/entity/Q17123180"),  #'sequel film'
-            URIRef("http://www.wikidata.org/entity/Q202866"),  #'animated film'
-            URIRef("http://www.wikidata.org/entity/Q622548"),  #'parody film'
-            URIRef("http://www.wikidata.org/entity/Q622548"),  #'parody film'
-            URIRef("http://www.wikidata.org/entity/Q10590726"),  #'video album'
-            URIRef("http://www.wikidata.org/entity/Q917641"),  #'open-source film'
-            URIRef(
-                "http://www.wikidata.org/entity/Q52207399"
-            ),  #'film based on a novel'
-            URIRef("http://www.wikidata.org/entity/Q31235"),  #'remake'
-            URIRef("http://www.wikidata.org/entity/Q24862"),  #'short film'
-            URIRef("http://www.wikidata.org/entity/Q104840802"),  #'film remake'
-            URIRef("http://www.wikidata.org/entity/Q112158242"),  #'Tom and Jerry film'
-            URIRef("http://www.wikidata.org/entity/Q24856"),  #'film series'
-            URIRef(
+            IRI("http://www.wikidata.org/entity/Q11424"),  #'film'
+            IRI("http://www.wikidata.org/entity/Q17123180"),  #'sequel film'
+            IRI("http://www.wikidata.org/entity/Q202866"),  #'animated film'
+            IRI("http://www.wikidata.org/entity/Q622548"),  #'parody film'
+            IRI("http://www.wikidata.org/entity/Q622548"),  #'parody film'
+            IRI("http://www.wikidata.org/entity/Q10590726"),  #'video album'
+            IRI("http://www.wikidata.org/entity/Q917641"),  #'open-source film'
+            IRI("http://www.wikidata.org/entity/Q52207399"),  #'film based on a novel'
+            IRI("http://www.wikidata.org/entity/Q31235"),  #'remake'
+            IRI("http://www.wikidata.org/entity/Q24862"),  #'short film'
+            IRI("http://www.wikidata.org/entity/Q104840802"),  #'film remake'
+            IRI("http://www.wikidata.org/entity/Q112158242"),  #'Tom and Jerry film'
+            IRI("http://www.wikidata.org/entity/Q24856"),  #'film series'
+            IRI(
                 "http://www.wikidata.org/entity/Q117467246"
             ),  #'animated television series'
-            URIRef("http://www.wikidata.org/entity/Q2484376"),  #'thriller film',
-            URIRef("http://www.wikidata.org/entity/Q20650540"),  #'anime film',
-            URIRef("http://www.wikidata.org/entity/Q13593818"),  #'film trilogy'
-            URIRef("http://www.wikidata.org/entity/Q17517379"),  #'animated short film'
-            URIRef("http://www.wikidata.org/entity/Q678345"),  #'prequel'
-            URIRef("http://www.wikidata.org/entity/Q1257444"),  #'film adaptation'
-            URIRef(
+            IRI("http://www.wikidata.org/entity/Q2484376"),  #'thriller film',
+            IRI("http://www.wikidata.org/entity/Q20650540"),  #'anime film',
+            IRI("http://www.wikidata.org/entity/Q13593818"),  #'film trilogy'
+            IRI("http://www.wikidata.org/entity/Q17517379"),  #'animated short film'
+            IRI("http://www.wikidata.org/entity/Q678345"),  #'prequel'
+            IRI("http://www.wikidata.org/entity/Q1257444"),  #'film adaptation'
+            IRI(
                 "http://www.wikidata.org/entity/Q52162262"
             ),  #'film based on literature'
-            URIRef(
-                "http://www.wikidata.org/entity/Q118189123"
-            ),  #'animated film reboot'
-            URIRef("http://www.wikidata.org/entity/Q1259759"),  #'miniseries'
-            URIRef("http://www.wikidata.org/entity/Q506240"),  #'television film'
+            IRI("http://www.wikidata.org/entity/Q118189123"),  #'animated film reboot'
+            IRI("http://www.wikidata.org/entity/Q1259759"),  #'miniseries'
+            IRI("http://www.wikidata.org/entity/Q506240"),  #'television film'
         ]
         return [
             cls(uri=uri, knowledge_graph=knowledge_graph)
@@ -139,24 +154,22 @@ class Entity:
         cls, knowledge_graph: "KnowledgeGraph"
     ) -> list["Entity"]:
         movie_property_uris = [
-            URIRef("http://www.wikidata.org/entity/Q201658"),  # 'film genre'
-            URIRef("http://www.wikidata.org/entity/Q6256"),  # 'country'
-            URIRef("http://www.wikidata.org/entity/Q5"),  # 'human'
-            URIRef(
-                "http://www.wikidata.org/entity/Q1762059"
-            ),  # 'film production company'
-            URIRef(
+            IRI("http://www.wikidata.org/entity/Q201658"),  # 'film genre'
+            IRI("http://www.wikidata.org/entity/Q6256"),  # 'country'
+            IRI("http://www.wikidata.org/entity/Q5"),  # 'human'
+            IRI("http://www.wikidata.org/entity/Q1762059"),  # 'film production company'
+            IRI(
                 "http://www.wikidata.org/entity/Q10689397"
             ),  # 'television production company'
-            URIRef("http://www.wikidata.org/entity/Q375336"),  # 'film studio'
-            URIRef("http://www.wikidata.org/entity/Q19020"),  # 'Academy Awards'
-            URIRef("http://www.wikidata.org/entity/Q38033430"),  # 'class of award'
-            URIRef("http://www.wikidata.org/entity/Q618779"),  # 'award'
-            URIRef("http://www.wikidata.org/entity/Q4220917"),  # 'film award'
-            URIRef("http://www.wikidata.org/entity/Q1407225"),  # 'television award'
-            URIRef("http://www.wikidata.org/entity/Q1011547"),  # 'Golden Globe Award'
-            URIRef("http://www.wikidata.org/entity/Q559618"),  # 'fictional universe'
-            URIRef(
+            IRI("http://www.wikidata.org/entity/Q375336"),  # 'film studio'
+            IRI("http://www.wikidata.org/entity/Q19020"),  # 'Academy Awards'
+            IRI("http://www.wikidata.org/entity/Q38033430"),  # 'class of award'
+            IRI("http://www.wikidata.org/entity/Q618779"),  # 'award'
+            IRI("http://www.wikidata.org/entity/Q4220917"),  # 'film award'
+            IRI("http://www.wikidata.org/entity/Q1407225"),  # 'television award'
+            IRI("http://www.wikidata.org/entity/Q1011547"),  # 'Golden Globe Award'
+            IRI("http://www.wikidata.org/entity/Q559618"),  # 'fictional universe'
+            IRI(
                 "http://www.wikidata.org/entity/Q23660208"
             ),  # 'MPA classification category'
         ]
@@ -0,0 +1,79 @@
+from pathlib import Path
+from typing import Any, Iterable
+
+from .Term import IRI
+
+# IRIs are core IRIs, literals anything with an n3() serialization
+Triple = tuple[IRI, IRI, Any]
+
+
+class GraphDelta:
+    """
+    A change of the graph as the triples that were added and removed, read
+    from N-Triples like the full `graph.nt`. Removals are applied before
+    additions, so a changed value is a removed and an added triple.
+    """
+
+    def __init__(self, added: Iterable[Triple] = (), removed: Iterable[Triple] = ()):
+        self.added = list(added)
+        self.removed = list(removed)
+
+    def __len__(self) -> int:
+        return len(self.added) + len(self.removed)
+
+    def __repr__(self) -> str:
+        return f"GraphDelta(added={len(self.added)}, removed={len(self.removed)})"
+
+    @classmethod
+    def from_ntriples(cls, added: str = "", removed: str = "") -> "GraphDelta":
+        return cls(cls.__parse(added), cls.__parse(removed))
+
+    @classmethod
+    def from_files(
+        cls, added: str | Path | None = None, removed: str | Path | None = None
+    ) -> "GraphDelta":
+        return cls.from_ntriples(
+            Path(added).read_text(encoding="utf-8") if added else "",
+            Path(removed).read_text(encoding="utf-8") if removed else "",
+        )
+
+    @property
+    def triples(self) -> list[Triple]:
+        return self.removed + self.added
+
+    @property
+    def subjects(self) -> set[str]:
+        return {str(s) for s, _, _ in self.triples}
+
+    @property
+    def predicates(self) -> set[str]:
+        return {str(p) for _, p, _ in self.triples}
+
+    @property
+    def objects(self) -> set[Any]:
+        return {o for _, _, o in self.triples}
+
+    def to_update(self) -> str:
+        """The SPARQL UPDATE that applies this delta to an endpoint."""
+        operations = []
+        if self.removed:
+            operations.append(f"DELETE DATA {{\n{self.__data(self.removed)}\n}}")
+        if self.added:
+            operations.append(f"INSERT DATA {{\n{self.__data(self.added)}\n}}")
+        return " ;\n".join(operations)
+
+    @staticmethod
+    def __data(triples: list[Triple]) -> str:
+        return "\n".join(f"{s.n3()} {p.n3()} {o.n3()} ." for s, p, o in triples)
+
+    @staticmethod
+    def __parse(ntriples: str) -> list[Triple]:
+        if not ntriples.strip():
+            return []
+        # only parsing needs rdflib, the agent starts without it
+        from rdflib import Graph, URIRef
+
+        return [
+            tuple(IRI(term) if isinstance(term, URIRef) else term for term in triple)
+            for triple in Graph().parse(data=ntriples, format="nt")
+        ]
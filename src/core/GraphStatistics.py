@@ -0,0 +1,220 @@
+import bisect
+import math
+import threading
+from array import array
+from typing import TYPE_CHECKING
+
+from .Entity import Entity
+from .GraphDelta import GraphDelta
+from .Relation import Relation
+from .Term import IRI
+
+if TYPE_CHECKING:
+    from core import KnowledgeGraph, Property
+
+
+class CountTable:
+    """
+    Counts by Wikidata id kept in two parallel sorted arrays, 8 bytes an
+    entry instead of the ~150 a dict of URI strings needs.
+    """
+
+    def __init__(self, counts: dict[int, int] | None = None):
+        ids = sorted(counts or {})
+        self.__ids = array("I", ids)
+        self.__counts = array("I", (counts[i] for i in ids))
+
+    def __len__(self) -> int:
+        return len(self.__ids)
+
+    def __contains__(self, id: int) -> bool:
+        i = bisect.bisect_left(self.__ids, id)
+        return i < len(self.__ids) and self.__ids[i] == id
+
+    def get(self, id: int, default: int = 0) -> int:
+        i = bisect.bisect_left(self.__ids, id)
+        if i < len(self.__ids) and self.__ids[i] == id:
+            return self.__counts[i]
+        return default
+
+    def add(self, id: int, amount: int):
+        i = bisect.bisect_left(self.__ids, id)
+        if i < len(self.__ids) and self.__ids[i] == id:
+            self.__counts[i] = max(self.__counts[i] + amount, 0)
+        elif amount > 0:
+            self.__ids.insert(i, id)
+            self.__counts.insert(i, amount)
+
+    def max(self) -> int:
+        return max(self.__counts, default=0)
+
+    @property
+    def nbytes(self) -> int:
+        return (len(self.__ids) + len(self.__counts)) * self.__ids.itemsize
+
+
+class GraphStatistics:
+    """
+    Cardinalities of the movie graph, computed with a few aggregate queries
+    once per graph version: triples per predicate, movies per (predicate,
+    object) and triples per movie. Feature weights follow from them, a value
+    shared by half the catalog says less about a movie than a director of
+    five films, as does a prior that prefers well connected movies. Deltas
+    are counted in place, `version` increases with every change.
+    """
+
+    def __init__(self, knowledge_graph: "KnowledgeGraph", min_weight: float = 0.1):
+        self.min_weight = min_weight
+        self.version = 0
+        self.__knowledge_graph = knowledge_graph
+        self.__instance_of = str(Relation.instance_of(knowledge_graph).uri)
+        self.__movie_types = {
+            str(e.uri) for e in Entity.instance_of_movies(knowledge_graph)
+        }
+        self.__predicates: dict[str, int] = {}
+        self.__objects: dict[str, CountTable] = {}
+        self.__degrees = CountTable()
+        self.__max_degree = 0
+        self.__lock = threading.Lock()
+        self.refresh()
+
+    @property
+    def movies(self) -> int:
+        return len(self.__degrees)
+
+    def refresh(self):
+        movie_types = " ".join(f"<{uri}>" for uri in self.__movie_types)
+        # VALUES first, engines then start from the few movie types
+        movies = f"""
+            VALUES ?type {{ {movie_types} }}
+            ?movie <{self.__instance_of}> ?type .
+        """
+        predicate_counts = self.__knowledge_graph.query(
+            "SELECT ?p (COUNT(*) AS ?n) WHERE { ?s ?p ?o } GROUP BY ?p"
+        )
+        object_counts = self.__knowledge_graph.query(f"""
+            SELECT ?p ?o (COUNT(DISTINCT ?movie) AS ?n) WHERE {{
+                {movies}
+                ?movie ?p ?o .
+                FILTER(isIRI(?o))
+            }} GROUP BY ?p ?o
+            """)
+        # a movie of two movie types is counted twice, close enough for a prior
+        degree_counts = self.__knowledge_graph.query(f"""
+            SELECT ?movie (COUNT(*) AS ?n) WHERE {{
+                {movies}
+                ?movie ?p ?o .
+            }} GROUP BY ?movie
+            """)
+
+        predicates = {
+            p["value"]: int(n["value"])
+            for p, n in zip(
+                predicate_counts.get("p", []), predicate_counts.get("n", [])
+            )
+        }
+        objects: dict[str, dict[int, int]] = {}
+        for p, o, n in zip(
+            object_counts.get("p", []),
+            object_counts.get("o", []),
+            object_counts.get("n", []),
+        ):
+            id = self.__id(o["value"])
+            if id is not None:
+                objects.setdefault(p["value"], {})[id] = int(n["value"])
+        degrees = {}
+        for movie, n in zip(degree_counts.get("movie", []), degree_counts.get("n", [])):
+            id = self.__id(movie["value"])
+            if id is not None:
+                degrees[id] = int(n["value"])
+
+        with self.__lock:
+            self.__predicates = predicates
+            self.__objects = {p: CountTable(counts) for p, counts in objects.items()}
+            self.__degrees = CountTable(degrees)
+            self.__max_degree = self.__degrees.max()
+            self.version += 1
+
+    def apply(self, delta: GraphDelta):
+        """Counts the triples of a delta, new movies are recognized by type."""
+        new_movies = {
+            str(s)
+            for s, p, o in delta.added
+            if str(p) == self.__instance_of and str(o) in self.__movie_types
+        }
+        with self.__lock:
+            for triples, amount in ((delta.removed, -1), (delta.added, 1)):
+                for s, p, o in triples:
+                    p = str(p)
+                    self.__predicates[p] = max(self.__predicates.get(p, 0) + amount, 0)
+                    movie = self.__id(str(s))
+                    if movie is None or (
+                        movie not in self.__degrees and str(s) not in new_movies
+                    ):
+                        continue
+                    self.__degrees.add(movie, amount)
+                    value = self.__id(str(o)) if isinstance(o, IRI) else None
+                    if value is not None:
+                        self.__objects.setdefault(p, CountTable()).add(value, amount)
+            self.__max_degree = self.__degrees.max()
+            self.version += 1
+
+    def triples(self, relation: Relation) -> int:
+        return self.__predicates.get(str(relation.uri), 0)
+
+    def matches(self, relation: Relation | None, value: "Property") -> int:
+        """
+        Movies that have the value for the relation, or for any relation,
+        then counted once per relation. Literals are not counted and like
+        unknown values estimated as 0.
+        """
+        id = self.__id(str(value.uri)) if hasattr(value, "uri") else None
+        if id is None:
+            return 0
+        if relation is not None:
+            table = self.__objects.get(str(relation.uri))
+            return table.get(id) if table is not None else 0
+        return sum(table.get(id) for table in list(self.__objects.values()))
+
+    def weight(self, relation: Relation | None, value: "Property") -> float:
+        """
+        Inverse document frequency of a feature scaled to 1 for a value of
+        a single movie, broad values weigh at least `min_weight`.
+        """
+        matches = self.matches(relation, value)
+        if matches <= 1 or self.movies <= 1:
+            return 1.0
+        idf = math.log(self.movies / matches) / math.log(self.movies)
+        return min(max(idf, self.min_weight), 1.0)
+
+    def share(self, relation: Relation | None, value: "Property") -> float:
+        """Fraction of all movies a lookup of the value would return."""
+        return self.matches(relation, value) / self.movies if self.movies else 0.0
+
+    def popularity(self, entity: Entity) -> float:
+        """Prior between 0 and 1, the log of a movie's degree, 0 if unknown."""
+        id = self.__id(str(entity.uri))
+        if id is None or self.__max_degree <= 1:
+            return 0.0
+        return math.log1p(self.__degrees.get(id)) / math.log1p(self.__max_degree)
+
+    @property
+    def nbytes(self) -> int:
+        return self.__degrees.nbytes + sum(t.nbytes for t in self.__objects.values())
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "version": self.version,
+            "movies": self.movies,
+            "predicates": len(self.__predicates),
+            "features": sum(len(table) for table in self.__objects.values()),
+            "bytes": self.nbytes,
+        }
+
+    @staticmethod
+    def __id(uri: str) -> int | None:
+        # Wikidata ids fit the arrays, everything else is not counted
+        tail = uri.rsplit("/", 1)[-1]
+        if tail[:1] == "Q" and tail[1:].isdigit() and int(tail[1:]) < 1 << 32:
+            return int(tail[1:])
+        return None
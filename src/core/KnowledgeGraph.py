@@ -1,41 +1,139 @@
-from rdflib import RDFS, Namespace, URIRef
-from SPARQLWrapper import JSON, SPARQLWrapper
+import threading
+from collections import Counter
+from typing import Iterable, Iterator
+from urllib.error import URLError
 
-from utils import BindingDict, SPARQLQuery
+from SPARQLWrapper import GET, JSON, POST, SPARQLWrapper
+from SPARQLWrapper.SPARQLExceptions import EndPointInternalError, QueryBadFormed
 
+from utils import (
+    BindingDict,
+    CircuitBreaker,
+    CircuitOpen,
+    Deadline,
+    DeadlineExceeded,
+    Hedger,
+    LRUCache,
+    SingleFlight,
+    SPARQLQuery,
+)
+
+from .EndpointPool import EndpointPool
 from .Entity import Entity
+from .GraphDelta import GraphDelta
+from .GraphStatistics import GraphStatistics
+from .LabelDictionary import LabelDictionary
+from .LabelIndex import LabelIndex
 from .Property import Property
+from .QueryLog import QueryLog
 from .Relation import Relation
-
-WD = Namespace("http://www.wikidata.org/entity/")
-WDT = Namespace("http://www.wikidata.org/prop/direct/")
-DDIS = Namespace("http://ddis.ch/atai/")
-SCHEMA = Namespace("http://schema.org/")
+from .Term import IRI, RDFS, SCHEMA, SKOS, WD, WDT
 
 
 class KnowledgeGraph:
-    def __init__(self, endpoint_url: str = "http://localhost:3030/atai/sparql"):
-        self.__endpoint_url = endpoint_url
-        self.__graph = self.__load_graph(self.__endpoint_url)
+    def __init__(
+        self,
+        endpoint_url: str | list[str] = "http://localhost:3030/atai/sparql",
+        graph: SPARQLWrapper | None = None,
+        cache_size: int = 10_000,
+        breaker: CircuitBreaker | None = None,
+        hedge: bool = False,
+        health_check_interval: float | None = 10.0,
+        update_url: str | None = None,
+        query_log: QueryLog | None = None,
+    ):
+        # several urls are treated as equivalent read replicas
+        endpoint_urls = (
+            [endpoint_url] if isinstance(endpoint_url, str) else endpoint_url
+        )
+        self.__pool = EndpointPool(
+            endpoint_urls,
+            health_check_interval=health_check_interval if graph is None else None,
+        )
+        # writes go to the primary, Fuseki serves updates next to the queries
+        self.__update_url = (
+            update_url or f"{endpoint_urls[0].removesuffix('/sparql')}/update"
+        )
+        # an injected graph is shared by all threads and must allow that,
+        # otherwise every thread gets its own wrapper per endpoint
+        self.__graph = graph
+        self.__local = threading.local()
+        # a leader cut short by its own deadline says nothing to its followers
+        self.__in_flight: SingleFlight[str, dict] = SingleFlight(
+            "sparql", retried=(DeadlineExceeded,)
+        )
+        self.__triplet_cache: LRUCache[tuple, list] = LRUCache(cache_size)
+        self.__breaker = breaker or CircuitBreaker(
+            "sparql", excluded=(QueryBadFormed,), ignored=(DeadlineExceeded,)
+        )
+        self.__hedger = Hedger("sparql") if hedge else None
+        self.query_log = query_log
         self.__entities = None
         self.__relations = None
+        self.__label_index = None
+        self.__label_dictionary = None
+        self.__statistics = None
         self.__relevant_instance_of = Entity.instance_of_movies(
             self
         ) + Entity.instance_of_movie_properties(self)
 
-    def get_uri(self, label: str) -> URIRef:
+    def get_uri(self, label: str) -> IRI:
+        candidates = self.label_index.lookup(label)
+        if candidates:
+            return candidates[0].uri
+        # entities outside the index can still be found by their exact label
         triplet = self.get_triplets(None, Relation(RDFS.label, self), label)
         if triplet:  # TODO what if more than one >>> and len(triplet) == 1:
             return triplet[0][0].uri
         return ""
 
-    def get_label(self, uri: URIRef) -> str:
+    def get_label(self, uri: IRI) -> str:
         triplet = self.get_triplets(Entity(uri, self), Relation(RDFS.label, self), None)
         if triplet and isinstance(triplet[0][2], str):
             return triplet[0][2]
         return ""
 
-    def get_description(self, uri: URIRef) -> str:
+    def get_labels(self, uris: list[IRI], batch_size: int = 200) -> dict[str, str]:
+        """
+        Resolves the labels of many URIs with one query per batch instead of
+        one per URI. The results are cached, so later `get_label` calls for
+        these URIs are answered from memory.
+        """
+        labels = {}
+        missing = []
+        for uri in dict.fromkeys(str(uri) for uri in uris):
+            cached = self.__triplet_cache.get((uri, str(RDFS.label), None, False))
+            if cached is None:
+                missing.append(uri)
+            elif cached and isinstance(cached[0][2], str):
+                labels[uri] = cached[0][2]
+
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start : start + batch_size]
+            query = f"""
+                SELECT ?entity ?property WHERE {{
+                    VALUES ?entity {{ {" ".join(f"<{uri}>" for uri in batch)} }}
+                    ?entity <{RDFS.label}> ?property .
+                }}
+            """
+            results = self.query(query)
+            found = {}
+            for entity, label in zip(
+                results.get("entity", []), results.get("property", [])
+            ):
+                found.setdefault(entity["value"], label["value"])
+            for uri in batch:
+                label = found.get(uri)
+                triplets = []
+                if label is not None:
+                    labels[uri] = label
+                    triplets = [
+                        (Entity(IRI(uri), self), Relation(RDFS.label, self), label)
+                    ]
+                self.__triplet_cache.put((uri, str(RDFS.label), None, False), triplets)
+        return labels
+
+    def get_description(self, uri: IRI) -> str:
         triplet = self.get_triplets(
             Entity(uri, self), Relation(SCHEMA.description, self), None
         )
@@ -43,31 +141,243 @@ class KnowledgeGraph:
             return triplet[0][2]
         return ""
 
-    def get_properties(self, entity: Entity) -> list[tuple[Relation, Entity]]:
+    def get_properties(
+        self, entity: Entity, deadline: Deadline | None = None
+    ) -> list[tuple[Relation, Entity]]:
         return self.get_triplets(
-            entity=entity, relation=None, property=None, distinct=True
+            entity=entity,
+            relation=None,
+            property=None,
+            distinct=True,
+            deadline=deadline,
+        )
+
+    def query(
+        self, query_string: str, deadline: Deadline | None = None
+    ) -> dict[str, list[BindingDict]]:
+        """
+        Runs a query, with a deadline the request is aborted when the budget
+        is used up and an empty result is returned instead. While the circuit
+        breaker is open queries fail fast, with a deadline also degraded to
+        an empty result, so callers fall back to what is cached. Identical
+        queries running at the same time are sent to the endpoint only once.
+        """
+        if deadline is not None and deadline.expired:
+            deadline.degrade("graph query skipped")
+            return {}
+        self.__thread_counters()["queries"] += 1
+        timeout = deadline.timeout() if deadline is not None else None
+        try:
+            return self.__in_flight.do(
+                " ".join(query_string.split()),
+                lambda: self.__breaker.call(self.__execute, query_string, timeout),
+                timeout=deadline.remaining if deadline is not None else None,
+            )
+        except CircuitOpen:
+            if deadline is None:
+                raise
+            deadline.degrade("graph unavailable")
+            return {}
+        except (TimeoutError, URLError):
+            if deadline is None:
+                raise
+            deadline.degrade("graph query cancelled")
+            return {}
+        except EndPointInternalError:
+            if deadline is None:
+                raise
+            deadline.degrade("graph query failed")
+            return {}
+
+    def __execute(
+        self, query_string: str, timeout: int | None
+    ) -> dict[str, list[BindingDict]]:
+        try:
+            if self.__hedger is None:
+                return self.__query_replicas(query_string, timeout)
+            # the duplicate goes to the least busy replica, on its own thread
+            return self.__hedger.call(
+                lambda: self.__query_replicas(query_string, timeout)
+            )
+        except Exception as e:
+            # only a deadline sets a timeout, the endpoint may well be healthy
+            if timeout is not None and self.__timed_out(e):
+                raise DeadlineExceeded(f"Query cut short after {timeout}s") from e
+            raise
+
+    @staticmethod
+    def __timed_out(error: Exception) -> bool:
+        # urllib wraps timeouts before the response arrived in a URLError
+        return isinstance(error, TimeoutError) or (
+            isinstance(error, URLError) and isinstance(error.reason, TimeoutError)
+        )
+
+    def __query_replicas(
+        self, query_string: str, timeout: int | None
+    ) -> dict[str, list[BindingDict]]:
+        if self.__graph is not None:
+            return SPARQLQuery(self.__graph, query_string).query_and_convert(timeout)
+
+        tried = set()
+        while True:
+            endpoint = self.__pool.acquire(exclude=tried)
+            try:
+                result = SPARQLQuery(
+                    self.__wrapper(endpoint.url), query_string
+                ).query_and_convert(timeout)
+            except QueryBadFormed:
+                self.__pool.release(endpoint)
+                raise
+            except Exception as e:
+                if timeout is not None and self.__timed_out(e):
+                    # cut short by the caller's deadline, not by the replica
+                    self.__pool.release(endpoint, cancelled=True)
+                    raise
+                self.__pool.release(endpoint, failed=True)
+                if not isinstance(e, (URLError, EndPointInternalError)):
+                    raise
+                tried.add(endpoint.url)
+                # a replica that is down fails fast, another one may answer
+                if len(tried) >= len(self.__pool.endpoints):
+                    raise
+                continue
+            self.__pool.release(endpoint)
+            return result
+
+    def __wrapper(self, endpoint_url: str) -> SPARQLWrapper:
+        graphs = getattr(self.__local, "graphs", None)
+        if graphs is None:
+            graphs = self.__local.graphs = {}
+        graph = graphs.get(endpoint_url)
+        if graph is None:
+            graph = graphs[endpoint_url] = self.__load_graph(endpoint_url)
+        return graph
+
+    @property
+    def endpoint_stats(self) -> list[dict[str, int | str | bool]]:
+        return self.__pool.stats()
+
+    @property
+    def in_flight_stats(self) -> dict[str, int]:
+        return {
+            "executed": self.__in_flight.executed,
+            "coalesced": self.__in_flight.coalesced,
+        }
+
+    @property
+    def circuit_state(self) -> str:
+        return self.__breaker.state
+
+    @property
+    def cache_stats(self) -> dict[str, float]:
+        return self.__triplet_cache.stats()
+
+    @property
+    def thread_stats(self) -> dict[str, int]:
+        """
+        Queries and triplet cache lookups of the calling thread so far, the
+        difference of two snapshots is what one message cost.
+        """
+        return dict(self.__thread_counters())
+
+    def __thread_counters(self) -> Counter:
+        counters = getattr(self.__local, "counters", None)
+        if counters is None:
+            counters = self.__local.counters = Counter()
+        return counters
+
+    def __cached(self, cache_key: tuple) -> list | None:
+        cached = self.__triplet_cache.get(cache_key)
+        self.__thread_counters()[
+            "cache_hits" if cached is not None else "cache_misses"
+        ] += 1
+        if self.query_log is not None:
+            self.query_log.record_lookup(cache_key, cached is not None)
+        return cached
+
+    def clear_cache(self):
+        self.__triplet_cache.clear()
+
+    def apply_delta(self, delta: GraphDelta) -> dict[str, int]:
+        """
+        Writes a delta to the endpoint and updates what is kept in memory in
+        place instead of rebuilding it. Cached lookups of a changed subject
+        and reverse lookups a changed triple could match are dropped, the
+        changed subjects are reloaded into the entity catalog and the label
+        index and the statistics count the changed triples. Everything else
+        stays warm.
+        """
+        if not len(delta):
+            return {"added": 0, "removed": 0, "subjects": 0, "invalidated": 0}
+        self.__update(delta.to_update())
+
+        subjects = delta.subjects
+        predicates = delta.predicates
+        objects = {self.__object_key(o) for o in delta.objects}
+        invalidated = self.__triplet_cache.invalidate(
+            lambda key: key[0] in subjects
+            or (
+                key[0] is None
+                and (key[1] is None or key[1] in predicates)
+                and (key[2] is None or key[2] in objects)
+            )
         )
+        if any(subject.startswith(str(WDT)) for subject in subjects):
+            self.__relations = None
+
+        if self.__entities is not None:
+            reloaded = self.__get_relevant_entities_with_labels(subjects)
+            # replaced at once, readers see either the old or the new catalog
+            self.__entities = [
+                entity for entity in self.__entities if str(entity.uri) not in subjects
+            ] + reloaded
+            if self.__label_index is not None:
+                for subject in subjects:
+                    self.__label_index.remove(subject)
+                self.__index_labels(self.__label_index, reloaded, restrict=True)
+        if self.__statistics is not None:
+            self.__statistics.apply(delta)
+        if self.__label_dictionary is not None:
+            # static, rebuilt from the updated catalog and swapped in at once
+            self.__label_dictionary = self.__build_label_dictionary()
+
+        print(f"Applied {delta}, {invalidated} cached lookups invalidated")
+        return {
+            "added": len(delta.added),
+            "removed": len(delta.removed),
+            "subjects": len(subjects),
+            "invalidated": invalidated,
+        }
 
-    def query(self, query_string: str) -> dict[str, list[BindingDict]]:
-        return SPARQLQuery(self.__graph, query_string).query_and_convert()
+    def __update(self, update_string: str):
+        graph = self.__graph or self.__load_graph(self.__update_url)
+        graph.setMethod(POST)
+        try:
+            graph.setQuery(update_string)
+            graph.query()
+        finally:
+            graph.setMethod(GET)
 
     @property
-    def relations(self) -> list[URIRef]:
+    def relations(self) -> list[Relation]:
         if self.__relations is None:
             self.__relations = self.__get_relations()
         return self.__relations
 
-    def __get_relations(self) -> list[URIRef]:
+    def __get_relations(self) -> list[Relation]:
         query = f"""
-            SELECT ?uri WHERE {{
+            SELECT ?uri ?label WHERE {{
                 ?uri <{RDFS.label}> ?label .
                 FILTER(STRSTARTS(STR(?uri), "{WDT}"))
             }}
         """
-        query_result = SPARQLQuery(self.__graph, query).query_and_convert()
-        return [
-            Relation.from_binding(relation, self) for relation in query_result["uri"]
-        ]
+        query_result = self.query(query)
+        # the labels are matched against every question, kept with the
+        # relations instead of fetched one by one into the evictable cache
+        labels = {}
+        for uri, label in zip(query_result["uri"], query_result["label"]):
+            labels.setdefault(uri["value"], label["value"])
+        return [Relation(IRI(uri), self, label) for uri, label in labels.items()]
 
     @property
     def entities(self) -> list[Entity]:
@@ -75,28 +385,107 @@ class KnowledgeGraph:
             self.__entities = self.__get_relevant_entities_with_labels()
         return self.__entities
 
-    def __get_relevant_entities_with_labels(self) -> list[Entity]:
+    @property
+    def label_index(self) -> LabelIndex:
+        if self.__label_index is None:
+            self.__label_index = self.__build_label_index()
+        return self.__label_index
+
+    @property
+    def label_dictionary(self) -> LabelDictionary:
+        if self.__label_dictionary is None:
+            self.__label_dictionary = self.__build_label_dictionary()
+        return self.__label_dictionary
+
+    @property
+    def statistics(self) -> GraphStatistics:
+        if self.__statistics is None:
+            self.__statistics = GraphStatistics(self)
+        return self.__statistics
+
+    def __build_label_dictionary(self) -> LabelDictionary:
+        statistics = self.statistics
+        return LabelDictionary(
+            (entity.label, entity.uri, statistics.popularity(entity))
+            for entity in self.entities
+        )
+
+    def __build_label_index(self) -> LabelIndex:
+        label_index = LabelIndex()
+        self.__index_labels(label_index, self.entities)
+        return label_index
+
+    def __index_labels(
+        self, label_index: LabelIndex, entities: list[Entity], restrict: bool = False
+    ):
+        """
+        Indexes the labels and aliases of the relevant entities. Candidates
+        of a shared label are ranked labels before aliases, movies before
+        other entities and then by their Wikidata id, lower ids are older
+        and usually the better known items. With `restrict` only the aliases
+        of the given entities are queried.
+        """
+        movie_types = {str(e.uri) for e in Entity.instance_of_movies(self)}
+        ranks = {}
+        by_uri = {}
+        for entity in entities:
+            uri = str(entity.uri)
+            is_movie = any(str(t.uri) in movie_types for t in entity.instance_of)
+            rank = (0 if is_movie else 1, self.__wikidata_number(uri))
+            if uri not in ranks or rank < ranks[uri]:
+                ranks[uri] = rank
+                by_uri[uri] = entity
+
+        for uri, entity in by_uri.items():
+            label_index.add(entity.label, entity, (0, *ranks[uri]))
+        if restrict and not by_uri:
+            return
+
+        query = f"""
+            SELECT ?uri ?alias WHERE {{
+                {self.__values("?uri", by_uri) if restrict else ""}
+                VALUES ?predicate {{ <{SKOS.altLabel}> <{SCHEMA.alternateName}> }}
+                ?uri ?predicate ?alias .
+            }}
+        """
+        results = self.query(query)
+        for uri, alias in zip(results.get("uri", []), results.get("alias", [])):
+            entity = by_uri.get(uri["value"])
+            if entity is not None:
+                label_index.add(alias["value"], entity, (1, *ranks[uri["value"]]))
+
+    @staticmethod
+    def __wikidata_number(uri: str) -> int:
+        number = uri.rsplit("/", 1)[-1].lstrip("QP")
+        return int(number) if number.isdigit() else 1 << 62
+
+    def __get_relevant_entities_with_labels(
+        self, uris: Iterable[str] | None = None
+    ) -> list[Entity]:
         condition_triplets = [
             (None, Relation.instance_of(self), e) for e in self.__relevant_instance_of
         ]
+        if uris is not None and not uris:
+            return []
 
         query = f"""
             SELECT ?uri ?label ?instance_of
             WHERE {{
+                {self.__values("?uri", uris) if uris is not None else ""}
                 ?uri <{RDFS.label}> ?label .
-                ?uri <http://www.wikidata.org/prop/direct/P31> ?instance_of .
+                ?uri <{WDT.P31}> ?instance_of .
                 {{ {SPARQLQuery.union_clauses(condition_triplets, ["uri"])} }}
                 FILTER(STRSTARTS(STR(?uri), "{WD}"))
             }}
         """
-        query_result = SPARQLQuery(self.__graph, query).query_and_convert()
+        query_result = self.query(query)
         return [
             Entity(
-                URIRef(uri["value"]),
+                IRI(uri["value"]),
                 self,
                 label["value"],
                 (
-                    URIRef(instance_of["value"])
+                    IRI(instance_of["value"])
                     if instance_of["type"] == "uri"
                     else instance_of
                 ),
@@ -106,13 +495,330 @@ class KnowledgeGraph:
             )
         ]
 
+    @classmethod
+    def lookup_key(
+        cls,
+        subject: str | None,
+        predicate: str | None,
+        object: Property | IRI | None,
+        distinct: bool = False,
+    ) -> tuple[str | None, str | None, str | None, bool]:
+        """
+        The triplet cache key of a lookup, None for what is looked up. IRIs
+        are kept as strings and literals quoted, like "1994-06-24".
+        """
+        return (
+            str(subject) if subject else None,
+            str(predicate) if predicate else None,
+            cls.__property_key(object),
+            distinct,
+        )
+
+    def prefetch(
+        self,
+        keys: Iterable[tuple],
+        batch_size: int = 100,
+        max_matches: int = 1000,
+        deadline: Deadline | None = None,
+    ) -> list[tuple]:
+        """
+        Fills the triplet cache for lookup keys that are not cached yet, in
+        bulk where possible: all properties of many subjects, labels and the
+        subjects with a value of a relation each take one query per batch.
+        Value lookups with more than `max_matches` results are not cached,
+        like in `iter_triplets`. With a deadline, batches cut short are left
+        uncached. Returns the keys that were filled.
+        """
+        missing = [
+            key for key in dict.fromkeys(keys) if key not in self.__triplet_cache
+        ]
+        properties, labels, matches, others = [], [], [], []
+        for key in missing:
+            subject, predicate, object, distinct = key
+            if subject and predicate is None and object is None and distinct:
+                properties.append(subject)
+            elif subject and predicate == str(RDFS.label) and object is None:
+                labels.append(subject)
+            elif subject is None and predicate and object and object[0] != '"':
+                matches.append((predicate, object))
+            else:
+                others.append(key)
+
+        filled = self.__prefetch_properties(properties, batch_size, deadline)
+        self.get_labels([IRI(uri) for uri in labels], batch_size)
+        filled += [self.lookup_key(uri, RDFS.label, None) for uri in labels]
+        filled += self.__prefetch_matches(matches, batch_size, max_matches, deadline)
+        for key in others:
+            subject, predicate, object, distinct = key
+            self.get_triplets(
+                Entity(IRI(subject), self) if subject else None,
+                Relation(IRI(predicate), self) if predicate else None,
+                (
+                    None
+                    if object is None
+                    else object[1:-1] if object[0] == '"' else Entity(IRI(object), self)
+                ),
+                distinct,
+                deadline,
+            )
+            filled.append(key)
+        return [key for key in filled if key in self.__triplet_cache]
+
+    def __prefetch_properties(
+        self, uris: list[str], batch_size: int, deadline: Deadline | None = None
+    ) -> list[tuple]:
+        filled = []
+        for start in range(0, len(uris), batch_size):
+            batch = uris[start : start + batch_size]
+            results = self.query(
+                f"""
+                SELECT DISTINCT ?entity ?relation ?property WHERE {{
+                    {self.__values("?entity", batch)}
+                    ?entity ?relation ?property .
+                }}
+                """,
+                deadline,
+            )
+            if not results and deadline is not None:
+                continue
+            entities = {uri: Entity(IRI(uri), self) for uri in batch}
+            triplets = {uri: [] for uri in batch}
+            for e, r, p in zip(
+                results.get("entity", []),
+                results.get("relation", []),
+                results.get("property", []),
+            ):
+                entity = entities[e["value"]]
+                triplets[e["value"]].append(
+                    self.__triplet(None, r, p, entity, None, None)
+                )
+            for uri in batch:
+                key = self.lookup_key(uri, None, None, True)
+                self.__triplet_cache.put(key, triplets[uri])
+                filled.append(key)
+        return filled
+
+    def __prefetch_matches(
+        self,
+        pairs: list[tuple[str, str]],
+        batch_size: int,
+        max_matches: int,
+        deadline: Deadline | None = None,
+    ) -> list[tuple]:
+        filled = []
+        for start in range(0, len(pairs), batch_size):
+            batch = pairs[start : start + batch_size]
+            rows = " ".join(
+                f"(<{predicate}> <{object}>)" for predicate, object in batch
+            )
+            results = self.query(
+                f"""
+                SELECT ?entity ?relation ?property WHERE {{
+                    VALUES (?relation ?property) {{ {rows} }}
+                    ?entity ?relation ?property .
+                }}
+                """,
+                deadline,
+            )
+            if not results and deadline is not None:
+                continue
+            terms = {
+                pair: (Relation(IRI(pair[0]), self), Entity(IRI(pair[1]), self))
+                for pair in batch
+            }
+            triplets = {pair: [] for pair in batch}
+            for e, r, p in zip(
+                results.get("entity", []),
+                results.get("relation", []),
+                results.get("property", []),
+            ):
+                pair = (r["value"], p["value"])
+                if pair in triplets:
+                    triplets[pair].append(
+                        self.__triplet(e, None, None, None, *terms[pair])
+                    )
+            for (predicate, object), found in triplets.items():
+                if len(found) > max_matches:
+                    continue
+                key = self.lookup_key(None, predicate, IRI(object))
+                self.__triplet_cache.put(key, found)
+                filled.append(key)
+        return filled
+
     def get_triplets(
         self,
         entity: Entity = None,
         relation: Relation = None,
         property: Property = None,
         distinct: bool = False,
+        deadline: Deadline | None = None,
     ) -> list[tuple[Entity, Relation, Property]]:
+        cache_key = self.lookup_key(
+            entity.uri if entity else None,
+            relation.uri if relation else None,
+            property,
+            distinct,
+        )
+        cached = self.__cached(cache_key)
+        if cached is not None:
+            return cached
+
+        pattern, variables = self.__triplet_pattern(entity, relation, property)
+        query = f"""
+            SELECT {"DISTINCT" if distinct else ""} {" ".join(variables)} WHERE {{
+                {pattern}
+            }}
+        """
+        results = self.query(query, deadline)
+        if not results and deadline is not None:
+            return []
+        e, r, p = (
+            results.get("entity"),
+            results.get("relation"),
+            results.get("property"),
+        )
+        num_results = len(e) if e else len(r) if r else len(p) if p else 0
+        triplets = [
+            self.__triplet(
+                e[i] if e else None,
+                r[i] if r else None,
+                p[i] if p else None,
+                entity,
+                relation,
+                property,
+            )
+            for i in range(num_results)
+        ]
+        self.__triplet_cache.put(cache_key, triplets)
+        return triplets
+
+    def iter_triplets(
+        self,
+        entity: Entity = None,
+        relation: Relation = None,
+        property: Property = None,
+        page_size: int = 1000,
+        deadline: Deadline | None = None,
+    ) -> Iterator[tuple[Entity, Relation, Property]]:
+        """
+        Like `get_triplets`, but fetches the matches page by page and yields
+        them as they arrive, so a consumer that stops early never loads all
+        of them. Only results that fit into a single page are cached.
+        """
+        cache_key = self.lookup_key(
+            entity.uri if entity else None,
+            relation.uri if relation else None,
+            property,
+            False,
+        )
+        cached = self.__cached(cache_key)
+        if cached is not None:
+            yield from cached
+            return
+
+        pattern, variables = self.__triplet_pattern(entity, relation, property)
+        triplets = []
+        for row in self.iter_query(
+            variables, pattern, page_size, deadline, keyset=True
+        ):
+            triplet = self.__triplet(
+                row.get("entity"),
+                row.get("relation"),
+                row.get("property"),
+                entity,
+                relation,
+                property,
+            )
+            if len(triplets) <= page_size:
+                triplets.append(triplet)
+            yield triplet
+
+        # results that fit into one page are cheap to keep, like get_triplets
+        if len(triplets) < page_size and (triplets or deadline is None):
+            self.__triplet_cache.put(cache_key, triplets)
+
+    def iter_query(
+        self,
+        variables: list[str],
+        where: str,
+        page_size: int = 1000,
+        deadline: Deadline | None = None,
+        keyset: bool = False,
+    ) -> Iterator[dict[str, BindingDict]]:
+        """
+        Yields the rows of a SELECT over `where` one page at a time. Pages
+        are ordered by the variables, which keeps them stable between
+        requests. With `keyset` a page continues after the last value of the
+        first variable seen instead of skipping an OFFSET, so the endpoint
+        never sorts the rows already read again. Rows sharing that value,
+        like the labels of one uri, are kept on one page. Stops early when a
+        deadline runs out.
+        """
+        key = variables[0].lstrip("?")
+        offset = 0
+        last = None
+        while True:
+            if keyset and last is not None:
+                page_filter = f'FILTER(STR({variables[0]}) > "{self.__escape(last)}")'
+                page = f"LIMIT {page_size}"
+            else:
+                page_filter = ""
+                page = f"LIMIT {page_size} OFFSET {offset}"
+            rows = self.__select(variables, where, page_filter, page, deadline)
+            if len(rows) < page_size:
+                yield from rows
+                return
+            offset += len(rows)
+            if not keyset:
+                yield from rows
+                continue
+
+            # the rows of the last value may go on, the next page repeats them
+            last = rows[-1][key]["value"]
+            complete = [row for row in rows if row[key]["value"] != last]
+            if not complete:
+                # a single value fills the page, all its rows are read at once
+                complete = self.__select(
+                    variables,
+                    where,
+                    f'FILTER(STR({variables[0]}) = "{self.__escape(last)}")',
+                    "",
+                    deadline,
+                )
+            else:
+                last = complete[-1][key]["value"]
+            yield from complete
+
+    def __select(
+        self,
+        variables: list[str],
+        where: str,
+        page_filter: str,
+        page: str,
+        deadline: Deadline | None,
+    ) -> list[dict[str, BindingDict]]:
+        order = " ".join(f"STR({variable})" for variable in variables)
+        query = f"""
+            SELECT {" ".join(variables)} WHERE {{
+                {where}
+                {page_filter}
+            }} ORDER BY {order} {page}
+        """
+        results = self.query(query, deadline)
+        names = [variable.lstrip("?") for variable in variables]
+        return [
+            {name: results[name][i] for name in names}
+            for i in range(len(results.get(names[0], [])))
+        ]
+
+    @staticmethod
+    def __escape(value: str) -> str:
+        return value.replace("\\", "\\\\").replace('"', '\\"')
+
+    @staticmethod
+    def __triplet_pattern(
+        entity: Entity | None, relation: Relation | None, property: Property | None
+    ) -> tuple[str, list[str]]:
         entity_value_or_var = f"<{entity.uri}>" if entity else "?entity"
         relation_value_or_var = f"<{relation.uri}>" if relation else "?relation"
 
@@ -124,34 +830,57 @@ class KnowledgeGraph:
                 clean_property = str(property).replace('"', '\\"')
                 property_value_or_var = f'"{clean_property}"'
 
-        query = f"""
-            SELECT {"DISTINCT" if distinct else ""} {"?entity" if entity is None else ""} {"?relation" if relation is None else ""} {"?property" if property is None else ""}  WHERE {{
-                {entity_value_or_var} {relation_value_or_var} {property_value_or_var} .
-            }}
-        """
-        results = SPARQLQuery(self.__graph, query).query_and_convert()
-        e, r, p = (
-            results.get("entity"),
-            results.get("relation"),
-            results.get("property"),
+        pattern = (
+            f"{entity_value_or_var} {relation_value_or_var} {property_value_or_var} ."
         )
-        num_results = len(e) if e else len(r) if r else len(p) if p else 0
-        return [
-            (
-                Entity.from_binding(e[i], self) if e else entity,
-                Relation.from_binding(r[i], self) if r else relation,
-                (
-                    (
-                        Entity.from_binding(p[i], self)
-                        if p[i]["type"] == "uri"
-                        else p[i]["value"]
-                    )
-                    if p
-                    else property
-                ),
+        variables = [
+            term
+            for term in (
+                entity_value_or_var,
+                relation_value_or_var,
+                property_value_or_var,
             )
-            for i in range(num_results)
+            if term.startswith("?")
         ]
+        return pattern, variables
+
+    def __triplet(
+        self,
+        e: BindingDict | None,
+        r: BindingDict | None,
+        p: BindingDict | None,
+        entity: Entity | None,
+        relation: Relation | None,
+        property: Property | None,
+    ) -> tuple[Entity, Relation, Property]:
+        return (
+            Entity.from_binding(e, self) if e else entity,
+            Relation.from_binding(r, self) if r else relation,
+            (
+                (Entity.from_binding(p, self) if p["type"] == "uri" else p["value"])
+                if p
+                else property
+            ),
+        )
+
+    @staticmethod
+    def __values(variable: str, uris: Iterable[str]) -> str:
+        return f"VALUES {variable} {{ {' '.join(f'<{uri}>' for uri in uris)} }}"
+
+    @staticmethod
+    def __object_key(term: IRI | str) -> str:
+        # the cache key the object has as the property of a lookup
+        return str(term) if isinstance(term, IRI) else f'"{term}"'
+
+    @staticmethod
+    def __property_key(property: Property | IRI | None) -> str | None:
+        if property is None:
+            return None
+        if isinstance(property, Entity) or hasattr(property, "uri"):
+            return str(property.uri)
+        if isinstance(property, IRI):
+            return str(property)
+        return f'"{property}"'
 
     @staticmethod
     def __load_graph(endpoint_url: str) -> SPARQLWrapper:
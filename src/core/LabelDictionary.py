@@ -0,0 +1,193 @@
+import bisect
+import heapq
+from array import array
+from typing import Iterable
+
+from .LabelIndex import LabelIndex
+from .Term import IRI, WD
+
+SEPARATOR = "\0"
+
+
+class LabelDictionary:
+    """
+    The labels of the catalog as one sorted string buffer with offsets,
+    plus the Wikidata id and popularity of every label in parallel arrays.
+    Keys are normalized like in the `LabelIndex`. Exact and prefix lookups
+    are binary searches over the buffer. The most popular completions of a
+    prefix come from a segment tree of the popularity maximum, so they cost
+    O(k log n) however many labels share the prefix. The dictionary is
+    static and rebuilt when the catalog changes.
+    """
+
+    def __init__(self, entries: Iterable[tuple[str, str, float]]):
+        """`entries` are (label, uri, popularity) triples."""
+        rows = {}
+        for label, uri, popularity in entries:
+            key = LabelIndex.normalize(label)
+            id = self.__id(str(uri))
+            if key and id is not None:
+                rows[(key, id)] = (label, popularity)
+        ordered = sorted(rows.items(), key=lambda row: (row[0][0], -row[1][1]))
+
+        self.__size = len(ordered)
+        self.__keys, self.__key_offsets = self.__buffer(k for (k, _), _ in ordered)
+        self.__labels, self.__label_offsets = self.__buffer(
+            label for _, (label, _) in ordered
+        )
+        self.__ids = array("I", (id for (_, id), _ in ordered))
+        self.__popularity = array("f", (p for _, (_, p) in ordered))
+        # leaves at size + i, every inner node the index of the larger child
+        self.__tree = array("I", [0] * self.__size + list(range(self.__size)))
+        for node in range(self.__size - 1, 0, -1):
+            self.__tree[node] = self.__better(
+                self.__tree[2 * node], self.__tree[2 * node + 1]
+            )
+
+    def __len__(self) -> int:
+        return self.__size
+
+    @property
+    def nbytes(self) -> int:
+        # the buffers are ASCII for most labels, so about a byte a character
+        return (
+            len(self.__keys)
+            + len(self.__labels)
+            + sum(
+                len(a) * a.itemsize
+                for a in (
+                    self.__key_offsets,
+                    self.__label_offsets,
+                    self.__ids,
+                    self.__popularity,
+                    self.__tree,
+                )
+            )
+        )
+
+    def lookup(self, label: str) -> list[tuple[IRI, str]]:
+        """All entities labelled `label`, the most popular first."""
+        key = LabelIndex.normalize(label)
+        lo = self.__bisect(key)
+        hi = lo
+        while hi < self.__size and self.__key(hi) == key:
+            hi += 1
+        return [self.__entry(i) for i in range(lo, hi)]
+
+    def complete(self, prefix: str, k: int = 5) -> list[tuple[IRI, str]]:
+        """The `k` most popular entities with a label starting with `prefix`."""
+        lo, hi = self.__range(LabelIndex.normalize(prefix))
+        return [self.__entry(i) for i in self.__top(lo, hi, k)]
+
+    def count(self, prefix: str) -> int:
+        lo, hi = self.__range(LabelIndex.normalize(prefix))
+        return hi - lo
+
+    def suggest(
+        self, text: str, k: int = 3, min_length: int = 4
+    ) -> list[tuple[IRI, str]]:
+        """
+        Completions for a label that is only partly in a text, e.g. "the
+        lion ki". Starting at every word, the span is extended word by word
+        while some label still starts with it, the longest span wins.
+        """
+        tokens = LabelIndex.normalize(text).split()
+        best = (0, 0, 0)
+        for start in range(len(tokens)):
+            end = start
+            lo, hi = 0, self.__size
+            while end < len(tokens):
+                candidate = self.__range(" ".join(tokens[start : end + 1]), lo, hi)
+                if candidate[0] == candidate[1]:
+                    break
+                lo, hi = candidate
+                end += 1
+            span = " ".join(tokens[start:end])
+            if len(span) >= min_length and len(span) > best[0]:
+                best = (len(span), lo, hi)
+        _, lo, hi = best
+        return [self.__entry(i) for i in self.__top(lo, hi, k)] if best[0] else []
+
+    def __top(self, lo: int, hi: int, k: int) -> list[int]:
+        # best first search over ranges, each split around its maximum
+        heap = []
+        if lo < hi:
+            best = self.__argmax(lo, hi)
+            heap.append((-self.__popularity[best], best, lo, hi))
+        top = []
+        while heap and len(top) < k:
+            _, best, lo, hi = heapq.heappop(heap)
+            top.append(best)
+            for a, b in ((lo, best), (best + 1, hi)):
+                if a < b:
+                    i = self.__argmax(a, b)
+                    heapq.heappush(heap, (-self.__popularity[i], i, a, b))
+        return top
+
+    def __argmax(self, lo: int, hi: int) -> int:
+        best = None
+        lo += self.__size
+        hi += self.__size
+        while lo < hi:
+            if lo & 1:
+                best = self.__better(best, self.__tree[lo])
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                best = self.__better(best, self.__tree[hi])
+            lo >>= 1
+            hi >>= 1
+        return best
+
+    def __better(self, a: int | None, b: int) -> int:
+        if a is None:
+            return b
+        # ties go to the label that sorts first
+        if self.__popularity[b] > self.__popularity[a] or (
+            self.__popularity[b] == self.__popularity[a] and b < a
+        ):
+            return b
+        return a
+
+    def __range(
+        self, prefix: str, lo: int = 0, hi: int | None = None
+    ) -> tuple[int, int]:
+        hi = self.__size if hi is None else hi
+        start = self.__bisect(prefix, lo, hi)
+        # every key with the prefix sorts before the prefix followed by the
+        # largest character
+        return start, self.__bisect(prefix + "\U0010ffff", start, hi)
+
+    def __bisect(self, key: str, lo: int = 0, hi: int | None = None) -> int:
+        return bisect.bisect_left(
+            range(self.__size),
+            key,
+            lo,
+            self.__size if hi is None else hi,
+            key=self.__key,
+        )
+
+    def __key(self, i: int) -> str:
+        return self.__keys[self.__key_offsets[i] : self.__key_offsets[i + 1] - 1]
+
+    def __entry(self, i: int) -> tuple[IRI, str]:
+        label = self.__labels[self.__label_offsets[i] : self.__label_offsets[i + 1] - 1]
+        return WD[f"Q{self.__ids[i]}"], label
+
+    @staticmethod
+    def __buffer(strings: Iterable[str]) -> tuple[str, array]:
+        offsets = array("I", [0])
+        parts = []
+        for string in strings:
+            parts.append(string)
+            offsets.append(offsets[-1] + len(string) + len(SEPARATOR))
+        return "".join(part + SEPARATOR for part in parts), offsets
+
+    @staticmethod
+    def __id(uri: str) -> int | None:
+        if not uri.startswith(str(WD)):
+            return None
+        tail = uri[len(str(WD)) :]
+        if tail[:1] == "Q" and tail[1:].isdigit() and int(tail[1:]) < 1 << 32:
+            return int(tail[1:])
+        return None
@@ -0,0 +1,106 @@
+import bisect
+import re
+import threading
+import unicodedata
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from .Entity import Entity
+
+# possessive endings are dropped so "the Beast's" still mentions "the Beast"
+APOSTROPHES = re.compile(r"['’`]s\b|['’`]")
+PUNCTUATION = re.compile(r"[^\w\s]|_")
+
+
+class LabelIndex:
+    """
+    In-memory lookup from normalized labels and aliases to the entities
+    carrying them. Normalization folds case and accents, reads "&" as "and"
+    and drops punctuation, so "Beauty & the Beast" and "beauty and the
+    beast" are the same key. Entities sharing a key are kept ordered by
+    their rank, smaller first, which makes the first candidate a
+    deterministic choice. Writers replace candidate lists instead of
+    changing them, so lookups need no lock while the index is updated.
+    """
+
+    def __init__(self):
+        self.__index: dict[str, list[tuple[Any, str, "Entity"]]] = {}
+        self.__keys_by_uri: dict[str, set[str]] = {}
+        self.__max_tokens = 0
+        self.__lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.__index)
+
+    def __contains__(self, label: str) -> bool:
+        return self.normalize(label) in self.__index
+
+    @property
+    def max_tokens(self) -> int:
+        return self.__max_tokens
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        text = unicodedata.normalize("NFKD", text)
+        text = "".join(char for char in text if not unicodedata.combining(char))
+        text = APOSTROPHES.sub("", text.casefold().replace("&", " and "))
+        return " ".join(PUNCTUATION.sub(" ", text).split())
+
+    def add(self, label: str, entity: "Entity", rank: Any = ()):
+        key = self.normalize(label)
+        if not key:
+            return
+        uri = str(entity.uri)
+        with self.__lock:
+            candidates = list(self.__index.get(key, ()))
+            for i, (existing_rank, existing_uri, _) in enumerate(candidates):
+                if existing_uri == uri:
+                    if existing_rank <= rank:
+                        return
+                    del candidates[i]
+                    break
+            bisect.insort(candidates, (rank, uri, entity), key=lambda c: (c[0], c[1]))
+            self.__index[key] = candidates
+            self.__keys_by_uri.setdefault(uri, set()).add(key)
+            self.__max_tokens = max(self.__max_tokens, key.count(" ") + 1)
+
+    def remove(self, uri: str):
+        """Drops an entity from all labels and aliases it was indexed under."""
+        with self.__lock:
+            for key in self.__keys_by_uri.pop(str(uri), ()):
+                candidates = [c for c in self.__index.get(key, ()) if c[1] != str(uri)]
+                if candidates:
+                    self.__index[key] = candidates
+                else:
+                    self.__index.pop(key, None)
+
+    def lookup(self, label: str) -> list["Entity"]:
+        return self.get(self.normalize(label))
+
+    def get(self, key: str) -> list["Entity"]:
+        """Candidates of an already normalized key, best first."""
+        return [entity for _, _, entity in self.__index.get(key, ())]
+
+    def find_all(self, text: str) -> list[tuple["Entity", str]]:
+        """
+        Links the labels mentioned in a text: every word n-gram is looked up,
+        longer labels win over the shorter ones they overlap and each
+        mention yields its best candidate with the matched key.
+        """
+        tokens = self.normalize(text).split()
+        spans = []
+        for n in range(min(self.__max_tokens, len(tokens)), 0, -1):
+            for start in range(len(tokens) - n + 1):
+                key = " ".join(tokens[start : start + n])
+                candidates = self.__index.get(key)
+                if candidates:
+                    spans.append((len(key), start, n, key, candidates[0][2]))
+
+        taken = [False] * len(tokens)
+        found = []
+        for _, start, n, key, entity in sorted(spans, key=lambda s: (-s[0], s[1])):
+            if any(taken[start : start + n]):
+                continue
+            taken[start : start + n] = [True] * n
+            found.append((entity, key))
+        return found
@@ -0,0 +1,131 @@
+import threading
+import time
+
+from utils import metrics
+
+from .Entity import Entity
+from .KnowledgeGraph import KnowledgeGraph
+from .QueryLog import QueryLog
+from .Relation import Relation
+from .Term import IRI, RDFS
+
+
+class Prefetcher:
+    """
+    Warms the triplet cache with what the query log says the traffic asks
+    for. For the hottest entities it fetches their properties and labels,
+    then the movies sharing each of their values, the neighbours a
+    recommendation looks up, and their labels. The hottest recorded lookups
+    are replayed as well. Values shared by more than `max_matches` movies
+    are left out, recommendations skip them too.
+    """
+
+    def __init__(
+        self,
+        knowledge_graph: KnowledgeGraph,
+        query_log: QueryLog,
+        entities: int = 200,
+        lookups: int = 1000,
+        max_matches: int = 1000,
+    ):
+        self.entities = entities
+        self.lookups = lookups
+        self.max_matches = max_matches
+        self.__knowledge_graph = knowledge_graph
+        self.__query_log = query_log
+        self.__stop = threading.Event()
+
+    def prefetch(self) -> dict[str, int]:
+        """Fetches everything that is not cached yet, in bulk queries."""
+        start = time.perf_counter()
+        knowledge_graph = self.__knowledge_graph
+        hot = self.__query_log.hottest_entities(self.entities)
+        with self.__query_log.paused():
+            filled = knowledge_graph.prefetch(
+                [KnowledgeGraph.lookup_key(uri, None, None, True) for uri in hot]
+                + [KnowledgeGraph.lookup_key(uri, RDFS.label, None) for uri in hot]
+            )
+            neighbours = [
+                key
+                for uri in hot
+                for key in self.__neighbour_lookups(Entity(IRI(uri), knowledge_graph))
+            ]
+            recorded = [
+                key
+                for key in self.__query_log.hottest_lookups(self.lookups)
+                if not self.__broad(key)
+            ]
+            fetched = knowledge_graph.prefetch(neighbours + recorded)
+            filled += fetched
+
+            # labels of the movies found, they are shown as recommendations
+            fetched = set(fetched)
+            candidates = {
+                str(entity.uri)
+                for subject, predicate, object, distinct in neighbours
+                if (subject, predicate, object, distinct) in fetched
+                for entity, _, _ in knowledge_graph.get_triplets(
+                    None,
+                    Relation(IRI(predicate), knowledge_graph),
+                    Entity(IRI(object), knowledge_graph),
+                )
+            }
+            filled += knowledge_graph.prefetch(
+                [KnowledgeGraph.lookup_key(uri, RDFS.label, None) for uri in candidates]
+            )
+        self.__query_log.mark_prefetched(filled)
+        metrics.increment("prefetch.keys", len(filled))
+        metrics.observe("prefetch_time", time.perf_counter() - start)
+        return {
+            "entities": len(hot),
+            "neighbours": len(neighbours),
+            "recorded": len(recorded),
+            "filled": len(filled),
+        }
+
+    def start(self, interval: float | None = 600.0):
+        """
+        Prefetches in a background thread, once and then every `interval`
+        seconds, and saves the query log after each round.
+        """
+        threading.Thread(
+            target=self.__prefetch_periodically,
+            args=(interval,),
+            name="graph-prefetcher",
+            daemon=True,
+        ).start()
+
+    def close(self):
+        self.__stop.set()
+
+    def __prefetch_periodically(self, interval: float | None):
+        while True:
+            try:
+                stats = self.prefetch()
+                print(f"Prefetched {stats}, {self.__query_log.stats()}")
+                self.__query_log.save()
+            except Exception as e:
+                print(f"Failed to prefetch: {e}")
+            if interval is None or self.__stop.wait(interval):
+                return
+
+    def __neighbour_lookups(self, entity: Entity) -> list[tuple]:
+        statistics = self.__knowledge_graph.statistics
+        return [
+            KnowledgeGraph.lookup_key(None, relation.uri, value)
+            for _, relation, value in self.__knowledge_graph.get_properties(entity)
+            if isinstance(value, Entity)
+            and 0 < statistics.matches(relation, value) <= self.max_matches
+        ]
+
+    def __broad(self, key: tuple) -> bool:
+        subject, predicate, object, _ = key
+        if subject is not None or object is None or object[0] == '"':
+            return False
+        return (
+            self.__knowledge_graph.statistics.matches(
+                Relation(IRI(predicate), self.__knowledge_graph) if predicate else None,
+                Entity(IRI(object), self.__knowledge_graph),
+            )
+            > self.max_matches
+        )
@@ -0,0 +1,131 @@
+import json
+import os
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Hashable, Iterable, Iterator
+
+from utils import metrics
+
+
+class QueryLog:
+    """
+    Compact log of what the traffic asks for: how often each entity was
+    linked in a message and each triplet lookup was made, counted instead of
+    stored as events. Once more than `max_size` entities or lookups are
+    known, all counts are halved and the colder half is dropped, so the log
+    stays small and old traffic fades. Saved as JSON, the hot set survives
+    restarts. Also counts the lookups answered by prefetched cache entries.
+    """
+
+    def __init__(self, path: str | Path | None = None, max_size: int = 10_000):
+        self.path = Path(path) if path else None
+        self.max_size = max_size
+        self.__entities: Counter[str] = Counter()
+        self.__lookups: Counter[tuple] = Counter()
+        self.__prefetched: set[Hashable] = set()
+        self.__used: set[Hashable] = set()
+        self.__total = 0
+        self.__hits = 0
+        self.__lock = threading.Lock()
+        self.__local = threading.local()
+
+    def record_entities(self, uris: Iterable[str]):
+        with self.__lock:
+            self.__entities.update(str(uri) for uri in uris)
+            self.__compact(self.__entities)
+
+    def record_lookup(self, key: tuple, cached: bool):
+        """Counts a lookup with its triplet cache key, unless paused."""
+        if getattr(self.__local, "paused", False):
+            return
+        with self.__lock:
+            self.__lookups[key] += 1
+            self.__compact(self.__lookups)
+            self.__total += 1
+            if key not in self.__prefetched:
+                return
+            if cached:
+                self.__hits += 1
+                self.__used.add(key)
+                metrics.increment("prefetch.hits")
+            else:
+                # evicted or invalidated, what is fetched now is no prefetch
+                self.__prefetched.discard(key)
+
+    @contextmanager
+    def paused(self) -> Iterator[None]:
+        """Lookups of the current thread are not counted, e.g. prefetches."""
+        self.__local.paused = True
+        try:
+            yield
+        finally:
+            self.__local.paused = False
+
+    def mark_prefetched(self, keys: Iterable[Hashable]):
+        with self.__lock:
+            self.__prefetched.update(keys)
+
+    def hottest_entities(self, n: int) -> list[str]:
+        with self.__lock:
+            return [uri for uri, _ in self.__entities.most_common(n)]
+
+    def hottest_lookups(self, n: int) -> list[tuple]:
+        with self.__lock:
+            return [key for key, _ in self.__lookups.most_common(n)]
+
+    @property
+    def prefetch_hit_ratio(self) -> float:
+        """Share of all lookups answered by a prefetched cache entry."""
+        with self.__lock:
+            return self.__hits / self.__total if self.__total else 0.0
+
+    def stats(self) -> dict[str, int | float]:
+        with self.__lock:
+            return {
+                "entities": len(self.__entities),
+                "lookups": len(self.__lookups),
+                "recorded_lookups": self.__total,
+                "prefetched": len(self.__prefetched),
+                "prefetch_hits": self.__hits,
+                "prefetch_hit_ratio": (
+                    self.__hits / self.__total if self.__total else 0.0
+                ),
+                # how much of the prefetched data was worth fetching
+                "prefetched_used": len(self.__used),
+            }
+
+    def save(self):
+        if self.path is None:
+            return
+        with self.__lock:
+            data = {
+                "entities": self.__entities.most_common(),
+                "lookups": [
+                    [list(key), count] for key, count in self.__lookups.most_common()
+                ],
+            }
+        # replaced at once, a crash never leaves half a log behind
+        partial = self.path.with_name(f"{self.path.name}.partial")
+        partial.write_text(json.dumps(data), encoding="utf-8")
+        os.replace(partial, self.path)
+
+    @classmethod
+    def load(cls, path: str | Path, max_size: int = 10_000) -> "QueryLog":
+        """The log saved at `path`, an empty one if there is none yet."""
+        query_log = cls(path, max_size)
+        if query_log.path.exists():
+            data = json.loads(query_log.path.read_text(encoding="utf-8"))
+            query_log.__entities.update(dict(data.get("entities", [])))
+            query_log.__lookups.update(
+                {tuple(key): count for key, count in data.get("lookups", [])}
+            )
+        return query_log
+
+    def __compact(self, counts: Counter):
+        if len(counts) <= self.max_size:
+            return
+        kept = counts.most_common(self.max_size // 2)
+        counts.clear()
+        counts.update({key: count // 2 for key, count in kept if count // 2})
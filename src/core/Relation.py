@@ -1,19 +1,19 @@
 from typing import TYPE_CHECKING
 
-from rdflib import RDFS, Namespace, URIRef
-
 from utils import BindingDict
 
+from .Term import IRI, RDFS, SCHEMA, WDT
+
 if TYPE_CHECKING:
     from .KnowledgeGraph import KnowledgeGraph
 
-SCHEMA = Namespace("http://schema.org/")
-
 
 class Relation:
-    def __init__(self, uri: URIRef, knowledge_graph: "KnowledgeGraph"):
+    def __init__(
+        self, uri: IRI, knowledge_graph: "KnowledgeGraph", label: str | None = None
+    ):
         self.__uri = uri
-        self.__label: str | None = None
+        self.__label: str | None = label
         self.__knowledge_graph = knowledge_graph
 
     def __repr__(self):
@@ -30,12 +30,12 @@ class Relation:
     @classmethod
     def instance_of(cls, knowledge_graph: "KnowledgeGraph") -> "Relation":
         return cls(
-            uri=URIRef("http://www.wikidata.org/prop/direct/P31"),
+            uri=WDT.P31,
             knowledge_graph=knowledge_graph,
         )
 
     @property
-    def uri(self) -> URIRef:
+    def uri(self) -> IRI:
         return self.__uri
 
     @property
@@ -48,7 +48,7 @@ class Relation:
             return self.__label
         return self.__get_label(self.__uri)
 
-    def __get_label(self, uri: URIRef) -> str:
+    def __get_label(self, uri: IRI) -> str:
         return self.__knowledge_graph.get_label(uri)
 
     @classmethod
@@ -56,7 +56,7 @@ class Relation:
         cls, binding: BindingDict, knowledge_graph: "KnowledgeGraph"
     ) -> "Relation":
         if binding["type"] == "uri":
-            uri = URIRef(binding.get("value"))
+            uri = IRI(binding.get("value"))
             return cls(uri=uri, knowledge_graph=knowledge_graph)
         else:
             raise ValueError(
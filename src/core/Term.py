@@ -0,0 +1,53 @@
+import threading
+from weakref import WeakValueDictionary
+
+
+class IRI(str):
+    """
+    An IRI of the graph, a plain str that is interned: creating an IRI
+    that is still in use returns the same object, so the catalog and
+    relation IRIs the agent holds on to are stored once and compare by
+    identity first. The table only keeps weak references, IRIs of query
+    results nobody refers to any more are dropped with their last user.
+    Replaces rdflib's URIRef, which costs the rdflib import and more per
+    term.
+    """
+
+    __slots__ = ("__weakref__",)
+    __interned: "WeakValueDictionary[str, IRI]" = WeakValueDictionary()
+    __lock = threading.Lock()
+
+    def __new__(cls, value: str) -> "IRI":
+        iri = cls.__interned.get(value)
+        if iri is None:
+            with cls.__lock:
+                iri = cls.__interned.setdefault(value, super().__new__(cls, value))
+        return iri
+
+    def __repr__(self) -> str:
+        return f"IRI({str(self)!r})"
+
+    def n3(self) -> str:
+        return f"<{self}>"
+
+
+class Namespace(str):
+    """IRI prefix whose attributes and items are IRIs, like `WDT.P31`."""
+
+    __slots__ = ()
+
+    def __getattr__(self, name: str) -> IRI:
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return IRI(self + name)
+
+    def __getitem__(self, name: str) -> IRI:
+        return IRI(self + name)
+
+
+RDFS = Namespace("http://www.w3.org/2000/01/rdf-schema#")
+WD = Namespace("http://www.wikidata.org/entity/")
+WDT = Namespace("http://www.wikidata.org/prop/direct/")
+DDIS = Namespace("http://ddis.ch/atai/")
+SCHEMA = Namespace("http://schema.org/")
+SKOS = Namespace("http://www.w3.org/2004/02/skos/core#")
@@ -1,15 +1,35 @@
+from .EndpointPool import Endpoint, EndpointPool
 from .Entity import Entity
-from .KnowledgeGraph import DDIS, SCHEMA, WD, WDT, KnowledgeGraph
+from .GraphDelta import GraphDelta
+from .GraphStatistics import GraphStatistics
+from .KnowledgeGraph import KnowledgeGraph
+from .LabelDictionary import LabelDictionary
+from .LabelIndex import LabelIndex
+from .Prefetcher import Prefetcher
 from .Property import Property
+from .QueryLog import QueryLog
 from .Relation import Relation
+from .Term import DDIS, IRI, RDFS, SCHEMA, SKOS, WD, WDT, Namespace
 
 __all__ = [
+    "Endpoint",
+    "EndpointPool",
     "Entity",
+    "GraphDelta",
+    "GraphStatistics",
+    "IRI",
+    "Prefetcher",
     "Property",
+    "QueryLog",
     "Relation",
     "KnowledgeGraph",
+    "LabelDictionary",
+    "LabelIndex",
+    "Namespace",
     "WD",
     "WDT",
     "DDIS",
+    "RDFS",
     "SCHEMA",
+    "SKOS",
 ]
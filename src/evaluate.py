@@ -0,0 +1,195 @@
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from agent import Message, Recommendations
+from core import KnowledgeGraph, Prefetcher, QueryLog
+from utils import Deadline, Metrics
+
+STAGES = ["entities", "properties", "recommendations", "labels", "total"]
+
+
+def answer(
+    question: str, knowledge_graph: KnowledgeGraph, budget: float, limit: int
+) -> dict:
+    """
+    Runs one question through entity linking and recommendation like the
+    agent does, without posting anything, and records what each stage took.
+    """
+    before = knowledge_graph.thread_stats
+    deadline = Deadline(budget)
+    timings = {}
+    start = time.perf_counter()
+
+    def lap(stage: str, since: float) -> float:
+        now = time.perf_counter()
+        timings[stage] = now - since
+        return now
+
+    message = Message(question, knowledge_graph, deadline)
+    entities = message.entities
+    mark = lap("entities", start)
+    properties = message.properties
+    mark = lap("properties", mark)
+    if knowledge_graph.query_log is not None:
+        knowledge_graph.query_log.record_entities(
+            entity.uri for entity in entities + properties
+        )
+
+    ranked = []
+    for ranked in Recommendations.stream(
+        entities, properties, knowledge_graph, deadline=deadline, limit=limit
+    ):
+        if "first_result" not in timings:
+            timings["first_result"] = time.perf_counter() - start
+    mark = lap("recommendations", mark)
+    recommendations = [
+        {"uri": str(entity.uri), "label": entity.label, "score": round(score, 4)}
+        for entity, score in ranked
+    ]
+    lap("labels", mark)
+    lap("total", start)
+
+    after = knowledge_graph.thread_stats
+    return {
+        "entities": [str(entity.uri) for entity in entities],
+        "properties": [str(getattr(p, "uri", p)) for p in properties],
+        "recommendations": recommendations,
+        "timings": {stage: round(value, 6) for stage, value in timings.items()},
+        **{
+            key: after.get(key, 0) - before.get(key, 0)
+            for key in ("queries", "cache_hits", "cache_misses")
+        },
+        "degradations": deadline.degradations,
+    }
+
+
+def evaluate(
+    record: dict, knowledge_graph: KnowledgeGraph, budget: float, limit: int
+) -> dict:
+    try:
+        return {
+            **record,
+            **answer(record["question"], knowledge_graph, budget, limit),
+        }
+    except Exception as e:
+        return {**record, "error": f"{type(e).__name__}: {e}"}
+
+
+def read_questions(path: str) -> list[dict]:
+    records = []
+    with open(path, encoding="utf-8") if path != "-" else sys.stdin as lines:
+        for line in lines:
+            if line.strip():
+                record = json.loads(line)
+                records.append(
+                    record if isinstance(record, dict) else {"question": record}
+                )
+    return records
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Runs a JSONL file of questions through the recommendation "
+        'pipeline, one {"question": ...} object per line, other fields are '
+        "copied to the output."
+    )
+    parser.add_argument("questions", help="JSONL file, - reads stdin")
+    parser.add_argument("-o", "--output", default="-", help="JSONL answers")
+    parser.add_argument(
+        "--endpoint",
+        nargs="+",
+        default=["http://localhost:3030/atai/sparql"],
+        help="SPARQL endpoint, several are used as read replicas",
+    )
+    parser.add_argument(
+        "--synthetic",
+        type=int,
+        metavar="SIZE",
+        help="answer from a generated in-memory graph of SIZE entities instead",
+    )
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--budget", type=float, default=10.0)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument(
+        "--query-log",
+        metavar="PATH",
+        help="prefetch what the log recorded before answering, record the "
+        "questions into it and report the prefetch hit ratio",
+    )
+    args = parser.parse_args()
+    query_log = QueryLog.load(args.query_log) if args.query_log else None
+
+    if args.synthetic:
+        from benchmarks import LocalSPARQLWrapper, SyntheticGraph
+
+        synthetic = SyntheticGraph(num_entities=args.synthetic)
+        knowledge_graph = KnowledgeGraph(
+            graph=LocalSPARQLWrapper(synthetic.graph),
+            health_check_interval=None,
+            query_log=query_log,
+        )
+    else:
+        knowledge_graph = KnowledgeGraph(args.endpoint, query_log=query_log)
+
+    start = time.perf_counter()
+    knowledge_graph.entities
+    knowledge_graph.label_index
+    knowledge_graph.statistics
+    print(f"Loaded graph in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    if query_log is not None:
+        start = time.perf_counter()
+        prefetched = Prefetcher(knowledge_graph, query_log).prefetch()
+        print(
+            f"Prefetched {prefetched} in {time.perf_counter() - start:.1f}s",
+            file=sys.stderr,
+        )
+
+    records = read_questions(args.questions)
+    results = Metrics(window=max(len(records), 1))
+    output = open(args.output, "w", encoding="utf-8") if args.output != "-" else None
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.workers) as executor:
+        for result in executor.map(
+            lambda record: evaluate(record, knowledge_graph, args.budget, args.limit),
+            records,
+        ):
+            print(json.dumps(result, ensure_ascii=False), file=output or sys.stdout)
+            if "error" in result:
+                results.increment("errors")
+                continue
+            for stage, value in result["timings"].items():
+                results.observe(stage, value)
+            results.increment("queries", result["queries"])
+            if not result["recommendations"]:
+                results.increment("unanswered")
+    elapsed = time.perf_counter() - start
+    if output is not None:
+        output.close()
+
+    print(
+        f"{len(records)} questions in {elapsed:.1f}s with {args.workers} workers, "
+        f"{len(records) / elapsed if elapsed else 0:.1f} questions/s, "
+        f"{results.counter('errors'):.0f} errors, "
+        f"{results.counter('unanswered'):.0f} without recommendations, "
+        f"{results.counter('queries'):.0f} graph queries",
+        file=sys.stderr,
+    )
+    for stage in ["first_result", *STAGES]:
+        summary = results.summary(stage)
+        if summary["count"]:
+            print(
+                f"{stage:<16} "
+                + "  ".join(
+                    f"{name} {summary[name] * 1e3:9.1f} ms"
+                    for name in ("mean", "p50", "p95", "p99", "max")
+                ),
+                file=sys.stderr,
+            )
+    print(f"triplet cache: {knowledge_graph.cache_stats}", file=sys.stderr)
+    print(f"in flight: {knowledge_graph.in_flight_stats}", file=sys.stderr)
+    if query_log is not None:
+        query_log.save()
+        print(f"query log: {query_log.stats()}", file=sys.stderr)
@@ -0,0 +1,182 @@
+import math
+from typing import List, Optional, Tuple
+
+from core import RDFS, SCHEMA, Entity, KnowledgeGraph, Relation
+
+from .LargeLanguageModel import LargeLanguageModel, PromptTemplate
+
+RELATION_PRIORITIES = {
+    "director": 90,
+    "genre": 85,
+    "cast member": 80,
+    "publication date": 75,
+    "screenwriter": 70,
+    "award received": 65,
+    "production company": 60,
+    "country of origin": 55,
+    "nominated for": 50,
+    "based on": 45,
+    "box office": 40,
+    "cost": 40,
+    "duration": 35,
+    "original language of film or TV show": 30,
+    "MPA film rating": 30,
+    "composer": 25,
+    "director of photography": 25,
+    "film editor": 20,
+}
+
+SKIPPED_RELATIONS = {str(RDFS.label), str(SCHEMA.description)}
+
+
+def estimate_tokens(text: str) -> int:
+    # slightly pessimistic average for English text with many names
+    return math.ceil(len(text) / 3.5)
+
+
+class ContextBuilder:
+    """
+    Turns the knowledge graph facts of linked entities into a compact list
+    of lines for `PromptTemplate.context`: one line per entity and relation,
+    deduplicated, ranked by relevance to the question and cut to a token
+    budget. Facts are preselected with a pessimistic estimate, the context
+    is then counted by the model's tokenizer and the least relevant facts
+    dropped until it fits, so `max_tokens` is a hard limit at usually one
+    tokenize request per context.
+
+    The defaults fit llama-server started with --ctx-size 4096 and
+    --parallel 3, where each slot gets about 1365 tokens for system prompt,
+    context, question and answer. The output is deterministic for the same
+    entities and question, and the context only ever goes into the user
+    message, so the system prompt stays a stable prefix that llama-server's
+    prompt cache can reuse across requests.
+    """
+
+    def __init__(
+        self,
+        knowledge_graph: KnowledgeGraph,
+        llm: LargeLanguageModel,
+        max_tokens: int = 600,
+        max_values_per_relation: int = 5,
+    ):
+        self.knowledge_graph = knowledge_graph
+        self.llm = llm
+        self.max_tokens = max_tokens
+        self.max_values_per_relation = max_values_per_relation
+
+    def prompt(
+        self,
+        question: str,
+        entities: List[Entity],
+        relations: Optional[List[Relation]] = None,
+        template: Optional[PromptTemplate] = None,
+        **kwargs,
+    ) -> str:
+        """Asks the model the question with the facts about the entities."""
+        return self.llm.prompt(
+            question,
+            template=self.template(entities, question, relations, template),
+            **kwargs,
+        )
+
+    def template(
+        self,
+        entities: List[Entity],
+        question: str = "",
+        relations: Optional[List[Relation]] = None,
+        template: Optional[PromptTemplate] = None,
+    ) -> PromptTemplate:
+        """The template, the model's default one if None, with the facts."""
+        template = template or self.llm.default_template
+        return template.with_context(self.build(entities, question, relations))
+
+    def build(
+        self,
+        entities: List[Entity],
+        question: str = "",
+        relations: Optional[List[Relation]] = None,
+    ) -> str:
+        lines = []
+        used_tokens = 0
+        for _, fact in self.facts(entities, question, relations):
+            tokens = estimate_tokens(fact)
+            if used_tokens + tokens > self.max_tokens:
+                continue
+            lines.append(fact)
+            used_tokens += tokens
+
+        # the estimate only preselects, the tokenizer of the model decides
+        context = "\n".join(lines)
+        while lines and self.llm.count_tokens(context) > self.max_tokens:
+            lines.pop()
+            context = "\n".join(lines)
+        return context
+
+    def facts(
+        self,
+        entities: List[Entity],
+        question: str = "",
+        relations: Optional[List[Relation]] = None,
+    ) -> List[Tuple[int, str]]:
+        """Returns (relevance, fact) pairs, most relevant first."""
+        question = question.lower()
+        asked_relations = {str(relation.uri) for relation in relations or []}
+
+        uris = []
+        for entity in entities:
+            uris.append(entity.uri)
+            for relation, values in entity.properties.items():
+                uris.append(relation.uri)
+                uris.extend(v.uri for v in values if isinstance(v, Entity))
+        labels = self.knowledge_graph.get_labels(uris)
+
+        facts = []
+        seen = set()
+        for rank, entity in enumerate(entities):
+            name = labels.get(str(entity.uri), "")
+            if not name:
+                continue
+            description = self.knowledge_graph.get_description(entity.uri)
+            if description:
+                facts.append((1000 - rank, f"{name}: {description}"))
+
+            for relation, values in entity.properties.items():
+                relation_uri = str(relation.uri)
+                relation_label = labels.get(relation_uri, "")
+                if (
+                    relation_uri in SKIPPED_RELATIONS
+                    or not relation_label
+                    or relation_label.endswith(" ID")
+                ):
+                    continue
+
+                value_labels = list(
+                    dict.fromkeys(
+                        label
+                        for label in (self.__value_label(v, labels) for v in values)
+                        if label
+                    )
+                )[: self.max_values_per_relation]
+                if not value_labels:
+                    continue
+
+                fact = f"{name} - {relation_label}: {', '.join(value_labels)}"
+                if fact.casefold() in seen:
+                    continue
+                seen.add(fact.casefold())
+
+                relevance = RELATION_PRIORITIES.get(relation_label, 10) - rank * 10
+                if relation_uri in asked_relations:
+                    relevance += 500
+                elif relation_label.lower() in question:
+                    relevance += 400
+                facts.append((relevance, fact))
+
+        return sorted(facts, key=lambda fact: (-fact[0], fact[1]))
+
+    @staticmethod
+    def __value_label(value, labels: dict[str, str]) -> str:
+        if isinstance(value, Entity):
+            return labels.get(str(value.uri), "")
+        value = str(value)
+        return value.removesuffix("T00:00:00Z")
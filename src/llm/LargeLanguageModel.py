@@ -1,9 +1,20 @@
+import asyncio
+import json
 import time
-from dataclasses import dataclass
+import urllib.request
+import weakref
+from dataclasses import dataclass, replace
 from enum import Enum
-from typing import Any, Callable, Dict, Iterator, Optional
+from functools import cached_property
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
 
-from openai import OpenAI
+from openai import AsyncOpenAI, BadRequestError, OpenAI
+
+from utils import CircuitBreaker, CircuitOpen, Hedger, backoff
+
+from .RequestMetrics import RequestMetrics
+from .ResponseCache import ResponseCache
+from .SlotScheduler import QueueTimeout, SlotScheduler
 
 
 class ResponseFormat(Enum):
@@ -11,8 +22,13 @@ class ResponseFormat(Enum):
     JSON = "json_object"
 
 
-@dataclass
+@dataclass(frozen=True)
 class PromptTemplate:
+    """
+    Immutable, so one template can be shared by concurrent requests. A
+    request with its own context gets its own copy through `with_context`.
+    """
+
     system: str = """Strictly follow these rules:
     1) You should be good in conversation, friendly and welcoming
     2) Do not use prior knowledge, give response to query by using the context provided
@@ -25,7 +41,14 @@ class PromptTemplate:
     user_suffix: str = ""
     assistant_prefix: Optional[str] = None
 
-    def format(self, prompt: str) -> Dict[str, str]:
+    def with_context(self, context: Optional[str]) -> "PromptTemplate":
+        if not context or context == self.context:
+            return self
+        return replace(self, context=context)
+
+    @cached_property
+    def _user_head(self) -> str:
+        # everything in front of the prompt, formatted once per template
         formatted_context = ""
         if self.context:
             formatted_context = (
@@ -34,10 +57,10 @@ class PromptTemplate:
                 f"{self.context}\n"
                 "------------------------------------------\n\n"
             )
+        return f"{formatted_context}{self.user_prefix}"
 
-        formatted_user = (
-            f"{formatted_context}{self.user_prefix}{prompt} {self.user_suffix}".strip()
-        )
+    def format(self, prompt: str) -> Dict[str, str]:
+        formatted_user = f"{self._user_head}{prompt} {self.user_suffix}".strip()
 
         return {
             "system": self.system,
@@ -54,19 +77,36 @@ class LargeLanguageModel:
         default_model: str = "local-model",
         timeout: int = 60,
         max_retries: int = 3,
+        response_cache: Optional[ResponseCache] = None,
+        parallel_slots: int = 3,
+        queue_timeout: Optional[float] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        hedge: bool = False,
     ):
         self.llm_service_endpoint = llm_service_endpoint
         self.default_model = default_model
         self.timeout = timeout
         self.max_retries = max_retries
+        self.response_cache = response_cache
+        self.queue_timeout = queue_timeout
 
         self.llm_client = OpenAI(
             base_url=f"{llm_service_endpoint}/v1", api_key="not-needed", timeout=timeout
         )
+        # async clients are bound to the event loop they were created in
+        self._async_clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+        # one slot per parallel sequence of the llama-server (--parallel)
+        self.scheduler = SlotScheduler(parallel_slots)
+
+        # fail fast while the llama-server is down instead of waiting out timeouts
+        self.breaker = breaker or CircuitBreaker("llm", excluded=(BadRequestError,))
+        self.hedger = Hedger("llm", min_delay=1.0) if hedge else None
 
         self.default_template = PromptTemplate()
 
         self.progress_callback: Optional[Callable] = None
+        self.metrics_callback: Optional[Callable[[RequestMetrics], None]] = None
 
     def set_prompt_template(self, template: PromptTemplate):
         self.default_template = template
@@ -74,6 +114,10 @@ class LargeLanguageModel:
     def set_progress_callback(self, callback: Callable[[str, Optional[float]], None]):
         self.progress_callback = callback
 
+    def set_metrics_callback(self, callback: Callable[[RequestMetrics], None]):
+        """Called with the metrics of every finished request."""
+        self.metrics_callback = callback
+
     def prompt(
         self,
         prompt: str,
@@ -84,10 +128,10 @@ class LargeLanguageModel:
         max_tokens: int = 1000,
         stream: bool = False,
         response_format: ResponseFormat = ResponseFormat.TEXT,
+        priority: int = 0,
         **kwargs,
     ) -> str:
-        template = template or self.default_template
-        template.context = context or template.context
+        template = (template or self.default_template).with_context(context)
         model = model or self.default_model
 
         formatted = template.format(prompt)
@@ -99,6 +143,25 @@ class LargeLanguageModel:
 
         self._update_progress("Preparing request")
 
+        cache_key = self._cache_key(
+            template,
+            prompt,
+            model,
+            temperature,
+            max_tokens=max_tokens,
+            response_format=response_format.value,
+            **kwargs,
+        )
+        request_metrics = RequestMetrics(model, streamed=stream)
+        if cache_key is not None:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                request_metrics.cached = True
+                self._report_metrics(request_metrics)
+                self._update_progress("Complete (cached)")
+                return cached
+
+        error = None
         try:
             request_params = {
                 "model": model,
@@ -111,21 +174,37 @@ class LargeLanguageModel:
 
             if response_format == ResponseFormat.JSON:
                 request_params["response_format"] = {"type": "json_object"}
-
-            self._update_progress("Sending request to LLM")
-
             if stream:
-                return self._handle_streaming_response(
-                    request_params, formatted.get("assistant_prefix")
-                )
-            else:
-                return self._handle_standard_response(
-                    request_params, formatted.get("assistant_prefix")
-                )
+                request_params.setdefault("stream_options", {"include_usage": True})
+
+            with self.scheduler.slot(priority, self.queue_timeout) as waited:
+                request_metrics.queue_wait = waited
+                self._update_progress("Sending request to LLM")
+
+                if stream:
+                    result = self._handle_streaming_response(
+                        request_params,
+                        formatted.get("assistant_prefix"),
+                        request_metrics,
+                    )
+                else:
+                    result = self._handle_standard_response(
+                        request_params,
+                        formatted.get("assistant_prefix"),
+                        request_metrics,
+                    )
+
+            if cache_key is not None and result is not None:
+                self.response_cache.put(cache_key, result)
+            return result
 
         except Exception as e:
+            error = e
             self._update_progress(f"Error: {str(e)}")
             raise
+        finally:
+            if not request_metrics.cached:
+                self._report_metrics(request_metrics, error)
 
     def prompt_stream(
         self,
@@ -135,10 +214,10 @@ class LargeLanguageModel:
         model: Optional[str] = None,
         temperature: float = 0.7,
         max_tokens: int = 1000,
+        priority: int = 0,
         **kwargs,
     ) -> Iterator[str]:
-        template = template or self.default_template
-        template.context = context or template.context
+        template = (template or self.default_template).with_context(context)
         model = model or self.default_model
 
         formatted = template.format(prompt)
@@ -150,44 +229,257 @@ class LargeLanguageModel:
 
         self._update_progress("Starting stream")
 
+        cache_key = self._cache_key(
+            template, prompt, model, temperature, max_tokens=max_tokens, **kwargs
+        )
+        request_metrics = RequestMetrics(model, streamed=True)
+        if cache_key is not None:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                request_metrics.cached = True
+                self._report_metrics(request_metrics)
+                self._update_progress("Stream complete (cached)")
+                yield cached
+                return
+
+        kwargs.setdefault("stream_options", {"include_usage": True})
+        error = None
         try:
-            stream = self.llm_client.chat.completions.create(
-                model=model,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=max_tokens,
-                stream=True,
-                **kwargs,
-            )
+            with self.scheduler.slot(priority, self.queue_timeout) as waited:
+                request_metrics.queue_wait = waited
+                stream = self.breaker.call(
+                    self.llm_client.chat.completions.create,
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    stream=True,
+                    **kwargs,
+                )
 
-            first_chunk = True
-            for chunk in stream:
-                if chunk.choices[0].delta.content:
-                    content = chunk.choices[0].delta.content
+                first_chunk = True
+                chunks = []
+                for chunk in stream:
+                    request_metrics.usage(getattr(chunk, "usage", None))
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        content = chunk.choices[0].delta.content
+                        request_metrics.chunk()
 
-                    if first_chunk and formatted["assistant_prefix"]:
-                        content = f"{formatted['assistant_prefix']}{content}"
-                        first_chunk = False
+                        if first_chunk and formatted["assistant_prefix"]:
+                            content = f"{formatted['assistant_prefix']}{content}"
+                            first_chunk = False
 
-                    yield content
+                        chunks.append(content)
+                        yield content
 
+            if cache_key is not None:
+                self.response_cache.put(cache_key, "".join(chunks))
             self._update_progress("Stream complete")
 
         except Exception as e:
+            error = e
             self._update_progress(f"Stream error: {str(e)}")
             raise
+        finally:
+            if not request_metrics.cached:
+                self._report_metrics(request_metrics, error)
+
+    async def async_prompt(
+        self,
+        prompt: str,
+        context: Optional[str] = None,
+        template: Optional[PromptTemplate] = None,
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+        response_format: ResponseFormat = ResponseFormat.TEXT,
+        priority: int = 0,
+        queue_timeout: Optional[float] = None,
+        **kwargs,
+    ) -> str:
+        """
+        Async variant of `prompt`. Waits for a free llama-server slot, lower
+        priority values are served first, and raises QueueTimeout if no slot
+        became free within the queue timeout.
+        """
+        template = (template or self.default_template).with_context(context)
+        model = model or self.default_model
+
+        formatted = template.format(prompt)
+
+        messages = [
+            {"role": "system", "content": formatted["system"]},
+            {"role": "user", "content": formatted["user"]},
+        ]
+
+        cache_key = self._cache_key(
+            template,
+            prompt,
+            model,
+            temperature,
+            max_tokens=max_tokens,
+            response_format=response_format.value,
+            **kwargs,
+        )
+        request_metrics = RequestMetrics(model)
+        if cache_key is not None:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                request_metrics.cached = True
+                self._report_metrics(request_metrics)
+                return cached
+
+        request_params = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            **kwargs,
+        }
+        if response_format == ResponseFormat.JSON:
+            request_params["response_format"] = {"type": "json_object"}
+
+        error = None
+        try:
+            async with self.scheduler.slot_async(
+                priority, queue_timeout or self.queue_timeout
+            ) as waited:
+                request_metrics.queue_wait = waited
+                result = await self._handle_standard_response_async(
+                    request_params, formatted.get("assistant_prefix"), request_metrics
+                )
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._report_metrics(request_metrics, error)
+
+        if cache_key is not None and result is not None:
+            self.response_cache.put(cache_key, result)
+        return result
+
+    async def async_prompt_stream(
+        self,
+        prompt: str,
+        context: Optional[str] = None,
+        template: Optional[PromptTemplate] = None,
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+        priority: int = 0,
+        queue_timeout: Optional[float] = None,
+        **kwargs,
+    ) -> AsyncIterator[str]:
+        template = (template or self.default_template).with_context(context)
+        model = model or self.default_model
+
+        formatted = template.format(prompt)
+
+        messages = [
+            {"role": "system", "content": formatted["system"]},
+            {"role": "user", "content": formatted["user"]},
+        ]
+
+        request_metrics = RequestMetrics(model, streamed=True)
+        kwargs.setdefault("stream_options", {"include_usage": True})
+        error = None
+        try:
+            async with self.scheduler.slot_async(
+                priority, queue_timeout or self.queue_timeout
+            ) as waited:
+                request_metrics.queue_wait = waited
+                stream = await self.breaker.call_async(
+                    self._async_client().chat.completions.create,
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    stream=True,
+                    **kwargs,
+                )
+
+                first_chunk = True
+                async for chunk in stream:
+                    request_metrics.usage(getattr(chunk, "usage", None))
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        content = chunk.choices[0].delta.content
+                        request_metrics.chunk()
+
+                        if first_chunk and formatted["assistant_prefix"]:
+                            content = f"{formatted['assistant_prefix']}{content}"
+                            first_chunk = False
+
+                        yield content
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._report_metrics(request_metrics, error)
+
+    async def async_prompt_many(
+        self,
+        prompts: List[str],
+        contexts: Optional[List[Optional[str]]] = None,
+        return_exceptions: bool = False,
+        **kwargs,
+    ) -> List[Any]:
+        contexts = contexts or [None] * len(prompts)
+        return await asyncio.gather(
+            *(
+                self.async_prompt(prompt, context=context, **kwargs)
+                for prompt, context in zip(prompts, contexts)
+            ),
+            return_exceptions=return_exceptions,
+        )
+
+    def prompt_many(
+        self,
+        prompts: List[str],
+        contexts: Optional[List[Optional[str]]] = None,
+        return_exceptions: bool = False,
+        **kwargs,
+    ) -> List[Any]:
+        """
+        Answers a batch of prompts concurrently, keeping every slot of the
+        llama-server busy without queueing more requests on it than it can
+        run in parallel. Must not be called from within a running event loop,
+        use `async_prompt_many` there.
+        """
+
+        async def prompt_and_close() -> List[Any]:
+            # the loop ends with this call, so does the client bound to it
+            try:
+                return await self.async_prompt_many(
+                    prompts, contexts, return_exceptions, **kwargs
+                )
+            finally:
+                await self.close_async_client()
+
+        return asyncio.run(prompt_and_close())
+
+    async def close_async_client(self):
+        """Closes the async client of the running event loop, if there is one."""
+        client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.close()
 
     def _handle_standard_response(
-        self, request_params: Dict[str, Any], assistant_prefix: Optional[str] = None
+        self,
+        request_params: Dict[str, Any],
+        assistant_prefix: Optional[str] = None,
+        request_metrics: Optional[RequestMetrics] = None,
     ) -> str:
         retries = 0
         while retries < self.max_retries:
             try:
                 self._update_progress(f"Waiting for response (attempt {retries + 1})")
 
-                response = self.llm_client.chat.completions.create(**request_params)
+                response = self._create_completion(request_params)
 
                 self._update_progress("Processing response")
+                if request_metrics is not None:
+                    request_metrics.retries = retries
+                    request_metrics.usage(getattr(response, "usage", None))
 
                 result = response.choices[0].message.content
 
@@ -198,27 +490,102 @@ class LargeLanguageModel:
 
                 return result
 
+            except CircuitOpen:
+                raise
             except Exception as e:
                 retries += 1
+                if request_metrics is not None:
+                    request_metrics.retries = retries
                 if retries >= self.max_retries:
                     raise e
-                time.sleep(2**retries)
+                time.sleep(backoff(retries))
+
+    async def _handle_standard_response_async(
+        self,
+        request_params: Dict[str, Any],
+        assistant_prefix: Optional[str] = None,
+        request_metrics: Optional[RequestMetrics] = None,
+    ) -> str:
+        retries = 0
+        while retries < self.max_retries:
+            try:
+                response = await self.breaker.call_async(
+                    self._async_client().chat.completions.create, **request_params
+                )
+                if request_metrics is not None:
+                    request_metrics.retries = retries
+                    request_metrics.usage(getattr(response, "usage", None))
+
+                result = response.choices[0].message.content
+
+                if assistant_prefix:
+                    result = f"{assistant_prefix}{result}"
+
+                return result
+
+            except CircuitOpen:
+                raise
+            except Exception as e:
+                retries += 1
+                if request_metrics is not None:
+                    request_metrics.retries = retries
+                if retries >= self.max_retries:
+                    raise e
+                await asyncio.sleep(backoff(retries))
+
+    def _async_client(self) -> AsyncOpenAI:
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = AsyncOpenAI(
+                base_url=f"{self.llm_service_endpoint}/v1",
+                api_key="not-needed",
+                timeout=self.timeout,
+            )
+            self._async_clients[loop] = client
+        return client
+
+    def _create_completion(self, request_params: Dict[str, Any]) -> Any:
+        create = self.llm_client.chat.completions.create
+        if self.hedger is None or request_params.get("stream"):
+            return self.breaker.call(create, **request_params)
+        return self.breaker.call(
+            self.hedger.call,
+            lambda: create(**request_params),
+            lambda: self._hedged_completion(request_params),
+        )
+
+    def _hedged_completion(self, request_params: Dict[str, Any]) -> Any:
+        # duplicates only use idle slots, they must not queue behind real work
+        if not self.scheduler.try_acquire():
+            raise QueueTimeout("No idle LLM slot for a hedged request")
+        try:
+            return self.llm_client.chat.completions.create(**request_params)
+        finally:
+            self.scheduler.release()
 
     def _handle_streaming_response(
-        self, request_params: Dict[str, Any], assistant_prefix: Optional[str] = None
+        self,
+        request_params: Dict[str, Any],
+        assistant_prefix: Optional[str] = None,
+        request_metrics: Optional[RequestMetrics] = None,
     ) -> str:
         self._update_progress("Starting stream")
 
-        stream = self.llm_client.chat.completions.create(**request_params)
+        stream = self._create_completion(request_params)
 
         result_chunks = []
         chunk_count = 0
 
         for chunk in stream:
-            if chunk.choices[0].delta.content:
+            if request_metrics is not None:
+                request_metrics.usage(getattr(chunk, "usage", None))
+            if chunk.choices and chunk.choices[0].delta.content:
                 content = chunk.choices[0].delta.content
                 result_chunks.append(content)
                 chunk_count += 1
+                if request_metrics is not None:
+                    request_metrics.chunk()
 
                 self._update_progress(f"Receiving stream (chunk {chunk_count})")
 
@@ -231,10 +598,54 @@ class LargeLanguageModel:
 
         return result
 
+    def _cache_key(
+        self,
+        template: PromptTemplate,
+        prompt: str,
+        model: str,
+        temperature: float,
+        **parameters,
+    ) -> Optional[str]:
+        if self.response_cache is None or not self.response_cache.cacheable(
+            temperature
+        ):
+            return None
+        return self.response_cache.key(
+            model,
+            template.system,
+            template.context,
+            prompt,
+            {
+                "temperature": temperature,
+                "user_prefix": template.user_prefix,
+                "user_suffix": template.user_suffix,
+                "assistant_prefix": template.assistant_prefix,
+                **parameters,
+            },
+        )
+
     def _update_progress(self, status: str, progress: Optional[float] = None):
         if self.progress_callback:
             self.progress_callback(status, progress)
 
+    def _report_metrics(
+        self, request_metrics: RequestMetrics, error: Optional[Exception] = None
+    ):
+        request_metrics.finish(error)
+        request_metrics.record()
+        if self.metrics_callback:
+            self.metrics_callback(request_metrics)
+
+    def count_tokens(self, text: str) -> int:
+        """Exact token count from the llama-server tokenizer."""
+        request = urllib.request.Request(
+            f"{self.llm_service_endpoint}/tokenize",
+            data=json.dumps({"content": text}).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return len(json.load(response)["tokens"])
+
     def health_check(self) -> bool:
         try:
             self.llm_client.models.list()
@@ -0,0 +1,91 @@
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Optional
+
+from utils import metrics
+
+
+@dataclass
+class RequestMetrics:
+    """
+    Timings and token counts of one LLM request. Latencies are in seconds
+    and measured from the moment the request was made, so queue wait is
+    part of the time to first token and of the total latency.
+    """
+
+    model: str
+    streamed: bool = False
+    cached: bool = False
+    queue_wait: float = 0.0
+    time_to_first_token: Optional[float] = None
+    latency: Optional[float] = None
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    chunks: int = 0
+    retries: int = 0
+    error: Optional[str] = None
+    started: float = field(default_factory=time.perf_counter, repr=False)
+
+    @property
+    def tokens_per_second(self) -> Optional[float]:
+        """Decode speed, the time until the first token is prefill."""
+        tokens = self.completion_tokens or self.chunks
+        if not tokens or self.latency is None:
+            return None
+        if self.time_to_first_token is None:
+            # without streaming prefill cannot be told apart from decoding
+            generating = self.latency - self.queue_wait
+        else:
+            # the first token was produced by the prefill
+            tokens -= 1
+            generating = self.latency - self.time_to_first_token
+        return tokens / generating if tokens and generating > 0 else None
+
+    def first_token(self):
+        if self.time_to_first_token is None:
+            self.time_to_first_token = time.perf_counter() - self.started
+
+    def chunk(self):
+        self.first_token()
+        self.chunks += 1
+
+    def usage(self, usage: Any):
+        """Takes the token counts from an OpenAI usage object, if any."""
+        if usage is None:
+            return
+        self.prompt_tokens = getattr(usage, "prompt_tokens", self.prompt_tokens)
+        self.completion_tokens = getattr(
+            usage, "completion_tokens", self.completion_tokens
+        )
+
+    def finish(self, error: Optional[Exception] = None):
+        self.latency = time.perf_counter() - self.started
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+
+    def record(self):
+        """Adds the request to the shared metrics registry."""
+        metrics.increment("llm.requests")
+        if self.cached:
+            metrics.increment("llm.cached_requests")
+            return
+        if self.error is not None:
+            metrics.increment("llm.errors")
+        metrics.increment("llm.retries", self.retries)
+        metrics.observe("llm.queue_wait", self.queue_wait)
+        if self.latency is not None:
+            metrics.observe("llm.latency", self.latency)
+        if self.time_to_first_token is not None:
+            metrics.observe("llm.time_to_first_token", self.time_to_first_token)
+        if self.tokens_per_second is not None:
+            metrics.observe("llm.tokens_per_second", self.tokens_per_second)
+        if self.prompt_tokens is not None:
+            metrics.increment("llm.prompt_tokens", self.prompt_tokens)
+        if self.completion_tokens is not None:
+            metrics.increment("llm.completion_tokens", self.completion_tokens)
+
+    def as_dict(self) -> Dict[str, Any]:
+        values = asdict(self)
+        values.pop("started")
+        values["tokens_per_second"] = self.tokens_per_second
+        return values
@@ -0,0 +1,118 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Optional
+
+from utils import LRUCache, metrics
+
+
+class ResponseCache:
+    """
+    Cache of LLM responses keyed by a hash of model, system prompt, context,
+    prompt and sampling parameters. Responses are kept in memory within an
+    entry and a byte limit and, if a path is given, in a sqlite file so they
+    survive restarts. Sampling above max_temperature is not cached as the
+    caller asked for varied answers.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 2048,
+        max_bytes: int = 16 * 1024 * 1024,
+        normalize: bool = False,
+        max_temperature: float = 0.7,
+        persist_path: Optional[str] = None,
+    ):
+        self.normalize = normalize
+        self.max_temperature = max_temperature
+        self.__memory: LRUCache[str, str] = LRUCache(
+            maxsize=max_entries,
+            max_weight=max_bytes,
+            weigh=lambda response: len(response.encode("utf-8")),
+        )
+        self.__lock = threading.Lock()
+        self.__db: Optional[sqlite3.Connection] = None
+        if persist_path:
+            self.__db = sqlite3.connect(persist_path, check_same_thread=False)
+            self.__db.execute(
+                "CREATE TABLE IF NOT EXISTS responses "
+                "(key TEXT PRIMARY KEY, response TEXT, created REAL)"
+            )
+            self.__db.commit()
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+
+    def cacheable(self, temperature: float) -> bool:
+        if temperature > self.max_temperature:
+            self.skipped += 1
+            metrics.increment("llm_cache.skipped")
+            return False
+        return True
+
+    def key(
+        self,
+        model: str,
+        system: str,
+        context: str,
+        prompt: str,
+        parameters: dict[str, Any],
+    ) -> str:
+        texts = [system or "", context or "", prompt or ""]
+        if self.normalize:
+            texts = [self.__normalize(text) for text in texts]
+        payload = json.dumps(
+            [model, *texts, parameters], sort_keys=True, default=str
+        ).encode("utf-8")
+        return hashlib.sha256(payload).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        response = self.__memory.get(key)
+        if response is None and self.__db is not None:
+            with self.__lock:
+                row = self.__db.execute(
+                    "SELECT response FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+            if row is not None:
+                response = row[0]
+                self.__memory.put(key, response)
+
+        if response is None:
+            self.misses += 1
+            metrics.increment("llm_cache.misses")
+        else:
+            self.hits += 1
+            metrics.increment("llm_cache.hits")
+        return response
+
+    def put(self, key: str, response: str):
+        self.__memory.put(key, response)
+        if self.__db is not None:
+            with self.__lock:
+                self.__db.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?)",
+                    (key, response, time.time()),
+                )
+                self.__db.commit()
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "skipped": self.skipped,
+            "hit_rate": self.hit_rate,
+            "entries": len(self.__memory),
+            "bytes": self.__memory.weight,
+        }
+
+    @staticmethod
+    def __normalize(text: str) -> str:
+        return re.sub(r"\s+", " ", text).strip().casefold()
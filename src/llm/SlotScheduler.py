@@ -0,0 +1,146 @@
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Iterator, Optional
+
+
+class QueueTimeout(TimeoutError):
+    pass
+
+
+class _Waiter:
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.granted = False
+        self.cancelled = False
+        self.loop = loop
+        self.event = threading.Event() if loop is None else None
+        self.future = loop.create_future() if loop is not None else None
+
+    def wake(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self.__resolve)
+
+    def __resolve(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class SlotScheduler:
+    """
+    Hands out a fixed number of slots, matching the parallel slots of the
+    llama-server, to threads and asyncio tasks alike. Waiting requests are
+    served by priority (lower first) and in arrival order within a priority,
+    a timeout bounds how long a request may wait in the queue.
+    """
+
+    def __init__(self, slots: int = 3):
+        self.slots = slots
+        self.__available = slots
+        self.__queue: list[tuple[int, int, _Waiter]] = []
+        self.__sequence = itertools.count()
+        self.__lock = threading.Lock()
+
+    @property
+    def in_flight(self) -> int:
+        return self.slots - self.__available
+
+    @property
+    def queued(self) -> int:
+        with self.__lock:
+            return sum(1 for _, _, waiter in self.__queue if not waiter.cancelled)
+
+    def acquire(self, priority: int = 0, timeout: Optional[float] = None) -> float:
+        """Blocks until a slot is free and returns the time spent waiting."""
+        start = time.perf_counter()
+        waiter = self.__try_acquire(priority)
+        if waiter is None:
+            return 0.0
+        if not waiter.event.wait(timeout):
+            self.__cancel(waiter)
+        return time.perf_counter() - start
+
+    async def acquire_async(
+        self, priority: int = 0, timeout: Optional[float] = None
+    ) -> float:
+        start = time.perf_counter()
+        waiter = self.__try_acquire(priority, asyncio.get_running_loop())
+        if waiter is None:
+            return 0.0
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+        except asyncio.TimeoutError:
+            self.__cancel(waiter)
+        except asyncio.CancelledError:
+            # a slot granted while the task was being cancelled is handed on
+            if self.__cancel(waiter, raise_timeout=False):
+                self.release()
+            raise
+        return time.perf_counter() - start
+
+    def try_acquire(self) -> bool:
+        """Takes a slot only if one is free right now."""
+        with self.__lock:
+            if self.__available > 0:
+                self.__available -= 1
+                return True
+            return False
+
+    def release(self):
+        with self.__lock:
+            while self.__queue:
+                _, _, waiter = heapq.heappop(self.__queue)
+                if not waiter.cancelled:
+                    waiter.granted = True
+                    waiter.wake()
+                    return
+            self.__available += 1
+
+    @contextmanager
+    def slot(
+        self, priority: int = 0, timeout: Optional[float] = None
+    ) -> Iterator[float]:
+        waited = self.acquire(priority, timeout)
+        try:
+            yield waited
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def slot_async(
+        self, priority: int = 0, timeout: Optional[float] = None
+    ) -> AsyncIterator[float]:
+        waited = await self.acquire_async(priority, timeout)
+        try:
+            yield waited
+        finally:
+            self.release()
+
+    def __try_acquire(
+        self, priority: int, loop: Optional[asyncio.AbstractEventLoop] = None
+    ) -> Optional[_Waiter]:
+        with self.__lock:
+            # slots are only free while nobody waits, release hands them over
+            if self.__available > 0:
+                self.__available -= 1
+                return None
+            waiter = _Waiter(loop)
+            heapq.heappush(self.__queue, (priority, next(self.__sequence), waiter))
+            return waiter
+
+    def __cancel(self, waiter: _Waiter, raise_timeout: bool = True) -> bool:
+        """
+        Withdraws a waiting request. Returns True if the slot was granted in
+        the meantime, in which case the caller owns it.
+        """
+        with self.__lock:
+            if waiter.granted:
+                return True
+            waiter.cancelled = True
+        if raise_timeout:
+            raise QueueTimeout("No LLM slot became free in time")
+        return False
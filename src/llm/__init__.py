@@ -1,3 +1,15 @@
+from .ContextBuilder import ContextBuilder
 from .LargeLanguageModel import LargeLanguageModel, PromptTemplate
+from .RequestMetrics import RequestMetrics
+from .ResponseCache import ResponseCache
+from .SlotScheduler import QueueTimeout, SlotScheduler
 
-__all__ = ["LargeLanguageModel", "PromptTemplate"]
+__all__ = [
+    "ContextBuilder",
+    "LargeLanguageModel",
+    "PromptTemplate",
+    "QueueTimeout",
+    "RequestMetrics",
+    "ResponseCache",
+    "SlotScheduler",
+]
@@ -4,11 +4,20 @@ from dotenv import load_dotenv
 from speakeasypy import Speakeasy
 
 from agent import Agentv3 as Agent
+from core import QueryLog
+from utils import SlowMessageProfiler
 
 if __name__ == "__main__":
     load_dotenv()
 
-    SPARQL_ENDPOINT = "http://localhost:3030/atai/sparql"
+    # comma separated SPARQL_ENDPOINTS are used as equivalent read replicas
+    SPARQL_ENDPOINTS = [
+        url.strip()
+        for url in os.getenv(
+            "SPARQL_ENDPOINTS", "http://localhost:3030/atai/sparql"
+        ).split(",")
+        if url.strip()
+    ]
 
     speakeasy = Speakeasy(
         host="https://speakeasy.ifi.uzh.ch",
@@ -16,5 +25,40 @@ if __name__ == "__main__":
         password=os.getenv("SPEAKEASY_PASSWORD", ""),
     )
 
-    agent = Agent(speakeasy=speakeasy, sparql_endpoint=SPARQL_ENDPOINT)
+    # opt-in: PROFILE_SLOW_MESSAGES=<seconds> keeps profiles of slower messages
+    profiler = None
+    if os.getenv("PROFILE_SLOW_MESSAGES"):
+        profiler = SlowMessageProfiler(
+            output_dir=os.getenv("PROFILE_OUTPUT_DIR", "profiles"),
+            threshold=float(os.getenv("PROFILE_SLOW_MESSAGES")),
+            trace_allocations=os.getenv("PROFILE_ALLOCATIONS", "") == "1",
+        )
+
+    # opt-in: QUERY_LOG=<path> records what is asked and prefetches it
+    query_log = None
+    if os.getenv("QUERY_LOG"):
+        query_log = QueryLog.load(os.getenv("QUERY_LOG"))
+
+    # opt-in: RECOMMENDATION_BATCH_WINDOW=<ms> scores concurrent requests together
+    batch_window = None
+    if os.getenv("RECOMMENDATION_BATCH_WINDOW"):
+        batch_window = float(os.getenv("RECOMMENDATION_BATCH_WINDOW")) / 1000
+
+    # opt-in: RECOMMENDATION_MAX_MATCHES=<n> reads at most n movies per shared value
+    max_matches_per_value = None
+    if os.getenv("RECOMMENDATION_MAX_MATCHES"):
+        max_matches_per_value = int(os.getenv("RECOMMENDATION_MAX_MATCHES"))
+
+    agent = Agent(
+        speakeasy=speakeasy,
+        sparql_endpoint=SPARQL_ENDPOINTS,
+        profiler=profiler,
+        query_log=query_log,
+        prefetch_interval=float(os.getenv("PREFETCH_INTERVAL", "600")),
+        batch_window=batch_window,
+        max_matches_per_value=max_matches_per_value,
+    )
+    # opt-in: GRAPH_DELTA_DIR=<dir> applies N-Triples deltas dropped there
+    if os.getenv("GRAPH_DELTA_DIR"):
+        agent.watch_deltas(os.getenv("GRAPH_DELTA_DIR"))
     agent.run()
@@ -0,0 +1,62 @@
+import math
+import time
+
+from .Metrics import metrics
+
+
+class DeadlineExceeded(TimeoutError):
+    """
+    A call was cut short because the budget of the message ran out, which
+    says nothing about the health of the backend.
+    """
+
+
+class Deadline:
+    """
+    Time budget of a single message. Stages ask whether the budget is
+    running low to skip expensive work and record what they skipped.
+    """
+
+    def __init__(self, budget: float, reserve: float = 0.25):
+        self.__budget = budget
+        self.__expires_at = time.monotonic() + budget
+        self.__reserve = budget * reserve
+        self.__degradations: list[str] = []
+
+    @property
+    def budget(self) -> float:
+        return self.__budget
+
+    @property
+    def remaining(self) -> float:
+        return max(self.__expires_at - time.monotonic(), 0.0)
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining <= 0
+
+    @property
+    def running_low(self) -> bool:
+        return self.remaining < self.__reserve
+
+    @property
+    def degradations(self) -> list[str]:
+        return list(self.__degradations)
+
+    def degrade(self, stage: str):
+        if stage not in self.__degradations:
+            self.__degradations.append(stage)
+        metrics.increment(f"degradation.{stage}")
+
+    def merge(self, other: "Deadline"):
+        """Takes over what was degraded under `other`, counted there already."""
+        for stage in other.degradations:
+            if stage not in self.__degradations:
+                self.__degradations.append(stage)
+
+    def timeout(self, maximum: float | None = None) -> int:
+        """Whole seconds left, at least one, usable as a socket timeout."""
+        remaining = self.remaining
+        if maximum is not None:
+            remaining = min(remaining, maximum)
+        return max(1, math.ceil(remaining))
@@ -0,0 +1,134 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Generic, Hashable, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class LRUCache(Generic[K, V]):
+    """
+    Thread-safe LRU cache. With a ttl, entries that were not accessed for
+    that many seconds expire as well. With max_weight and a weigh function,
+    e.g. the size in bytes, the summed weight of all entries is bounded too.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        ttl: float | None = None,
+        max_weight: int | None = None,
+        weigh: Callable[[V], int] | None = None,
+    ):
+        self.__maxsize = maxsize
+        self.__ttl = ttl
+        self.__max_weight = max_weight
+        self.__weigh = weigh
+        self.__weight = 0
+        self.__data: OrderedDict[K, tuple[V, float, int]] = OrderedDict()
+        self.__lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.__data)
+
+    def __contains__(self, key: K) -> bool:
+        with self.__lock:
+            item = self.__data.get(key)
+            return item is not None and not self.__is_expired(item[1])
+
+    def get(self, key: K, default: V | None = None) -> V | None:
+        with self.__lock:
+            value = self.__get(key)
+            if value is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return value
+
+    def get_or_create(self, key: K, factory: Callable[[], V]) -> V:
+        with self.__lock:
+            value = self.__get(key)
+            if value is None:
+                value = factory()
+                self.__put(key, value)
+            return value
+
+    def put(self, key: K, value: V):
+        with self.__lock:
+            self.__put(key, value)
+
+    def pop(self, key: K, default: V | None = None) -> V | None:
+        with self.__lock:
+            if key not in self.__data:
+                return default
+            return self.__remove(key)
+
+    def invalidate(self, predicate: Callable[[K], bool]) -> int:
+        with self.__lock:
+            keys = [key for key in self.__data if predicate(key)]
+            for key in keys:
+                self.__remove(key)
+            return len(keys)
+
+    def clear(self):
+        with self.__lock:
+            self.__data.clear()
+            self.__weight = 0
+
+    @property
+    def weight(self) -> int:
+        return self.__weight
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "size": len(self.__data),
+            "weight": self.__weight,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate,
+        }
+
+    def __get(self, key: K) -> V | None:
+        item = self.__data.get(key)
+        if item is None:
+            return None
+        value, last_access, weight = item
+        if self.__is_expired(last_access):
+            self.__remove(key)
+            return None
+        if self.__ttl is not None:
+            self.__data[key] = (value, time.monotonic(), weight)
+        self.__data.move_to_end(key)
+        return value
+
+    def __put(self, key: K, value: V):
+        if key in self.__data:
+            self.__remove(key)
+        weight = self.__weigh(value) if self.__weigh else 0
+        self.__data[key] = (value, time.monotonic() if self.__ttl else 0.0, weight)
+        self.__weight += weight
+        while len(self.__data) > self.__maxsize or (
+            self.__max_weight is not None
+            and self.__weight > self.__max_weight
+            and len(self.__data) > 1
+        ):
+            self.__remove(next(iter(self.__data)))
+        # least recently used entries come first, so expired ones do as well
+        while self.__data and self.__is_expired(next(iter(self.__data.values()))[1]):
+            self.__remove(next(iter(self.__data)))
+
+    def __remove(self, key: K) -> V:
+        value, _, weight = self.__data.pop(key)
+        self.__weight -= weight
+        return value
+
+    def __is_expired(self, last_access: float) -> bool:
+        return self.__ttl is not None and time.monotonic() - last_access > self.__ttl
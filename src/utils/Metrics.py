@@ -0,0 +1,74 @@
+import statistics
+import threading
+from collections import defaultdict, deque
+
+
+class Metrics:
+    """
+    Thread-safe registry of counters and latency observations. Observations
+    keep a bounded window of recent samples for percentiles next to an
+    exact count and sum.
+    """
+
+    def __init__(self, window: int = 1024):
+        self.__lock = threading.Lock()
+        self.__counters: dict[str, float] = defaultdict(float)
+        self.__samples: dict[str, deque[float]] = defaultdict(
+            lambda: deque(maxlen=window)
+        )
+        self.__counts: dict[str, int] = defaultdict(int)
+        self.__sums: dict[str, float] = defaultdict(float)
+
+    def increment(self, name: str, value: float = 1):
+        with self.__lock:
+            self.__counters[name] += value
+
+    def observe(self, name: str, value: float):
+        with self.__lock:
+            self.__samples[name].append(value)
+            self.__counts[name] += 1
+            self.__sums[name] += value
+
+    def counter(self, name: str) -> float:
+        with self.__lock:
+            return self.__counters.get(name, 0)
+
+    def summary(self, name: str) -> dict[str, float]:
+        with self.__lock:
+            samples = sorted(self.__samples.get(name, ()))
+            count = self.__counts.get(name, 0)
+            total = self.__sums.get(name, 0.0)
+        if not samples:
+            return {"count": 0}
+        return {
+            "count": count,
+            "mean": total / count,
+            "p50": self.percentile(samples, 50),
+            "p95": self.percentile(samples, 95),
+            "p99": self.percentile(samples, 99),
+            "max": samples[-1],
+        }
+
+    def snapshot(self) -> dict[str, dict[str, float] | float]:
+        with self.__lock:
+            counters = dict(self.__counters)
+            names = list(self.__samples.keys())
+        return {**counters, **{name: self.summary(name) for name in names}}
+
+    def reset(self):
+        with self.__lock:
+            self.__counters.clear()
+            self.__samples.clear()
+            self.__counts.clear()
+            self.__sums.clear()
+
+    @staticmethod
+    def percentile(sorted_samples: list[float], percent: float) -> float:
+        if len(sorted_samples) == 1:
+            return sorted_samples[0]
+        return statistics.quantiles(sorted_samples, n=100, method="inclusive")[
+            min(max(int(percent) - 1, 0), 98)
+        ]
+
+
+metrics = Metrics()
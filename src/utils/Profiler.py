@@ -0,0 +1,164 @@
+import itertools
+import json
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from types import CodeType, FrameType
+from typing import Iterator
+
+from .Metrics import metrics
+
+
+class ProfiledMessage:
+    def __init__(self, text: str, thread_id: int, room_id: str = ""):
+        self.text = text
+        self.thread_id = thread_id
+        self.room_id = room_id
+        # most messages profiled at the same time while this one ran
+        self.concurrent = 1
+        self.entities: list[str] = []
+        self.samples: Counter[str] = Counter()
+        self.started = time.perf_counter()
+        self.duration = 0.0
+
+
+class SlowMessageProfiler:
+    """
+    Samples the stacks of threads handling a message at a fixed interval and
+    writes them as collapsed stacks (input of flamegraph.pl or speedscope)
+    when handling took longer than the threshold. A single sampler thread is
+    shared by all messages and sleeps while nothing is profiled.
+
+    Allocation tracing is opt-in since tracemalloc slows down every
+    allocation, only a one frame traceback is kept to limit its cost.
+    tracemalloc sees the whole process, so the peak and top allocations
+    reported for a message include those of messages handled at the same
+    time, the report says how many there were.
+    """
+
+    def __init__(
+        self,
+        output_dir: str = "profiles",
+        threshold: float = 5.0,
+        interval: float = 0.005,
+        trace_allocations: bool = False,
+    ):
+        self.output_dir = output_dir
+        self.threshold = threshold
+        self.interval = interval
+        self.trace_allocations = trace_allocations
+        self.__active: dict[int, list[ProfiledMessage]] = {}
+        self.__lock = threading.Lock()
+        self.__wakeup = threading.Event()
+        self.__code_names: dict[CodeType, str] = {}
+        self.__written = itertools.count(1)
+        self.__sampler = threading.Thread(
+            target=self.__sample_forever, name="message-profiler", daemon=True
+        )
+        self.__sampler.start()
+        if trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start(1)
+
+    @contextmanager
+    def profile(self, text: str, room_id: str = "") -> Iterator[ProfiledMessage]:
+        profiled = ProfiledMessage(text, threading.get_ident(), room_id)
+        if self.trace_allocations:
+            tracemalloc.reset_peak()
+        with self.__lock:
+            self.__active.setdefault(profiled.thread_id, []).append(profiled)
+            active = [p for profiles in self.__active.values() for p in profiles]
+            for other in active:
+                other.concurrent = max(other.concurrent, len(active))
+        self.__wakeup.set()
+        try:
+            yield profiled
+        finally:
+            profiled.duration = time.perf_counter() - profiled.started
+            with self.__lock:
+                profiles = self.__active[profiled.thread_id]
+                profiles.remove(profiled)
+                if not profiles:
+                    del self.__active[profiled.thread_id]
+                if not self.__active:
+                    self.__wakeup.clear()
+            if profiled.duration >= self.threshold:
+                self.__write(profiled)
+
+    def __sample_forever(self):
+        while True:
+            self.__wakeup.wait()
+            time.sleep(self.interval)
+            with self.__lock:
+                active = {tid: list(p) for tid, p in self.__active.items()}
+            frames = sys._current_frames()
+            for thread_id, profiles in active.items():
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                stack = self.__collapse(frame)
+                for profiled in profiles:
+                    profiled.samples[stack] += 1
+
+    def __collapse(self, frame: FrameType | None) -> str:
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            name = self.__code_names.get(code)
+            if name is None:
+                name = (
+                    f"{code.co_name} "
+                    f"({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                )
+                self.__code_names[code] = name
+            names.append(name)
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def __write(self, profiled: ProfiledMessage):
+        os.makedirs(self.output_dir, exist_ok=True)
+        # the counter keeps messages of the same second and duration apart
+        room = re.sub(r"[^\w-]", "_", profiled.room_id)
+        base = os.path.join(
+            self.output_dir,
+            f"{time.strftime('%Y%m%d-%H%M%S')}-{int(profiled.duration * 1000)}ms"
+            f"{f'-{room}' if room else ''}-{next(self.__written)}",
+        )
+        with open(f"{base}.collapsed", "w") as f:
+            for stack, count in profiled.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+        summary = {
+            "message": profiled.text,
+            "entities": profiled.entities,
+            "duration": profiled.duration,
+            "samples": sum(profiled.samples.values()),
+            "interval": self.interval,
+            "concurrent_messages": profiled.concurrent,
+        }
+        if self.trace_allocations and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            statistics = tracemalloc.take_snapshot().statistics("lineno")[:25]
+            summary["allocations"] = {
+                # of the whole process, not only of this message
+                "scope": "process",
+                "current": current,
+                "peak": peak,
+                "top": [
+                    {
+                        "location": str(stat.traceback),
+                        "size": stat.size,
+                        "count": stat.count,
+                    }
+                    for stat in statistics
+                ],
+            }
+        with open(f"{base}.json", "w") as f:
+            json.dump(summary, f, indent=2)
+
+        metrics.increment("profiler.slow_messages")
+        print(f"Slow message ({profiled.duration:.1f}s) profiled to {base}.collapsed")
@@ -0,0 +1,236 @@
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Awaitable, Callable, TypeVar
+
+from .Metrics import Metrics, metrics
+
+T = TypeVar("T")
+
+
+class CircuitOpen(RuntimeError):
+    pass
+
+
+def backoff(attempt: int, base: float = 1.0, cap: float = 30.0) -> float:
+    """
+    Sleep before retry number `attempt`, drawn uniformly below the
+    exponential `base * 2**attempt` (full jitter), so callers that failed
+    together do not retry together.
+    """
+    return random.uniform(0, min(cap, base * 2**attempt))
+
+
+class CircuitBreaker:
+    """
+    Stops calling a backend after `failure_threshold` consecutive failures.
+    While open, calls fail immediately with CircuitOpen so callers can fall
+    back to cached or degraded answers instead of waiting for timeouts.
+    After `reset_timeout` seconds a single trial call is let through
+    (half-open), its outcome closes the circuit or opens it again.
+
+    Exceptions listed in `excluded` are the caller's fault, such as a
+    malformed query, and do not count as backend failures. Those listed in
+    `ignored`, such as a call the caller's deadline cut short, count as
+    neither failure nor success.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        excluded: tuple[type[BaseException], ...] = (),
+        ignored: tuple[type[BaseException], ...] = (),
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.excluded = excluded
+        self.ignored = ignored
+        self.__state = self.CLOSED
+        self.__failures = 0
+        self.__opened_at = 0.0
+        self.__trial_running = False
+        self.__lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self.__lock:
+            if (
+                self.__state == self.OPEN
+                and time.monotonic() - self.__opened_at >= self.reset_timeout
+            ):
+                return self.HALF_OPEN
+            return self.__state
+
+    def allow(self) -> bool:
+        with self.__lock:
+            if self.__state == self.CLOSED:
+                return True
+            if time.monotonic() - self.__opened_at < self.reset_timeout:
+                metrics.increment(f"circuit.{self.name}.rejected")
+                return False
+            if self.__trial_running:
+                metrics.increment(f"circuit.{self.name}.rejected")
+                return False
+            self.__state = self.HALF_OPEN
+            self.__trial_running = True
+            return True
+
+    def record_success(self):
+        with self.__lock:
+            if self.__state != self.CLOSED:
+                print(f"Circuit {self.name} closed")
+            self.__state = self.CLOSED
+            self.__failures = 0
+            self.__trial_running = False
+
+    def record_failure(self):
+        with self.__lock:
+            self.__failures += 1
+            self.__trial_running = False
+            if (
+                self.__state == self.HALF_OPEN
+                or self.__failures >= self.failure_threshold
+            ):
+                if self.__state != self.OPEN:
+                    print(f"Circuit {self.name} opened")
+                    metrics.increment(f"circuit.{self.name}.opened")
+                self.__state = self.OPEN
+                self.__opened_at = time.monotonic()
+
+    def __release_trial(self):
+        with self.__lock:
+            self.__trial_running = False
+
+    def call(self, func: Callable[..., T], *args, **kwargs) -> T:
+        if not self.allow():
+            raise CircuitOpen(f"{self.name} is unavailable")
+        try:
+            result = func(*args, **kwargs)
+        except self.excluded:
+            self.record_success()
+            raise
+        except self.ignored:
+            self.__release_trial()
+            raise
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
+
+    async def call_async(self, func: Callable[..., Awaitable[T]], *args, **kwargs) -> T:
+        # already loaded when there is a coroutine to await, the graph only
+        # needs the synchronous breaker and starts without asyncio
+        import asyncio
+
+        if not self.allow():
+            raise CircuitOpen(f"{self.name} is unavailable")
+        try:
+            result = await func(*args, **kwargs)
+        except self.excluded:
+            self.record_success()
+            raise
+        except (asyncio.CancelledError, *self.ignored):
+            # the caller gave up, that says nothing about the backend
+            self.__release_trial()
+            raise
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
+
+
+class Hedger:
+    """
+    Sends a duplicate of a slow request once the first one has taken longer
+    than the given percentile of recent latencies and returns whichever
+    answer arrives first. The slower request is not cancelled, its result is
+    dropped. Until `min_samples` latencies are known requests run unhedged
+    in the calling thread. Duplicates run on a pool of their own, so first
+    requests never queue behind them, and are not sent while all
+    `max_hedges` workers are busy.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        percentile: float = 95,
+        min_delay: float = 0.05,
+        min_samples: int = 20,
+        window: int = 256,
+        max_workers: int = 8,
+        max_hedges: int = 4,
+    ):
+        self.name = name
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.__latencies: deque[float] = deque(maxlen=window)
+        self.__lock = threading.Lock()
+        self.__executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=f"request-{name}"
+        )
+        self.__hedges = ThreadPoolExecutor(
+            max_workers=max_hedges, thread_name_prefix=f"hedge-{name}"
+        )
+        self.__idle_hedges = threading.Semaphore(max_hedges)
+
+    @property
+    def delay(self) -> float | None:
+        with self.__lock:
+            if len(self.__latencies) < self.min_samples:
+                return None
+            samples = sorted(self.__latencies)
+        return max(self.min_delay, Metrics.percentile(samples, self.percentile))
+
+    def observe(self, latency: float):
+        with self.__lock:
+            self.__latencies.append(latency)
+
+    def call(self, func: Callable[[], T], hedge: Callable[[], T] | None = None) -> T:
+        """
+        Runs `func`, and `hedge` (or `func` again) if it is slow. If one of
+        them fails the other one is awaited, the first error is raised when
+        both fail.
+        """
+        delay = self.delay
+        if delay is None:
+            return self.__timed(func)
+
+        primary = self.__executor.submit(self.__timed, func)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+
+        if not self.__idle_hedges.acquire(blocking=False):
+            # a queued duplicate would only add load, not cut latency
+            metrics.increment(f"hedge.{self.name}.skipped")
+            return primary.result()
+        metrics.increment(f"hedge.{self.name}.sent")
+        secondary = self.__hedges.submit(hedge or func)
+        secondary.add_done_callback(lambda _: self.__idle_hedges.release())
+        pending: set[Future] = {primary, secondary}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is secondary:
+                        metrics.increment(f"hedge.{self.name}.won")
+                    return future.result()
+        return primary.result()
+
+    def __timed(self, func: Callable[[], T]) -> T:
+        start = time.perf_counter()
+        result = func()
+        self.observe(time.perf_counter() - start)
+        return result
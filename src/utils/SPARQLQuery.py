@@ -25,13 +25,24 @@ class SPARQLQuery:
         self.graph = graph
         self.query = query
 
-    def query_and_convert(self) -> dict[str, list[BindingDict]]:
+    def query_and_convert(
+        self, timeout: int | None = None
+    ) -> dict[str, list[BindingDict]]:
         """
         Executes the SPARQL query and converts the result to a dictionary
         with the variable name as keys and lists of corresponding values.
+        A timeout in seconds aborts the request if the endpoint is too slow.
         """
         self.graph.setQuery(self.query)
-        response = SPARQLResponse(self.graph.query().convert())
+        if timeout is None:
+            response = SPARQLResponse(self.graph.query().convert())
+        else:
+            previous_timeout = getattr(self.graph, "timeout", None)
+            self.graph.setTimeout(timeout)
+            try:
+                response = SPARQLResponse(self.graph.query().convert())
+            finally:
+                self.graph.timeout = previous_timeout
         return {
             var: [binding[var] for binding in response["results"]["bindings"]]
             for var in response["head"]["vars"]
@@ -0,0 +1,83 @@
+import threading
+import time
+from typing import Callable, Generic, Hashable, TypeVar
+
+from .Metrics import metrics
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class _Call(Generic[V]):
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: V | None = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight(Generic[K, V]):
+    """
+    Coalesces concurrent calls for the same key: the first caller runs the
+    function, callers arriving while it runs wait for and share its result
+    or its exception. Exceptions of the `retried` types say something about
+    the leader's own call only, like its deadline, waiting callers then run
+    the call again themselves. Nothing is kept once the call is done,
+    caching is left to the caller.
+    """
+
+    def __init__(self, name: str, retried: tuple[type[BaseException], ...] = ()):
+        self.name = name
+        self.retried = retried
+        self.__calls: dict[K, _Call[V]] = {}
+        self.__lock = threading.Lock()
+        self.executed = 0
+        self.coalesced = 0
+
+    @property
+    def in_flight(self) -> int:
+        with self.__lock:
+            return len(self.__calls)
+
+    def do(self, key: K, func: Callable[[], V], timeout: float | None = None) -> V:
+        """
+        Returns the result of `func`, or of the running call for `key`.
+        A waiting caller gives up with TimeoutError after `timeout` seconds,
+        the running call is not affected by that. If the running call fails
+        with a `retried` exception, the caller runs `func` itself.
+        """
+        expires = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            with self.__lock:
+                call = self.__calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self.__calls[key] = _Call()
+                    self.executed += 1
+                else:
+                    self.coalesced += 1
+            if leader:
+                break
+
+            metrics.increment(f"singleflight.{self.name}.coalesced")
+            remaining = (
+                max(expires - time.monotonic(), 0.0) if expires is not None else None
+            )
+            if not call.done.wait(remaining):
+                raise TimeoutError(f"Waited {timeout}s for a running {self.name} call")
+            if isinstance(call.error, self.retried):
+                metrics.increment(f"singleflight.{self.name}.retried")
+                continue
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.__lock:
+                del self.__calls[key]
+            call.done.set()
@@ -1,3 +1,9 @@
+from .Deadline import Deadline, DeadlineExceeded
+from .LRUCache import LRUCache
+from .Metrics import Metrics, metrics
+from .Profiler import ProfiledMessage, SlowMessageProfiler
+from .Resilience import CircuitBreaker, CircuitOpen, Hedger, backoff
+from .SingleFlight import SingleFlight
 from .SPARQLQuery import (
     BindingDict,
     HeadDict,
@@ -9,9 +15,21 @@ from .utility_functions import get_common_values
 
 __all__ = [
     "BindingDict",
+    "CircuitBreaker",
+    "CircuitOpen",
+    "Deadline",
+    "DeadlineExceeded",
     "HeadDict",
+    "Hedger",
+    "LRUCache",
+    "Metrics",
+    "ProfiledMessage",
     "SPARQLQuery",
     "SPARQLResponse",
     "SPARQLResults",
+    "SingleFlight",
+    "SlowMessageProfiler",
+    "backoff",
     "get_common_values",
+    "metrics",
 ]
@@ -0,0 +1,31 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# the packages are imported from src, like when running src/main.py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from benchmarks import LocalSPARQLWrapper, SyntheticGraph  # noqa: E402
+from core import Entity, KnowledgeGraph  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def synthetic() -> SyntheticGraph:
+    return SyntheticGraph(num_entities=300, seed=0)
+
+
+@pytest.fixture(scope="session")
+def knowledge_graph(synthetic: SyntheticGraph) -> KnowledgeGraph:
+    return KnowledgeGraph(
+        endpoint_url="local://synthetic", graph=LocalSPARQLWrapper(synthetic.graph)
+    )
+
+
+@pytest.fixture(scope="session")
+def catalog_movies(
+    synthetic: SyntheticGraph, knowledge_graph: KnowledgeGraph
+) -> list[Entity]:
+    """Movies as the agent links them, from the preloaded entity catalog."""
+    movies = {str(uri) for uri in synthetic.movies}
+    return [e for e in knowledge_graph.entities if str(e.uri) in movies]
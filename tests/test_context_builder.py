@@ -0,0 +1,28 @@
+from benchmarks.FaultInjectingServer import FaultInjectingServer
+from llm import ContextBuilder, LargeLanguageModel
+
+
+class CharacterTokenizer(LargeLanguageModel):
+    """Counts a token per character, far more than the estimate."""
+
+    def count_tokens(self, text: str) -> int:
+        return len(text)
+
+
+def test_the_tokenizer_of_the_model_bounds_the_context(catalog_movies, knowledge_graph):
+    builder = ContextBuilder(
+        knowledge_graph, CharacterTokenizer("http://127.0.0.1:9"), max_tokens=200
+    )
+    context = builder.build(catalog_movies[:3], "who directed them?")
+    assert context
+    assert len(context) <= 200
+
+
+def test_prompts_carry_the_facts_as_context(synthetic, catalog_movies, knowledge_graph):
+    with FaultInjectingServer(synthetic, latency=0.0) as server:
+        llm = LargeLanguageModel(server.url, max_retries=1)
+        builder = ContextBuilder(knowledge_graph, llm, max_tokens=100)
+        template = builder.template(catalog_movies[:1], "what genre is it?")
+        assert template.context
+        assert template.context.splitlines()[0].startswith(catalog_movies[0].label)
+        assert builder.prompt("what genre is it?", catalog_movies[:1])
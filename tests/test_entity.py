@@ -0,0 +1,11 @@
+from core import Entity, Relation
+
+
+def test_catalog_entities_load_all_their_properties(catalog_movies, knowledge_graph):
+    # the catalog already knows what they are an instance of
+    entity = catalog_movies[0]
+    fresh = Entity(entity.uri, knowledge_graph)
+
+    relations = {str(relation.uri) for relation in entity.relations}
+    assert relations == {str(relation.uri) for relation in fresh.relations}
+    assert relations - {str(Relation.instance_of(knowledge_graph).uri)}
@@ -0,0 +1,37 @@
+import pytest
+
+from agent.IntentRouter import RECOMMENDATION, SMALL_TALK, IntentRouter
+from core import IRI, Entity, LabelIndex
+
+TITLES = ["Inception", "Star Wars", "Pocahontas", "Titanic", "Hello"]
+
+
+@pytest.fixture(scope="module")
+def router() -> IntentRouter:
+    return IntentRouter.train()
+
+
+@pytest.fixture(scope="module")
+def label_index(knowledge_graph) -> LabelIndex:
+    label_index = LabelIndex()
+    for title in TITLES:
+        label_index.add(title, Entity(IRI(f"urn:test:{title}"), knowledge_graph))
+    return label_index
+
+
+@pytest.mark.parametrize(
+    "text", ["Inception", "Star Wars", "Pocahontas", "Thanks! I also like Titanic"]
+)
+def test_linked_titles_are_no_small_talk(router, label_index, text):
+    assert router.route(text, label_index) == RECOMMENDATION
+
+
+@pytest.mark.parametrize("text", ["drama", "Zyxwv"])
+def test_messages_without_known_terms_are_recommendations(router, text):
+    assert router.route(text) == RECOMMENDATION
+
+
+@pytest.mark.parametrize("text", ["Hi there!", "thanks", "Hello"])
+def test_small_talk(router, label_index, text):
+    # "Hello" is a title as well, but its words speak for small talk
+    assert router.route(text, label_index) == SMALL_TALK
@@ -0,0 +1,60 @@
+import threading
+import time
+
+from benchmarks import LocalSPARQLWrapper
+from core import KnowledgeGraph
+from utils import Deadline
+
+
+class SlowWithTimeout(LocalSPARQLWrapper):
+    """Times out every query sent with a timeout, answers the others."""
+
+    def __init__(self, graph):
+        super().__init__(graph)
+        self.started = threading.Event()
+        self.__timeouts = threading.local()
+
+    def setTimeout(self, timeout: int):
+        self.__timeouts.timeout = timeout
+
+    def query(self):
+        if getattr(self.__timeouts, "timeout", None) is not None:
+            self.started.set()
+            time.sleep(0.3)
+            raise TimeoutError("timed out")
+        return super().query()
+
+
+def test_followers_do_not_share_the_deadline_of_the_leader(synthetic):
+    graph = SlowWithTimeout(synthetic.graph)
+    knowledge_graph = KnowledgeGraph(endpoint_url="local://synthetic", graph=graph)
+    query = f"SELECT ?entity WHERE {{ <{synthetic.movies[0]}> ?relation ?entity }}"
+    deadline = Deadline(0.1)
+    leader = threading.Thread(target=knowledge_graph.query, args=(query, deadline))
+    leader.start()
+    assert graph.started.wait(5)
+
+    results = knowledge_graph.query(query)
+    leader.join()
+    assert "graph query cancelled" in deadline.degradations
+    assert knowledge_graph.in_flight_stats["coalesced"] == 1
+    assert results["entity"]
+
+
+def test_keyset_pages_keep_the_rows_of_a_value_together(synthetic, knowledge_graph):
+    variables = ["?uri", "?relation"]
+    where = f"?uri ?relation ?value . ?uri ?genre <{synthetic.awards[0]}> ."
+
+    def rows(page_size):
+        return sorted(
+            (row["uri"]["value"], row["relation"]["value"])
+            for row in knowledge_graph.iter_query(
+                variables, where, page_size=page_size, keyset=True
+            )
+        )
+
+    expected = rows(100_000)
+    assert len(expected) > 20
+    # a movie has more relations than fit on a page of 3, some span pages of 20
+    assert rows(3) == expected
+    assert rows(20) == expected
@@ -0,0 +1,106 @@
+import random
+import threading
+import time
+
+import pytest
+
+from agent import RecommendationBatcher, Recommendations
+from utils import Deadline, DeadlineExceeded
+
+
+@pytest.fixture
+def batcher(knowledge_graph):
+    batcher = RecommendationBatcher(knowledge_graph, window=0.01)
+    yield batcher
+    batcher.close()
+
+
+def last_snapshot(entities, properties, knowledge_graph):
+    ranked = []
+    for ranked in Recommendations.stream(entities, properties, knowledge_graph):
+        pass
+    return ranked
+
+
+def test_batched_scores_equal_the_stream(batcher, catalog_movies, knowledge_graph):
+    for seed in range(3):
+        seeds = random.Random(seed).sample(catalog_movies, 3)
+        expected = last_snapshot(seeds, [], knowledge_graph)
+        ranked = batcher.recommend(seeds, [], deadline=Deadline(30))
+        assert [(str(e.uri), round(s, 6)) for e, s in ranked] == [
+            (str(e.uri), round(s, 6)) for e, s in expected
+        ]
+
+
+def test_requests_out_of_budget_give_up(batcher, catalog_movies):
+    with pytest.raises(DeadlineExceeded):
+        batcher.recommend(catalog_movies[:3], [], deadline=Deadline(0))
+
+
+def test_a_slow_batch_does_not_hold_up_the_next(batcher, catalog_movies, monkeypatch):
+    slow = catalog_movies[:3]
+    started = threading.Event()
+    lookups = Recommendations.lookups
+
+    def slow_lookups(entities, knowledge_graph):
+        if entities == slow:
+            started.set()
+            time.sleep(1.0)
+        return lookups(entities, knowledge_graph)
+
+    monkeypatch.setattr(Recommendations, "lookups", staticmethod(slow_lookups))
+    other_room = threading.Thread(target=batcher.recommend, args=(slow, []))
+    other_room.start()
+    assert started.wait(5)
+
+    start = time.perf_counter()
+    batcher.recommend(catalog_movies[3:6], [], deadline=Deadline(30))
+    assert time.perf_counter() - start < 0.5
+    assert other_room.is_alive()
+    other_room.join()
+
+
+def test_degradations_of_the_batch_reach_every_request(
+    batcher, catalog_movies, knowledge_graph, monkeypatch
+):
+    query = knowledge_graph.query
+
+    def skipped(query_string, deadline=None):
+        if deadline is not None:
+            deadline.degrade("graph query skipped")
+            return {}
+        return query(query_string)
+
+    monkeypatch.setattr(knowledge_graph, "query", skipped)
+    deadlines = [Deadline(30), Deadline(20)]
+    rooms = [
+        threading.Thread(
+            target=batcher.recommend,
+            args=(catalog_movies[i : i + 3], []),
+            kwargs={"deadline": deadline},
+        )
+        for i, deadline in zip((10, 20), deadlines)
+    ]
+    for room in rooms:
+        room.start()
+    for room in rooms:
+        room.join()
+    for deadline in deadlines:
+        assert "graph query skipped" in deadline.degradations
+
+
+def test_max_matches_per_value_is_shared_with_the_stream(
+    catalog_movies, knowledge_graph
+):
+    batcher = RecommendationBatcher(knowledge_graph, max_matches_per_value=5)
+    try:
+        seeds = random.Random(3).sample(catalog_movies, 3)
+        expected = []
+        for expected in Recommendations.stream(
+            seeds, [], knowledge_graph, max_matches_per_value=5
+        ):
+            pass
+        ranked = batcher.recommend(seeds, [], deadline=Deadline(30))
+    finally:
+        batcher.close()
+    assert [str(e.uri) for e, _ in ranked] == [str(e.uri) for e, _ in expected]
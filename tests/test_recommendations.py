@@ -0,0 +1,35 @@
+import random
+
+from agent import Recommendations
+from core import Relation
+from utils import Deadline
+
+
+def test_catalog_seeds_are_scored_by_their_own_features(
+    catalog_movies, knowledge_graph
+):
+    rng = random.Random(0)
+    instance_of = str(Relation.instance_of(knowledge_graph).uri)
+
+    rankings = set()
+    for _ in range(3):
+        seeds = rng.sample(catalog_movies, 3)
+        lookups = Recommendations.lookups(seeds, knowledge_graph)
+        assert {str(relation.uri) for relation, _ in lookups} - {instance_of}
+        rankings.add(
+            tuple(
+                str(e.uri)
+                for e in Recommendations.from_entities(seeds, knowledge_graph)
+            )
+        )
+    assert len(rankings) == 3
+
+
+def test_deadline_bound_seed_lookups_are_scored(catalog_movies, knowledge_graph):
+    seeds = random.Random(1).sample(catalog_movies, 3)
+    ranked = []
+    for ranked in Recommendations.stream(
+        seeds, [], knowledge_graph, deadline=Deadline(30), limit=10
+    ):
+        pass
+    assert len({round(score, 6) for _, score in ranked}) > 1
@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+
+from llm import SlotScheduler
+
+
+async def queued_waiter(scheduler: SlotScheduler) -> asyncio.Task:
+    task = asyncio.create_task(scheduler.acquire_async())
+    await asyncio.sleep(0)
+    assert scheduler.queued == 1
+    return task
+
+
+def test_cancelled_queued_waiter_releases_nothing():
+    async def run():
+        scheduler = SlotScheduler(slots=1)
+        assert scheduler.try_acquire()
+        task = await queued_waiter(scheduler)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        scheduler.release()
+        assert scheduler.in_flight == 0
+        assert [scheduler.try_acquire() for _ in range(3)] == [True, False, False]
+
+    asyncio.run(run())
+
+
+def test_cancelled_granted_waiter_hands_its_slot_back():
+    async def run():
+        scheduler = SlotScheduler(slots=1)
+        assert scheduler.try_acquire()
+        task = await queued_waiter(scheduler)
+        # granted, but cancelled before the task got to run again
+        scheduler.release()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        assert scheduler.in_flight == 0
+        assert [scheduler.try_acquire() for _ in range(3)] == [True, False, False]
+
+    asyncio.run(run())